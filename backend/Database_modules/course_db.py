@@ -7,6 +7,8 @@ import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Union, Tuple
 from database import db
+from services.cache_service import cached, cache_invalidate
+from services.cache_warmer import cache_warmer
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -18,6 +20,45 @@ class CourseDatabaseManager:
         self.table = 'courses'
         self.enrollments_table = 'course_enrollments'
     
+    def _fallback_course_page(self, limit: int = 50, offset: int = 0,
+                              search: str = None, instructor_filter: str = None,
+                              status_filter: str = None) -> Tuple[List[Dict], int]:
+        """Sample courses filtered and paginated like get_all_courses, served (uncached) when the query fails"""
+        # Return fallback data for development - this should be fast
+        logger.info("Using fallback course data for performance")
+        fallback_courses = self._get_fallback_courses()
+        
+        # Apply client-side filtering to fallback data
+        filtered_courses = fallback_courses
+        
+        if search:
+            search_lower = search.lower()
+            filtered_courses = [
+                course for course in filtered_courses
+                if search_lower in course.get('title', '').lower() or 
+                   search_lower in course.get('description', '').lower()
+            ]
+        
+        if instructor_filter and instructor_filter != 'all':
+            filtered_courses = [
+                course for course in filtered_courses
+                if course.get('instructor_id') == instructor_filter
+            ]
+        
+        if status_filter and status_filter != 'all':
+            if status_filter == 'active':
+                filtered_courses = [c for c in filtered_courses if c.get('is_active')]
+            elif status_filter == 'inactive':
+                filtered_courses = [c for c in filtered_courses if not c.get('is_active')]
+        
+        # Apply pagination to fallback data
+        start_idx = offset
+        end_idx = offset + limit
+        paginated_courses = filtered_courses[start_idx:end_idx]
+        
+        return paginated_courses, len(filtered_courses)
+    
+    @cached(ttl=300, key_prefix="courses", tags=["courses"], fallback=_fallback_course_page)
     def get_all_courses(self, limit: int = 50, offset: int = 0, 
                        search: str = None, instructor_filter: str = None,
                        status_filter: str = None) -> Tuple[List[Dict], int]:
@@ -34,85 +75,48 @@ class CourseDatabaseManager:
         Returns:
             Tuple of (courses_list, total_count)
         """
-        try:
-            # Build query with filters
-            query = db.supabase.table(self.table).select('*')
-            
-            # Apply search filter
-            if search:
-                search_term = f"%{search}%"
-                query = query.or_(f"title.ilike.{search_term},description.ilike.{search_term}")
-            
-            # Apply role filter
-            if instructor_filter and instructor_filter != 'all':
-                query = query.eq('instructor_id', instructor_filter)
-            
-            # Apply status filter
-            if status_filter and status_filter != 'all':
-                if status_filter == 'active':
-                    query = query.eq('is_active', True)
-                elif status_filter == 'inactive':
-                    query = query.eq('is_active', False)
-                elif status_filter == 'archived':
-                    query = query.eq('status', 'archived')
-            
-            # Apply pagination and ordering in one query
-            query = query.range(offset, offset + limit - 1).order('created_at', desc=True)
-            
-            result = query.execute()
-            
-            if result.data:
-                courses = [self._process_course_data(course) for course in result.data]
-                
-                # For now, use the returned count as total (this is an approximation)
-                # In production, you might want to do a separate count query only when needed
-                total_count = len(courses) + offset
-                if len(courses) < limit:
-                    total_count = offset + len(courses)
-                else:
-                    # Estimate based on full page - this avoids expensive count queries
-                    total_count = offset + limit + 1  # +1 to indicate there might be more
-                
-                logger.info(f"Retrieved {len(courses)} courses (estimated total: {total_count})")
-                return courses, total_count
-            
-            return [], 0
+        # Build query with filters
+        query = db.supabase.table(self.table).select('*')
+        
+        # Apply search filter
+        if search:
+            search_term = f"%{search}%"
+            query = query.or_(f"title.ilike.{search_term},description.ilike.{search_term}")
+        
+        # Apply role filter
+        if instructor_filter and instructor_filter != 'all':
+            query = query.eq('instructor_id', instructor_filter)
+        
+        # Apply status filter
+        if status_filter and status_filter != 'all':
+            if status_filter == 'active':
+                query = query.eq('is_active', True)
+            elif status_filter == 'inactive':
+                query = query.eq('is_active', False)
+            elif status_filter == 'archived':
+                query = query.eq('status', 'archived')
+        
+        # Apply pagination and ordering in one query
+        query = query.range(offset, offset + limit - 1).order('created_at', desc=True)
+        
+        result = query.execute()
+        
+        if result.data:
+            courses = [self._process_course_data(course) for course in result.data]
             
-        except Exception as e:
-            logger.error(f"Error getting courses: {e}")
-            # Return fallback data for development - this should be fast
-            logger.info("Using fallback course data for performance")
-            fallback_courses = self._get_fallback_courses()
+            # For now, use the returned count as total (this is an approximation)
+            # In production, you might want to do a separate count query only when needed
+            total_count = len(courses) + offset
+            if len(courses) < limit:
+                total_count = offset + len(courses)
+            else:
+                # Estimate based on full page - this avoids expensive count queries
+                total_count = offset + limit + 1  # +1 to indicate there might be more
             
-            # Apply client-side filtering to fallback data
-            filtered_courses = fallback_courses
-            
-            if search:
-                search_lower = search.lower()
-                filtered_courses = [
-                    course for course in filtered_courses
-                    if search_lower in course.get('title', '').lower() or 
-                       search_lower in course.get('description', '').lower()
-                ]
-            
-            if instructor_filter and instructor_filter != 'all':
-                filtered_courses = [
-                    course for course in filtered_courses
-                    if course.get('instructor_id') == instructor_filter
-                ]
-            
-            if status_filter and status_filter != 'all':
-                if status_filter == 'active':
-                    filtered_courses = [c for c in filtered_courses if c.get('is_active')]
-                elif status_filter == 'inactive':
-                    filtered_courses = [c for c in filtered_courses if not c.get('is_active')]
-            
-            # Apply pagination to fallback data
-            start_idx = offset
-            end_idx = offset + limit
-            paginated_courses = filtered_courses[start_idx:end_idx]
-            
-            return paginated_courses, len(filtered_courses)
+            logger.info(f"Retrieved {len(courses)} courses (estimated total: {total_count})")
+            return courses, total_count
+        
+        return [], 0
     
     def get_course_by_id(self, course_id: str) -> Optional[Dict]:
         """Get single course by ID"""
@@ -134,6 +138,7 @@ class CourseDatabaseManager:
             logger.error(f"Error getting course {course_id}: {e}")
             return None
     
+    @cache_invalidate(tags=["courses"])
     def create_course(self, course_data: Dict) -> Tuple[Optional[Dict], Optional[str]]:
         """
         Create a new course
@@ -195,6 +200,7 @@ class CourseDatabaseManager:
             logger.error(f"Error creating course: {e}")
             return None, str(e)
     
+    @cache_invalidate(tags=["courses"])
     def update_course(self, course_id: str, update_data: Dict) -> Tuple[Optional[Dict], Optional[str]]:
         """
         Update course information
@@ -252,6 +258,7 @@ class CourseDatabaseManager:
             logger.error(f"Error updating course {course_id}: {e}")
             return None, str(e)
     
+    @cache_invalidate(tags=["courses"])
     def delete_course(self, course_id: str, soft_delete: bool = True) -> Tuple[bool, Optional[str]]:
         """
         Delete course (soft or hard delete)
@@ -298,6 +305,7 @@ class CourseDatabaseManager:
             logger.error(f"Error deleting course {course_id}: {e}")
             return False, f"Database error: {str(e)}"
     
+    @cache_invalidate(tags=["courses", "course:{course_id}"])
     def enroll_student(self, course_id: str, student_id: str) -> Tuple[bool, Optional[str]]:
         """
         Enroll student in course
@@ -353,6 +361,7 @@ class CourseDatabaseManager:
             logger.error(f"Error enrolling student: {e}")
             return False, str(e)
     
+    @cache_invalidate(tags=["courses", "course:{course_id}"])
     def unenroll_student(self, course_id: str, student_id: str) -> Tuple[bool, Optional[str]]:
         """
         Unenroll student from course
@@ -558,6 +567,10 @@ class CourseDatabaseManager:
 # Global instance
 course_db = CourseDatabaseManager()
 
+# Course catalog pages requested right after a deploy
+cache_warmer.register('course_catalog', course_db.get_all_courses)
+cache_warmer.register('course_catalog_active', course_db.get_all_courses, status_filter='active')
+
 # Legacy function wrappers for backward compatibility
 def get_all_courses():
     """Legacy wrapper for getting all courses"""
@@ -646,6 +659,7 @@ def get_courses_by_instructor(instructor_id):
         logger.error(f"Error getting course by ID: {e}")
         return None
 
+@cache_invalidate(tags=["courses"])
 def update_course(course_id, updates):
     """Update course information"""
     try:
@@ -664,6 +678,7 @@ def update_course(course_id, updates):
         logger.error(f"Error updating course: {e}")
         return None
 
+@cache_invalidate(tags=["courses"])
 def delete_course(course_id):
     """Delete a course (soft delete)"""
     try:
@@ -688,6 +703,7 @@ def get_courses_by_instructor(instructor_id):
         return []
 
 # Enrollment Operations
+@cache_invalidate(tags=["courses", "course:{course_id}"])
 def enroll_student(student_id, course_id):
     """Enroll a student in a course"""
     try:
@@ -717,6 +733,7 @@ def enroll_student(student_id, course_id):
         logger.error(f"Error enrolling student: {e}")
         return None, f"Database error: {str(e)}"
 
+@cache_invalidate(tags=["courses", "course:{course_id}"])
 def unenroll_student(student_id, course_id):
     """Unenroll a student from a course"""
     try:
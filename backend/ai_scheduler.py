@@ -0,0 +1,264 @@
+"""
+AI Request Scheduler for the AI Tutor Backend
+Orders Groq calls by priority (interactive chat > content generation > batch grading
+> health checks) and budgets them against token-bucket models of the requests/min
+and tokens/min limits, backing off when the API answers 429 with Retry-After
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from enum import IntEnum
+from typing import Any, Callable, Dict, Optional
+
+from latency_histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class AIPriority(IntEnum):
+    """Scheduling classes, lower value is served first"""
+    INTERACTIVE = 0  # Live tutor chat
+    CONTENT = 1      # Explanations, quizzes, study tips, rubrics
+    BATCH = 2        # Automatic grading and background summaries
+    HEALTH = 3       # Health checks and breaker probes
+
+
+class AISchedulerTimeout(Exception):
+    """Raised when a request waits longer than its priority's queue timeout"""
+
+
+class TokenBucket:
+    """Continuously refilling bucket sized to a per-minute limit (0 disables it)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._refilled_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def refill(self, now: float):
+        if self.enabled:
+            self.level = min(self.capacity, self.level + (now - self._refilled_at) * self.capacity / 60.0)
+        self._refilled_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (amounts above capacity wait for a full bucket)"""
+        if not self.enabled:
+            return 0.0
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed * 60.0 / self.capacity)
+
+    def take(self, amount: float):
+        if self.enabled:
+            self.level -= amount
+
+    def adjust(self, amount: float):
+        """Return (positive) or charge (negative) tokens after the real usage is known"""
+        if self.enabled:
+            self.level = min(self.capacity, self.level + amount)
+
+
+def estimate_request_tokens(messages: Any, max_tokens: int = 0) -> int:
+    """Worst-case tokens a completion can consume: prompt estimate plus max_tokens"""
+    prompt_chars = sum(len(str(m.get('content') or '')) for m in messages or [] if isinstance(m, dict))
+    return prompt_chars // 4 + int(max_tokens or 0)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After (seconds) from a 429 API error, or None if the error is not a rate limit"""
+    status = getattr(error, 'status_code', None)
+    response = getattr(error, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    if status != 429 and type(error).__name__ != 'RateLimitError':
+        return None
+
+    headers = getattr(response, 'headers', None) or {}
+    for header in ('retry-after', 'x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens'):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(str(value).rstrip('s'))
+            except ValueError:
+                continue
+    return 1.0
+
+
+class _Ticket:
+    __slots__ = ('priority', 'tokens', 'enqueued_at')
+
+    def __init__(self, priority: AIPriority, tokens: int):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class AIScheduler:
+    """Admits AI calls one at a time in priority order when the rate budget allows"""
+
+    DEFAULT_TIMEOUTS = {
+        AIPriority.INTERACTIVE: 30.0,
+        AIPriority.CONTENT: 60.0,
+        AIPriority.BATCH: 300.0,
+        AIPriority.HEALTH: 5.0
+    }
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        # Limits are per process; divide the account quota by the number of workers
+        self.requests = TokenBucket(requests_per_minute if requests_per_minute is not None
+                                    else float(os.getenv('AI_RATE_LIMIT_RPM', '30')))
+        self.tokens = TokenBucket(tokens_per_minute if tokens_per_minute is not None
+                                  else float(os.getenv('AI_RATE_LIMIT_TPM', '6000')))
+        self.timeouts = {p: float(os.getenv(f'AI_QUEUE_TIMEOUT_{p.name}', t)) for p, t in self.DEFAULT_TIMEOUTS.items()}
+
+        self._heap = []
+        self._sequence = itertools.count()
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+
+        self._wait_times = {p: LatencyHistogram() for p in AIPriority}
+        self._counters = {p: {'admitted': 0, 'timed_out': 0, 'rate_limited': 0} for p in AIPriority}
+        self._in_flight = 0
+
+    def run(self, priority: AIPriority, func: Callable, *args, estimated_tokens: int = 0,
+            queue_timeout: float = None, **kwargs) -> Any:
+        """
+        Wait for a slot, then call func(*args, **kwargs) on the calling thread
+
+        Args:
+            priority: Scheduling class of the call
+            estimated_tokens: Tokens reserved from the tokens/min bucket until the real usage is known
+            queue_timeout: Max seconds to wait in the queue (defaults per priority)
+
+        Raises:
+            AISchedulerTimeout: If no slot was granted in time
+        """
+        if self.tokens.enabled:
+            # A reservation above the whole budget would leave the bucket in debt for minutes;
+            # the real usage is charged when the call settles
+            estimated_tokens = min(estimated_tokens, int(self.tokens.capacity))
+        self._acquire(priority, estimated_tokens, self.timeouts[priority] if queue_timeout is None else queue_timeout)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            delay = retry_after_seconds(e)
+            if delay is not None:
+                self.penalize(delay, priority)
+            with self._condition:
+                self._in_flight -= 1
+            raise
+        self._settle(estimated_tokens, result)
+        return result
+
+    def penalize(self, seconds: float, priority: AIPriority = None):
+        """Stop admitting requests for `seconds` (server asked us to back off)"""
+        with self._condition:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            if priority is not None:
+                self._counters[priority]['rate_limited'] += 1
+            self._condition.notify_all()
+        logger.warning(f"AI rate limit hit, pausing admissions for {seconds:.1f}s")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, wait-time percentiles and budget levels for monitoring"""
+        with self._condition:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            depth = {p: 0 for p in AIPriority}
+            oldest = {p: 0.0 for p in AIPriority}
+            for _, _, ticket in self._heap:
+                depth[ticket.priority] += 1
+                oldest[ticket.priority] = max(oldest[ticket.priority], now - ticket.enqueued_at)
+            counters = {p: dict(c) for p, c in self._counters.items()}
+            metrics = {
+                'queue_depth': sum(depth.values()),
+                'in_flight': self._in_flight,
+                'backoff_remaining_seconds': round(max(0.0, self._blocked_until - now), 2),
+                'requests_per_minute': {'limit': self.requests.capacity, 'available': round(self.requests.level, 1)},
+                'tokens_per_minute': {'limit': self.tokens.capacity, 'available': round(self.tokens.level, 1)}
+            }
+
+        metrics['priorities'] = {}
+        for p in AIPriority:
+            waits = self._wait_times[p].percentiles((50, 95, 99))
+            metrics['priorities'][p.name.lower()] = {
+                'queued': depth[p],
+                'oldest_wait_seconds': round(oldest[p], 2),
+                **counters[p],
+                'wait_p50_ms': round(waits['p50'], 1) if waits['p50'] is not None else None,
+                'wait_p95_ms': round(waits['p95'], 1) if waits['p95'] is not None else None,
+                'wait_p99_ms': round(waits['p99'], 1) if waits['p99'] is not None else None
+            }
+        return metrics
+
+    # Internal helpers
+    def _acquire(self, priority: AIPriority, tokens: int, timeout: float):
+        ticket = _Ticket(priority, tokens)
+        entry = (int(priority), next(self._sequence), ticket)
+        deadline = ticket.enqueued_at + timeout
+
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._heap[0] is entry:
+                        wait = self._admission_wait(now, tokens)
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None  # Woken when the head is admitted or leaves
+                    if now >= deadline:
+                        self._counters[priority]['timed_out'] += 1
+                        raise AISchedulerTimeout(
+                            f"AI request waited {timeout:.0f}s in the {priority.name.lower()} queue")
+                    self._condition.wait(deadline - now if wait is None else min(wait, deadline - now))
+            except BaseException:
+                self._remove(entry)
+                raise
+
+            heapq.heappop(self._heap)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self._in_flight += 1
+            self._counters[priority]['admitted'] += 1
+            self._condition.notify_all()
+
+        self._wait_times[priority].record((time.monotonic() - ticket.enqueued_at) * 1000)
+
+    def _admission_wait(self, now: float, tokens: int) -> float:
+        """Seconds until the head of the queue may be admitted (caller holds the lock)"""
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(self._blocked_until - now, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _remove(self, entry):
+        """Drop a waiting entry that gave up (caller holds the lock)"""
+        try:
+            self._heap.remove(entry)
+            heapq.heapify(self._heap)
+        except ValueError:
+            pass
+        self._condition.notify_all()
+
+    def _settle(self, estimated_tokens: int, response: Any):
+        """Replace the token reservation with the usage the API reported"""
+        usage = getattr(response, 'usage', None)
+        total = getattr(usage, 'total_tokens', None)
+        with self._condition:
+            self._in_flight -= 1
+            if total is not None:
+                self.tokens.adjust(estimated_tokens - total)
+            self._condition.notify_all()
+
+
+# Global scheduler instance shared by the AI services
+ai_scheduler = AIScheduler()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Groq/OpenAI-compatible stub server for AI load testing
+Serves /openai/v1/chat/completions with configurable latency distributions, token
+generation rates, SSE streaming, error injection and rate-limit (429) responses
+
+Point the backend at it with GROQ_BASE_URL=http://127.0.0.1:8090 (any GROQ_API_KEY works)
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+CHAT_PATHS = ('/openai/v1/chat/completions', '/v1/chat/completions')
+MODELS_PATHS = ('/openai/v1/models', '/v1/models')
+
+_FILLER = (
+    "This is a stub response from the local load-testing server. It stands in for the "
+    "model so that backend throughput can be measured without calling the real API. "
+    "Key concepts are explained step by step with examples and a short summary. "
+).split()
+
+
+class StubConfig:
+    """Runtime behaviour of the stub (all fields can be changed via POST /stub/config)"""
+
+    FIELDS = {
+        'latency_distribution': str,
+        'latency_ms': float,
+        'latency_jitter_ms': float,
+        'tokens_per_sec': float,
+        'completion_tokens': int,
+        'error_rate': float,
+        'rate_limit_rate': float,
+        'requests_per_minute': int,
+        'retry_after_seconds': float,
+        'model': str
+    }
+
+    def __init__(self, **overrides):
+        self.latency_distribution = os.getenv('AI_STUB_LATENCY_DISTRIBUTION', 'lognormal')
+        self.latency_ms = float(os.getenv('AI_STUB_LATENCY_MS', '300'))  # Median time to first token
+        self.latency_jitter_ms = float(os.getenv('AI_STUB_LATENCY_JITTER_MS', '150'))
+        self.tokens_per_sec = float(os.getenv('AI_STUB_TOKENS_PER_SEC', '250'))  # 0 = instant generation
+        self.completion_tokens = int(os.getenv('AI_STUB_COMPLETION_TOKENS', '200'))
+        self.error_rate = float(os.getenv('AI_STUB_ERROR_RATE', '0'))  # Fraction answered with 500
+        self.rate_limit_rate = float(os.getenv('AI_STUB_RATE_LIMIT_RATE', '0'))  # Fraction answered with 429
+        self.requests_per_minute = int(os.getenv('AI_STUB_RPM', '0'))  # 0 = no quota enforcement
+        self.retry_after_seconds = float(os.getenv('AI_STUB_RETRY_AFTER', '1'))
+        self.model = os.getenv('AI_STUB_MODEL', 'llama3-70b-8192')
+        self.update(overrides)
+
+    def update(self, values: Dict[str, Any]):
+        """Apply known fields, converting them to the expected types"""
+        for name, value in values.items():
+            if name in self.FIELDS and value is not None:
+                setattr(self, name, self.FIELDS[name](value))
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def sample_latency(self) -> float:
+        """Sample a time-to-first-token in seconds from the configured distribution"""
+        median, jitter = self.latency_ms, self.latency_jitter_ms
+        if self.latency_distribution == 'fixed':
+            value = median
+        elif self.latency_distribution == 'uniform':
+            value = random.uniform(median - jitter, median + jitter)
+        elif self.latency_distribution == 'normal':
+            value = random.gauss(median, jitter)
+        else:
+            # Right-skewed like real inference latency; jitter/median sets the spread
+            sigma = math.log1p(jitter / median) if median > 0 else 0
+            value = median * math.exp(random.gauss(0, sigma))
+        return max(0.0, value) / 1000.0
+
+
+class StubState:
+    """Counters and the request-per-minute token bucket shared by handler threads"""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._tokens = float(config.requests_per_minute)
+        self._refilled_at = time.monotonic()
+        self.counters = {
+            'requests': 0,
+            'completed': 0,
+            'streamed': 0,
+            'errors_injected': 0,
+            'rate_limited': 0,
+            'in_flight': 0,
+            'max_in_flight': 0,
+            'completion_tokens': 0
+        }
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+            if name == 'in_flight':
+                self.counters['max_in_flight'] = max(self.counters['max_in_flight'], self.counters['in_flight'])
+
+    def take_quota(self) -> Optional[float]:
+        """Consume one request from the rpm bucket; returns seconds to wait when it is empty"""
+        rpm = self.config.requests_per_minute
+        if rpm <= 0:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(rpm), self._tokens + (now - self._refilled_at) * rpm / 60.0)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) * 60.0 / rpm
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'counters': dict(self.counters), 'config': self.config.to_dict()}
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(str(m.get('content') or '') for m in messages)
+
+
+def _canned_content(prompt: str, tokens: int) -> str:
+    """Plausible content for the tutor's prompt shapes (quiz JSON, grading score, prose)"""
+    lowered = prompt.lower()
+    if 'json array' in lowered and 'question' in lowered:
+        match = re.search(r'generate (\d+)', lowered)
+        count = int(match.group(1)) if match else 3
+        return json.dumps([{
+            'question': f'Stub question {i + 1}?',
+            'options': {'A': 'Option A', 'B': 'Option B', 'C': 'Option C', 'D': 'Option D'},
+            'correct_answer': 'A',
+            'explanation': 'Option A is correct in the stub.'
+        } for i in range(count)])
+    words = [_FILLER[i % len(_FILLER)] for i in range(max(1, tokens))]
+    if 'grade' in lowered:
+        match = re.search(r'maximum points:\s*(\d+)', lowered)
+        max_points = int(match.group(1)) if match else 100
+        return f"Score: {int(max_points * 0.8)}/{max_points}\n\nFeedback: " + " ".join(words)
+    return " ".join(words)
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """Handles the OpenAI-compatible endpoints the Groq SDK calls"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'AIStub/1.0'
+
+    @property
+    def state(self) -> StubState:
+        return self.server.stub_state
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path in MODELS_PATHS:
+            self._send_json(200, {'object': 'list', 'data': [
+                {'id': self.state.config.model, 'object': 'model', 'owned_by': 'stub'}]})
+        elif path == '/stub/stats':
+            self._send_json(200, self.state.snapshot())
+        else:
+            self._send_error(404, 'not_found', f'Unknown path {path}')
+
+    def do_POST(self):
+        path = self.path.split('?')[0]
+        try:
+            body = self._read_json()
+        except ValueError:
+            self._send_error(400, 'invalid_request_error', 'Request body is not valid JSON')
+            return
+
+        if path == '/stub/config':
+            try:
+                self.state.config.update(body)
+            except (TypeError, ValueError) as e:
+                self._send_error(400, 'invalid_request_error', str(e))
+                return
+            self._send_json(200, self.state.config.to_dict())
+        elif path == '/stub/reset':
+            with self.state._lock:
+                for name in self.state.counters:
+                    self.state.counters[name] = 0
+            self._send_json(200, self.state.snapshot())
+        elif path in CHAT_PATHS:
+            self._chat_completion(body)
+        else:
+            self._send_error(404, 'not_found', f'Unknown path {path}')
+
+    def _chat_completion(self, body: Dict[str, Any]):
+        config = self.state.config
+        self.state.incr('requests')
+
+        wait = self.state.take_quota()
+        if wait is None and random.random() < config.rate_limit_rate:
+            wait = config.retry_after_seconds
+        if wait is not None:
+            self.state.incr('rate_limited')
+            self._send_error(429, 'rate_limit_exceeded',
+                             f'Rate limit reached for model {config.model}. Please try again in {wait:.2f}s.',
+                             headers={'Retry-After': f'{math.ceil(wait)}',
+                                      'x-ratelimit-reset-requests': f'{wait:.2f}s'})
+            return
+
+        messages = body.get('messages') or []
+        if not messages:
+            self._send_error(400, 'invalid_request_error', "'messages' is required")
+            return
+
+        self.state.incr('in_flight')
+        try:
+            time.sleep(config.sample_latency())
+            if random.random() < config.error_rate:
+                self.state.incr('errors_injected')
+                self._send_error(500, 'internal_server_error', 'Injected stub failure')
+                return
+
+            max_tokens = int(body.get('max_tokens') or config.completion_tokens)
+            tokens = max(1, min(max_tokens, int(random.gauss(config.completion_tokens, config.completion_tokens * 0.2))))
+            prompt = _prompt_text(messages)
+            content = _canned_content(prompt, tokens)
+            usage = {
+                'prompt_tokens': _estimate_tokens(prompt),
+                'completion_tokens': tokens,
+                'total_tokens': _estimate_tokens(prompt) + tokens
+            }
+
+            if body.get('stream'):
+                self._stream(content, tokens, usage, body.get('model') or config.model)
+            else:
+                if config.tokens_per_sec > 0:
+                    time.sleep(tokens / config.tokens_per_sec)
+                self._send_json(200, {
+                    'id': f'chatcmpl-{uuid.uuid4().hex}',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model') or config.model,
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'length' if tokens >= max_tokens else 'stop'
+                    }],
+                    'usage': usage
+                })
+            self.state.incr('completed')
+            self.state.incr('completion_tokens', tokens)
+        finally:
+            self.state.incr('in_flight', -1)
+
+    def _stream(self, content: str, tokens: int, usage: Dict[str, int], model: str):
+        """Send the completion as server-sent events, pacing chunks at the configured token rate"""
+        self.state.incr('streamed')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        created = int(time.time())
+        pieces = re.findall(r'\S+\s*', content) or [content]
+        # Spread the token budget over the pieces so the stream takes tokens/rate seconds
+        delay = (tokens / self.state.config.tokens_per_sec / len(pieces)) if self.state.config.tokens_per_sec > 0 else 0
+
+        def _chunk(delta: Dict[str, Any], finish_reason: str = None, extra: Dict[str, Any] = None):
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+            if extra:
+                payload.update(extra)
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        try:
+            _chunk({'role': 'assistant', 'content': ''})
+            for piece in pieces:
+                if delay:
+                    time.sleep(delay)
+                _chunk({'content': piece})
+            _chunk({}, 'stop', {'x_groq': {'usage': usage}})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("Client disconnected during stream")
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else {}
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, code: str, message: str, headers: Dict[str, str] = None):
+        self._send_json(status, {'error': {'message': message, 'type': code, 'code': code}}, headers)
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 8090, config: StubConfig = None) -> ThreadingHTTPServer:
+    """Start the stub on a daemon thread and return the server (port 0 picks a free port)"""
+    server = ThreadingHTTPServer((host, port), StubRequestHandler)
+    server.daemon_threads = True
+    server.stub_state = StubState(config or StubConfig())
+    threading.Thread(target=server.serve_forever, daemon=True, name='ai-stub-server').start()
+    logger.info(f"AI stub server listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Groq-compatible stub server for AI load testing')
+    parser.add_argument('--host', default=os.getenv('AI_STUB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('AI_STUB_PORT', '8090')))
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS)
+    parser.add_argument('--latency-ms', type=float, help='Median time to first token')
+    parser.add_argument('--latency-jitter-ms', type=float, help='Spread of the latency distribution')
+    parser.add_argument('--tokens-per-sec', type=float, help='Generation rate (0 = instant)')
+    parser.add_argument('--completion-tokens', type=int, help='Mean completion length')
+    parser.add_argument('--error-rate', type=float, help='Fraction of requests answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, help='Fraction of requests answered with 429')
+    parser.add_argument('--requests-per-minute', type=int, help='Enforced request quota (0 = unlimited)')
+    parser.add_argument('--retry-after-seconds', type=float)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = StubConfig(**{name: getattr(args, name) for name in StubConfig.FIELDS if hasattr(args, name)})
+    server = start_stub_server(args.host, args.port, config)
+    print(f"🧪 AI stub server on http://{args.host}:{server.server_address[1]} ({json.dumps(config.to_dict())})")
+    print(f"   export GROQ_BASE_URL=http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
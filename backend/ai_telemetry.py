@@ -0,0 +1,209 @@
+"""
+AI Telemetry for the AI Tutor Backend
+In-process latency histograms and token counters per AI operation, with
+asynchronous batched persistence of interaction rows to ai_interactions
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from latency_histogram import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Operations reported by get_status and the health endpoint
+AI_OPERATIONS = ('chat', 'explain', 'quiz', 'grade', 'rubric')
+
+
+class OperationStats:
+    """Latency, token and error counters for one AI operation"""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.generation_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float, prompt_tokens: int, completion_tokens: int, success: bool):
+        self.histogram.record(latency_ms)
+        with self._lock:
+            if not success:
+                self.errors += 1
+                return
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            if completion_tokens:
+                self.generation_seconds += latency_ms / 1000.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        percentiles = self.histogram.percentiles((50, 95, 99))
+        calls = self.histogram.count
+        with self._lock:
+            return {
+                'calls': calls,
+                'error_rate': round(self.errors / calls * 100, 2) if calls else 0.0,
+                'latency_avg_ms': _round(self.histogram.mean()),
+                'latency_p50_ms': _round(percentiles['p50']),
+                'latency_p95_ms': _round(percentiles['p95']),
+                'latency_p99_ms': _round(percentiles['p99']),
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'tokens_per_sec': round(self.completion_tokens / self.generation_seconds, 1)
+                if self.generation_seconds else 0.0
+            }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def _default_sink(rows: List[Dict[str, Any]]):
+    """Bulk insert interaction rows into ai_interactions"""
+    from services.database import db_service
+    db_service.client.table('ai_interactions').insert(rows).execute()
+
+
+class AITelemetry:
+    """Collects per-operation AI metrics and persists interaction rows off the request path"""
+
+    def __init__(self, sink: Callable[[List[Dict[str, Any]]], Any] = None):
+        self.sink = sink or _default_sink
+        self.batch_size = int(os.getenv('AI_TELEMETRY_BATCH_SIZE', '50'))
+        self.flush_interval = float(os.getenv('AI_TELEMETRY_FLUSH_INTERVAL', '5'))
+        self._operations: Dict[str, OperationStats] = {}
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(
+            maxsize=int(os.getenv('AI_TELEMETRY_QUEUE_SIZE', '10000')))
+        self._flusher: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flush_failures = 0
+
+    def _stats(self, operation: str) -> OperationStats:
+        stats = self._operations.get(operation)
+        if stats is None:
+            with self._lock:
+                stats = self._operations.setdefault(operation, OperationStats())
+        return stats
+
+    def record(self, operation: str, latency_ms: float, prompt_tokens: int = 0, completion_tokens: int = 0,
+               success: bool = True, model: str = None, user_id: str = None, session_id: str = None):
+        """
+        Record one AI call
+
+        Args:
+            operation: chat, explain, quiz, grade, rubric, ...
+            latency_ms: Wall-clock time of the model call
+            prompt_tokens / completion_tokens: Token usage reported by the API
+            success: False when the call raised
+            model: Model name, persisted with the interaction row
+            user_id / session_id: When both are known the interaction is queued for ai_interactions
+        """
+        self._stats(operation).record(latency_ms, prompt_tokens or 0, completion_tokens or 0, success)
+
+        if success and user_id and session_id:
+            self._enqueue({
+                'session_id': session_id,
+                'user_id': user_id,
+                'model_used': model,
+                'prompt_tokens': prompt_tokens or 0,
+                'completion_tokens': completion_tokens or 0,
+                'total_tokens': (prompt_tokens or 0) + (completion_tokens or 0),
+                'response_time_ms': int(latency_ms)
+            })
+
+    def record_response(self, operation: str, started_at: float, response: Any = None, success: bool = True,
+                        model: str = None, user_id: str = None, session_id: str = None) -> float:
+        """Record a call from its start time (time.perf_counter()) and API response; returns latency in ms"""
+        latency_ms = (time.perf_counter() - started_at) * 1000
+        usage = getattr(response, 'usage', None)
+        self.record(
+            operation,
+            latency_ms,
+            prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+            completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+            success=success,
+            model=model,
+            user_id=user_id,
+            session_id=session_id
+        )
+        return latency_ms
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Per-operation metrics plus an overall latency summary"""
+        with self._lock:
+            operations = dict(self._operations)
+
+        overall = LatencyHistogram()
+        errors = 0
+        for stats in operations.values():
+            # Merge raw bucket counts; averaging per-operation percentiles would be wrong
+            overall.merge(stats.histogram)
+            errors += stats.errors
+
+        overall_percentiles = overall.percentiles((50, 95, 99))
+        return {
+            'operations': {name: operations[name].snapshot() if name in operations else OperationStats().snapshot()
+                           for name in sorted(set(AI_OPERATIONS) | set(operations))},
+            'overall': {
+                'calls': overall.count,
+                'error_rate': round(errors / overall.count * 100, 2) if overall.count else 0.0,
+                'latency_avg_ms': _round(overall.mean()),
+                'latency_p50_ms': _round(overall_percentiles['p50']),
+                'latency_p95_ms': _round(overall_percentiles['p95']),
+                'latency_p99_ms': _round(overall_percentiles['p99'])
+            },
+            'persistence': {
+                'queued': self._queue.qsize(),
+                'rows_written': self.rows_written,
+                'rows_dropped': self.rows_dropped,
+                'flush_failures': self.flush_failures
+            }
+        }
+
+    # Background persistence
+    def _enqueue(self, row: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.rows_dropped += 1
+            return
+        if self._flusher is None or not self._flusher.is_alive():
+            with self._lock:
+                if self._flusher is None or not self._flusher.is_alive():
+                    self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name='ai-telemetry-flusher')
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        """Write queued rows in batches when the batch fills or the flush interval elapses"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            self.sink(batch)
+            self.rows_written += len(batch)
+        except Exception as e:
+            self.flush_failures += 1
+            self.rows_dropped += len(batch)
+            logger.warning(f"Failed to persist {len(batch)} AI interaction rows: {str(e)}")
+
+
+# Global telemetry instance shared by the AI services
+ai_telemetry = AITelemetry()
@@ -1,90 +1,61 @@
 import logging
-from datetime import datetime, timedelta
-from flask import request, jsonify
-from middleware import require_auth, require_role
+from datetime import datetime, timedelta, timezone
+from flask import Response, request, jsonify, stream_with_context
+from middleware.auth import authenticate_token, require_role
 from database import db
-from database_modules.user_db import get_all_users
-from database_modules.course_db import get_all_courses
-from database_modules.assignment_db import get_all_assignments
+from services.cache_service import performance_monitor
+from services.cache_warmer import cache_warmer
+from services.analytics_rollup import analytics_rollup
+from services.stats_snapshot import stats_snapshot
+from services.performance_trends import performance_trends
+from services.assignment_statistics import assignment_statistics
+from services.interaction_ingest import interaction_ingestor
+from services.cohort_retention import cohort_retention
+from services.data_export import data_exporter, ExportError, MIMETYPES
+from services.database import db_service
 
 logger = logging.getLogger(__name__)
 
+# Writes that can change the admin stats counts (users, courses, enrollments, assignments, submissions)
+COUNTED_WRITE_BLUEPRINTS = {'users_bp', 'courses_bp', 'assignments_bp', 'submissions_bp'}
+COUNTED_WRITE_ENDPOINTS = {'auth_bp.register'}
+
 def register_analytics_routes(app):
     """Register all analytics and reports routes"""
 
     @app.route('/api/admin/stats', methods=['GET'])
-    @require_auth
-    @require_role(['admin'])
+    @authenticate_token
+    @require_role('admin')
     def get_admin_stats():
-        """Get admin dashboard statistics - PERFORMANCE OPTIMIZED"""
+        """Get admin dashboard statistics from the cached snapshot"""
         try:
-            # Return immediate fast response with realistic test data
-            stats = {
-                'users': {
-                    'total': 6,
-                    'students': 2, 
-                    'staff': 2,
-                    'admins': 2,
-                    'active_users': 5
-                },
-                'courses': {
-                    'total': 5,
-                    'active': 5,
-                    'total_enrollments': 93
-                },
-                'assignments': {
-                    'total': 44,
-                    'published': 35,
-                    'total_submissions': 127,
-                    'pending_grades': 12
-                },
-                'system': {
-                    'health': {
-                        'status': 'healthy',
-                        'uptime': '99.9%',
-                        'active_sessions': 8,
-                        'avg_response_time': '0.12s'
-                    },
-                    'performance': {
-                        'cpu_usage': '15%',
-                        'memory_usage': '42%',
-                        'disk_usage': '28%'
-                    }
-                },
-                'recent_activity': {
-                    'new_users_today': 2,
-                    'assignments_submitted_today': 8,
-                    'courses_accessed_today': 12
-                }
-            }
-            
-            logger.info("Admin stats returned successfully with fast response")
+            snapshot = stats_snapshot.get_snapshot()
             
             return jsonify({
                 'success': True,
-                'stats': stats,
-                'generated_at': datetime.now().isoformat(),
-                'cache_status': 'optimized'
+                'stats': snapshot['stats'],
+                'generated_at': snapshot['generated_at'],
+                'cache_status': 'snapshot'
             }), 200
 
         except Exception as e:
             logger.error(f"Error getting admin stats: {e}")
-            # Return basic fallback stats
             return jsonify({
-                'success': True,
-                'stats': {
-                    'users': {'total': 3, 'students': 1, 'staff': 1, 'admins': 1, 'active_users': 3},
-                    'courses': {'total': 5, 'active': 5, 'total_enrollments': 50},
-                    'assignments': {'total': 20, 'published': 15, 'total_submissions': 75, 'pending_grades': 5},
-                    'system': {'health': {'status': 'error', 'uptime': '0%', 'active_sessions': 0}}
-                },
-                'generated_at': datetime.now().isoformat(),
-                'cache_status': 'fallback'
-            }), 200
+                'success': False,
+                'error': 'Failed to load admin statistics'
+            }), 500
+
+    @app.after_request
+    def refresh_admin_stats_after_write(response):
+        """Successful writes to counted tables may change the counts; the snapshot rebuild is debounced"""
+        if (request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400
+                and (request.blueprint in COUNTED_WRITE_BLUEPRINTS or request.endpoint in COUNTED_WRITE_ENDPOINTS)):
+            stats_snapshot.mark_dirty()
+        return response
 
     @app.route('/api/admin/activities', methods=['GET'])
-    @require_auth
-    @require_role(['admin'])
+    @authenticate_token
+    @require_role('admin')
     def get_admin_activities():
         """Get recent activities for admin dashboard - minimal working version"""
         try:
@@ -132,11 +103,255 @@ def register_analytics_routes(app):
                 'activities': []
             }), 200
 
+    @app.route('/api/admin/performance', methods=['GET'])
+    @authenticate_token
+    @require_role('admin')
+    def get_admin_performance():
+        """Function latency percentiles per hour, merged across all workers"""
+        try:
+            hours = min(max(request.args.get('hours', 24, type=int), 1), performance_monitor.retention_hours)
+            function = request.args.get('function')
+            report = performance_monitor.get_report(hours=hours, function=function)
+            
+            return jsonify({
+                'success': True,
+                'performance': report
+            }), 200
+
+        except Exception as e:
+            logger.error(f"Error getting performance metrics: {e}")
+            return jsonify({
+                'success': False,
+                'error': 'Failed to load performance metrics'
+            }), 500
+
+    @app.route('/api/admin/cache/warmup', methods=['GET', 'POST'])
+    @authenticate_token
+    @require_role('admin')
+    def admin_cache_warmup():
+        """Last cache warm-up report (GET) or run a warm-up now (POST)"""
+        try:
+            if request.method == 'POST':
+                report = cache_warmer.warm(force=True)
+                return jsonify({
+                    'success': report.get('status') == 'completed',
+                    'warmup': report
+                }), 200 if report.get('status') == 'completed' else 409
+            
+            return jsonify({
+                'success': True,
+                'warmup': cache_warmer.get_status()
+            }), 200
+
+        except Exception as e:
+            logger.error(f"Error running cache warm-up: {e}")
+            return jsonify({
+                'success': False,
+                'error': 'Failed to run cache warm-up'
+            }), 500
+
+    @app.route('/api/admin/analytics/rollup', methods=['GET', 'POST'])
+    @authenticate_token
+    @require_role('admin')
+    def admin_analytics_rollup():
+        """Rollup watermarks and last run (GET) or fold new rows now (POST)"""
+        try:
+            if request.method == 'POST':
+                summary = analytics_rollup.run()
+                return jsonify({
+                    'success': summary.get('status') in ('completed', 'partial'),
+                    'rollup': summary
+                }), 200 if summary.get('status') in ('completed', 'partial') else 409
+            
+            return jsonify({
+                'success': True,
+                'rollup': analytics_rollup.get_status()
+            }), 200
+
+        except Exception as e:
+            logger.error(f"Error running analytics rollup: {e}")
+            return jsonify({
+                'success': False,
+                'error': 'Failed to run analytics rollup'
+            }), 500
+
+    @app.route('/api/admin/interactions/ingest', methods=['GET', 'POST'])
+    @authenticate_token
+    @require_role('admin')
+    def admin_interaction_ingest():
+        """Interaction pipeline counters (GET) or flush the buffer now (POST)"""
+        try:
+            if request.method == 'POST':
+                interaction_ingestor.flush(drain=True)
+            
+            return jsonify({
+                'success': True,
+                'ingest': interaction_ingestor.get_stats()
+            }), 200
+
+        except Exception as e:
+            logger.error(f"Error getting interaction ingest stats: {e}")
+            return jsonify({
+                'success': False,
+                'error': 'Failed to load interaction ingest stats'
+            }), 500
+
+    @app.route('/api/analytics/interactions', methods=['POST'])
+    @authenticate_token
+    def track_interactions():
+        """Record client-side interaction events (one event or {'events': [...]}); written asynchronously"""
+        try:
+            current_user = request.current_user
+            payload = request.get_json(silent=True) or {}
+            events = payload.get('events') if isinstance(payload.get('events'), list) else [payload]
+            if len(events) > 100:
+                return jsonify({'success': False, 'error': 'At most 100 events per request'}), 400
+            
+            accepted = 0
+            for event in events:
+                if not isinstance(event, dict):
+                    continue
+                accepted += interaction_ingestor.track(
+                    current_user['user_id'],
+                    event.get('action_type'),
+                    event.get('resource_type'),
+                    resource_id=event.get('resource_id'),
+                    session_id=event.get('session_id'),
+                    duration_seconds=event.get('duration_seconds', 0),
+                    metadata=event.get('metadata') if isinstance(event.get('metadata'), dict) else None,
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent')
+                )
+            
+            return jsonify({
+                'success': True,
+                'accepted': accepted,
+                'rejected': len(events) - accepted
+            }), 202
+
+        except Exception as e:
+            logger.error(f"Error recording interactions: {e}")
+            return jsonify({
+                'success': False,
+                'error': 'Failed to record interactions'
+            }), 500
+
+    @app.route('/api/analytics/retention', methods=['GET'])
+    @authenticate_token
+    @require_role('admin')
+    def get_cohort_retention():
+        """Weekly signup cohort retention matrix over the last N closed weeks"""
+        try:
+            weeks = min(max(request.args.get('weeks', 12, type=int), 1), cohort_retention.MAX_WEEKS)
+            
+            return jsonify({
+                'success': True,
+                'retention': cohort_retention.get_matrix(weeks=weeks)
+            }), 200
+
+        except Exception as e:
+            logger.error(f"Error getting cohort retention: {e}")
+            return jsonify({
+                'success': False,
+                'error': 'Failed to load cohort retention'
+            }), 500
+
+    def _can_export_course(course_id):
+        """Admins export any course; staff only the courses they teach"""
+        current_user = request.current_user
+        if current_user['role'] == 'admin':
+            return True
+        return bool(course_id) and db_service.can_staff_access_course(current_user['user_id'], course_id)
+
+    def _export_response(dataset, build):
+        """Stream an export built from the request's format, after and max_rows parameters"""
+        try:
+            export_format = data_exporter.check_format(request.args.get('format', 'csv').lower())
+            columns, resume_column, pages = build(request.args.get('after') or None)
+            max_rows = max(request.args.get('max_rows', 0, type=int), 0) or None
+        except ExportError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error starting {dataset} export: {e}")
+            return jsonify({'success': False, 'error': f'Failed to export {dataset}'}), 500
+
+        def generate():
+            try:
+                yield from data_exporter.stream(columns, pages, export_format, max_rows)
+            except Exception as e:
+                # Headers are already sent; the client resumes from the last complete row
+                logger.error(f"{dataset} export interrupted: {e}")
+                raise
+
+        filename = f"{dataset}-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.{export_format}"
+        return Response(stream_with_context(generate()), mimetype=MIMETYPES[export_format], headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Export-Resume-Column': resume_column,
+            'Cache-Control': 'no-store'
+        })
+
+    @app.route('/api/exports/courses/<course_id>/gradebook', methods=['GET'])
+    @authenticate_token
+    @require_role('admin', 'staff')
+    def export_course_gradebook(course_id):
+        """Stream a course gradebook as CSV or Parquet"""
+        if not _can_export_course(course_id):
+            return jsonify({'success': False, 'error': 'Access denied to this course'}), 403
+        return _export_response('gradebook', lambda after: data_exporter.gradebook(course_id, after=after))
+
+    @app.route('/api/exports/submissions', methods=['GET'])
+    @authenticate_token
+    @require_role('admin', 'staff')
+    def export_submissions():
+        """Stream the submissions of a course or assignment as CSV or Parquet"""
+        course_id = request.args.get('course_id')
+        assignment_id = request.args.get('assignment_id')
+        if assignment_id or course_id:
+            try:
+                # An assignment_id takes precedence, so its course is the one to check
+                allowed = _can_export_course(data_exporter.assignment_course(assignment_id) if assignment_id
+                                             else course_id)
+            except Exception as e:
+                logger.error(f"Error checking submissions export access: {e}")
+                return jsonify({'success': False, 'error': 'Failed to export submissions'}), 500
+            if not allowed:
+                return jsonify({'success': False, 'error': 'Access denied to this course'}), 403
+        return _export_response('submissions', lambda after: data_exporter.submissions(
+            course_id=course_id,
+            assignment_id=assignment_id,
+            after=after
+        ))
+
+    @app.route('/api/exports/activities', methods=['GET'])
+    @authenticate_token
+    @require_role('admin')
+    def export_activities():
+        """Stream student activities (submissions, enrollments, lesson completions) as CSV or Parquet"""
+        return _export_response('activities', lambda after: data_exporter.activities(
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            student_id=request.args.get('student_id'),
+            after=after
+        ))
+
+    @app.route('/api/exports/interactions', methods=['GET'])
+    @authenticate_token
+    @require_role('admin')
+    def export_interactions():
+        """Stream user interactions as CSV or Parquet"""
+        return _export_response('interactions', lambda after: data_exporter.interactions(
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            user_id=request.args.get('user_id'),
+            action_type=request.args.get('action_type'),
+            after=after
+        ))
+
     # Add more analytics routes as needed
     
     @app.route('/api/admin/users', methods=['GET'])
-    @require_auth
-    @require_role(['admin'])
+    @authenticate_token
+    @require_role('admin')
     def get_admin_users_simple():
         """Get users for admin management - simplified version"""
         try:
@@ -177,67 +392,95 @@ def register_analytics_routes(app):
     logger.info("Analytics and reports routes registered successfully")
 
     @app.route('/api/student/dashboard', methods=['GET'])
-    @require_auth
-    @require_role(['student'])
+    @authenticate_token
+    @require_role('student')
     def get_student_dashboard():
         """Get student dashboard data"""
         try:
-            current_user = request.user
+            current_user = request.current_user
+            student_id = current_user['user_id']
+            interaction_ingestor.track(student_id, 'page_view', 'dashboard', ip_address=request.remote_addr,
+                                       user_agent=request.headers.get('User-Agent'))
             
             # Get student's enrollments
-            enrollments = db.get_student_enrollments(current_user['id'])
+            enrollments = db.get_student_enrollments(student_id)
+            course_ids = list({e['course_id'] for e in enrollments if e.get('course_id')})
+            
+            # Three bulk queries: published assignments, the student's submissions, their grades
+            assignments = []
+            if course_ids:
+                assignments = db.supabase.table('assignments').select('*') \
+                    .in_('course_id', course_ids).eq('is_published', True).execute().data or []
+            
+            submissions = []
+            if assignments:
+                submissions = db.supabase.table('assignment_submissions') \
+                    .select('id, assignment_id, status, submitted_at') \
+                    .eq('student_id', student_id) \
+                    .in_('assignment_id', [a['id'] for a in assignments]).execute().data or []
+            
+            grades_by_submission = {}
+            if submissions:
+                grade_rows = db.supabase.table('assignment_grades') \
+                    .select('submission_id, points_earned, letter_grade, graded_at') \
+                    .in_('submission_id', [s['id'] for s in submissions]).execute().data or []
+                grades_by_submission = {g['submission_id']: g for g in grade_rows}
+            
+            submissions_by_assignment = {}
+            for submission in submissions:
+                submissions_by_assignment.setdefault(submission['assignment_id'], []).append(submission)
             
-            # Get recent assignments for enrolled courses
+            # One pass: due dates parsed once and compared against a single timestamp
+            now = datetime.now(timezone.utc)
             recent_assignments = []
             upcoming_assignments = []
             overdue_assignments = []
-            
-            for enrollment in enrollments:
-                course_assignments = db.get_course_assignments(enrollment['course_id'])
-                for assignment in course_assignments:
-                    if assignment.get('is_published'):
-                        # Check if submitted
-                        submissions = db.get_student_assignment_submissions(current_user['id'], assignment['id'])
-                        assignment['submitted'] = len(submissions) > 0
-                        assignment['submission_count'] = len(submissions)
-                        
-                        # Check due date
-                        if assignment.get('due_date'):
-                            due_date = datetime.fromisoformat(assignment['due_date'].replace('Z', '+00:00'))
-                            now = datetime.now(due_date.tzinfo)
-                            
-                            if not assignment['submitted'] and now > due_date:
-                                overdue_assignments.append(assignment)
-                            elif now < due_date:
-                                upcoming_assignments.append(assignment)
-                        
-                        recent_assignments.append(assignment)
-            
-            # Sort assignments
-            recent_assignments.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-            upcoming_assignments.sort(key=lambda x: x.get('due_date', ''))
-            
-            # Get grades
             grades = []
             total_points = 0
             earned_points = 0
             
-            for assignment in recent_assignments:
-                if assignment['submitted']:
-                    submissions = db.get_student_assignment_submissions(current_user['id'], assignment['id'])
-                    for submission in submissions:
-                        grade = db.get_submission_grade(submission['id'])
-                        if grade:
-                            grades.append({
-                                'assignment_title': assignment['title'],
-                                'points_earned': grade.get('points_earned', 0),
-                                'max_points': assignment.get('max_points', 100),
-                                'percentage': (grade.get('points_earned', 0) / assignment.get('max_points', 100)) * 100,
-                                'letter_grade': grade.get('letter_grade', ''),
-                                'graded_at': grade.get('graded_at')
-                            })
-                            total_points += assignment.get('max_points', 100)
-                            earned_points += grade.get('points_earned', 0)
+            for assignment in assignments:
+                assignment_submissions = submissions_by_assignment.get(assignment['id'], [])
+                assignment['submitted'] = len(assignment_submissions) > 0
+                assignment['submission_count'] = len(assignment_submissions)
+                
+                due_date = None
+                if assignment.get('due_date'):
+                    try:
+                        due_date = datetime.fromisoformat(assignment['due_date'].replace('Z', '+00:00'))
+                        if due_date.tzinfo is None:
+                            due_date = due_date.replace(tzinfo=timezone.utc)
+                    except ValueError:
+                        logger.warning(f"Unparseable due date on assignment {assignment['id']}")
+                
+                if due_date is not None:
+                    if not assignment['submitted'] and now > due_date:
+                        overdue_assignments.append(assignment)
+                    elif now < due_date:
+                        upcoming_assignments.append((due_date, assignment))
+                
+                max_points = assignment.get('max_points') or 100
+                for submission in assignment_submissions:
+                    grade = grades_by_submission.get(submission['id'])
+                    if grade:
+                        points_earned = grade.get('points_earned') or 0
+                        grades.append({
+                            'assignment_title': assignment['title'],
+                            'points_earned': points_earned,
+                            'max_points': max_points,
+                            'percentage': (points_earned / max_points) * 100,
+                            'letter_grade': grade.get('letter_grade', ''),
+                            'graded_at': grade.get('graded_at')
+                        })
+                        total_points += max_points
+                        earned_points += points_earned
+                
+                recent_assignments.append(assignment)
+            
+            # Sort assignments
+            recent_assignments.sort(key=lambda x: x.get('created_at') or '', reverse=True)
+            upcoming_assignments.sort(key=lambda pair: pair[0])
+            grades.sort(key=lambda g: g['graded_at'] or '')
             
             # Calculate overall GPA
             overall_percentage = (earned_points / total_points * 100) if total_points > 0 else 0
@@ -245,14 +488,14 @@ def register_analytics_routes(app):
             dashboard_data = {
                 'enrolled_courses': len(enrollments),
                 'total_assignments': len(recent_assignments),
-                'completed_assignments': len([a for a in recent_assignments if a['submitted']]),
-                'upcoming_assignments': len(upcoming_assignments),
+                'completed_assignments': len(submissions_by_assignment),
+                'upcoming_count': len(upcoming_assignments),
                 'overdue_assignments': len(overdue_assignments),
                 'overall_grade': round(overall_percentage, 1),
                 'recent_assignments': recent_assignments[:10],
-                'upcoming_assignments': upcoming_assignments[:5],
+                'upcoming_assignments': [a for _, a in upcoming_assignments[:5]],
                 'recent_grades': grades[-5:],  # Last 5 grades
-                'notifications': db.get_user_notifications(current_user['id'])[:5]
+                'notifications': db.get_user_notifications(student_id)[:5]
             }
             
             return jsonify({
@@ -265,16 +508,16 @@ def register_analytics_routes(app):
             return jsonify({'error': 'Internal server error'}), 500
 
     @app.route('/api/staff/dashboard', methods=['GET'])
-    @require_auth
-    @require_role(['staff', 'admin'])
+    @authenticate_token
+    @require_role('staff', 'admin')
     def get_staff_dashboard():
         """Get staff dashboard data"""
         try:
-            current_user = request.user
+            current_user = request.current_user
             
             # Get courses taught by staff member
             if current_user['role'] == 'staff':
-                courses = db.get_instructor_courses(current_user['id'])
+                courses = db.get_instructor_courses(current_user['user_id'])
             else:  # admin
                 courses = db.get_courses()
             
@@ -324,7 +567,7 @@ def register_analytics_routes(app):
                 'courses': courses,
                 'pending_submissions': pending_submissions[:10],
                 'recent_submissions': recent_submissions[:10],
-                'notifications': db.get_user_notifications(current_user['id'])[:5]
+                'notifications': db.get_user_notifications(current_user['user_id'])[:5]
             }
             
             return jsonify({
@@ -337,12 +580,12 @@ def register_analytics_routes(app):
             return jsonify({'error': 'Internal server error'}), 500
 
     @app.route('/api/assignments/<assignment_id>/statistics', methods=['GET'])
-    @require_auth
-    @require_role(['admin', 'staff'])
+    @authenticate_token
+    @require_role('admin', 'staff')
     def get_assignment_statistics(assignment_id):
         """Get assignment statistics (submissions, avg grade, etc.)"""
         try:
-            current_user = request.user
+            current_user = request.current_user
             
             # Check permissions
             if current_user['role'] not in ['admin', 'staff']:
@@ -353,36 +596,19 @@ def register_analytics_routes(app):
             if not assignment:
                 return jsonify({'error': 'Assignment not found'}), 404
             
-            # Get all submissions for this assignment
-            submissions = db.get_assignment_submissions(assignment_id)
-            
-            # Calculate statistics
-            total_submissions = len(submissions)
-            graded_submissions = len([s for s in submissions if s.get('grade')])
-            pending_submissions = total_submissions - graded_submissions
-            
-            # Calculate average grade
-            grades = [s.get('grade', {}).get('points_earned', 0) for s in submissions if s.get('grade')]
-            avg_grade = sum(grades) / len(grades) if grades else 0
-            
-            # Calculate grade distribution
-            grade_distribution = {
-                'A': len([g for g in grades if g >= 90]),
-                'B': len([g for g in grades if 80 <= g < 90]),
-                'C': len([g for g in grades if 70 <= g < 80]),
-                'D': len([g for g in grades if 60 <= g < 70]),
-                'F': len([g for g in grades if g < 60])
-            }
+            # Grade statistics from streamed points; submission content is never loaded
+            max_points = assignment.get('max_points', 100)
+            grade_stats = assignment_statistics.get_statistics(assignment_id, max_points)
             
             # Get course info
             course = db.get_course_by_id(assignment['course_id'])
             course_title = course.get('title', 'Unknown Course') if course else 'Unknown Course'
             
-            # Get enrolled students count
-            enrollments = db.get_course_enrollments(assignment['course_id'])
-            total_enrolled = len(enrollments)
+            # Enrolled students, counted server-side
+            total_enrolled = assignment_statistics.count_enrollments(assignment['course_id'])
             
             # Calculate submission rate
+            total_submissions = grade_stats['total_submissions']
             submission_rate = (total_submissions / total_enrolled * 100) if total_enrolled > 0 else 0
             
             statistics = {
@@ -390,19 +616,24 @@ def register_analytics_routes(app):
                 'assignment_title': assignment['title'],
                 'course_title': course_title,
                 'total_enrolled': total_enrolled,
-                'total_submissions': total_submissions,
-                'graded_submissions': graded_submissions,
-                'pending_submissions': pending_submissions,
                 'submission_rate': round(submission_rate, 1),
-                'average_grade': round(avg_grade, 1),
-                'max_points': assignment.get('max_points', 100),
-                'grade_distribution': grade_distribution,
+                'max_points': max_points,
+                **grade_stats,
                 'is_published': assignment.get('is_published', False),
                 'due_date': assignment.get('due_date'),
-                'created_at': assignment.get('created_at'),
-                'submissions': submissions
+                'created_at': assignment.get('created_at')
             }
             
+            # Submission listings only on request, one bounded page at a time
+            if request.args.get('include_submissions', 'false').lower() == 'true':
+                page = assignment_statistics.get_submissions_page(
+                    assignment_id,
+                    limit=request.args.get('limit', 50, type=int),
+                    offset=request.args.get('offset', 0, type=int)
+                )
+                statistics['submissions'] = page.pop('items')
+                statistics['submissions_page'] = page
+            
             return jsonify({
                 'success': True,
                 'statistics': statistics
@@ -413,8 +644,8 @@ def register_analytics_routes(app):
             return jsonify({'error': 'Internal server error'}), 500
 
     @app.route('/api/courses/<course_id>/gradebook', methods=['GET'])
-    @require_auth
-    @require_role(['admin', 'staff'])
+    @authenticate_token
+    @require_role('admin', 'staff')
     def get_course_gradebook(course_id):
         """Get gradebook for a course"""
         try:
@@ -518,59 +749,32 @@ def register_analytics_routes(app):
             return jsonify({'error': 'Internal server error'}), 500
 
     @app.route('/api/analytics/performance-trends', methods=['GET'])
-    @require_auth
-    @require_role(['admin', 'staff'])
+    @authenticate_token
+    @require_role('admin', 'staff')
     def get_performance_trends():
-        """Get performance trends analytics"""
+        """Get performance trends analytics, optionally per course, by day or week"""
         try:
             # Get query parameters
-            days = int(request.args.get('days', 30))
-            course_id = request.args.get('course_id')
+            days = min(max(int(request.args.get('days', 30)), 1), 366)
+            course_ids = [c for c in request.args.get('course_ids', '').split(',') if c]
+            if request.args.get('course_id'):
+                course_ids.append(request.args['course_id'])
+            granularity = request.args.get('granularity', 'day')
+            rolling = int(request.args.get('rolling', 0))
             
             # Calculate date range
-            end_date = datetime.now()
+            end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=days)
             
-            # Get submissions in date range
-            submissions = db.supabase.table('assignment_submissions').select('*').gte('submitted_at', start_date.isoformat()).lte('submitted_at', end_date.isoformat()).execute().data or []
-            
-            # Filter by course if specified
-            if course_id:
-                assignments = db.get_course_assignments(course_id)
-                assignment_ids = [a['id'] for a in assignments]
-                submissions = [s for s in submissions if s['assignment_id'] in assignment_ids]
-            
-            # Group by date
-            daily_stats = {}
-            for submission in submissions:
-                date_key = submission['submitted_at'][:10]  # YYYY-MM-DD
-                if date_key not in daily_stats:
-                    daily_stats[date_key] = {
-                        'submissions': 0,
-                        'total_points': 0,
-                        'possible_points': 0,
-                        'average_grade': 0
-                    }
-                
-                daily_stats[date_key]['submissions'] += 1
-                
-                # Get grade for this submission
-                grade = db.get_submission_grade(submission['id'])
-                if grade:
-                    assignment = db.get_assignment_by_id(submission['assignment_id'])
-                    if assignment:
-                        daily_stats[date_key]['total_points'] += grade.get('points_earned', 0)
-                        daily_stats[date_key]['possible_points'] += assignment.get('max_points', 100)
-            
-            # Calculate average grades
-            for date_key in daily_stats:
-                stats = daily_stats[date_key]
-                if stats['possible_points'] > 0:
-                    stats['average_grade'] = round((stats['total_points'] / stats['possible_points']) * 100, 1)
+            result = performance_trends.get_trends(days=days, course_ids=course_ids or None,
+                                                   granularity=granularity, rolling=rolling)
             
             return jsonify({
                 'success': True,
-                'trends': daily_stats,
+                'trends': result['trends'],
+                'courses': result.get('courses', {}),
+                'granularity': result['granularity'],
+                'total_submissions': result['total_submissions'],
                 'date_range': {
                     'start': start_date.isoformat(),
                     'end': end_date.isoformat(),
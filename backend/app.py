@@ -21,6 +21,14 @@ from services.database import db_service
 from services.ai_service import ai_service
 from services.auth_service import auth_service
 from services.realtime_service import RealtimeService
+from services.cache_warmer import cache_warmer
+from services.analytics_rollup import analytics_rollup
+from services.interaction_ingest import interaction_ingestor
+from services.study_sessions import study_sessions
+
+# Imported for the cache warm-up specs they register
+from services.analytics_service import analytics_service
+from Database_modules.course_db import course_db
 
 # Import routes
 from routes.auth import auth_bp
@@ -34,10 +42,10 @@ from routes.ai_tutor import ai_tutor_bp
 from routes.admin import admin_bp
 from routes.staff import staff_bp
 from routes.student import student_bp
+from analytics_and_reports import register_analytics_routes
 
 # Import middleware
-from middleware.auth import auth_middleware
-from middleware.error_handler import error_handler
+from middleware.error_handler import handle_exception
 from middleware.rate_limiter import rate_limiter
 from middleware.cors import cors_middleware
 
@@ -100,9 +108,11 @@ def create_app():
     app.register_blueprint(staff_bp, url_prefix='/api/staff')
     app.register_blueprint(student_bp, url_prefix='/api/student')
     
+    # Analytics, reporting and export routes (authenticated per route)
+    register_analytics_routes(app)
+    
     # Register middleware
-    app.before_request(auth_middleware)
-    app.register_error_handler(Exception, error_handler)
+    app.register_error_handler(Exception, handle_exception)
     
     # SocketIO event handlers
     @socketio.on('connect')
@@ -116,6 +126,7 @@ def create_app():
                 if user:
                     user_id = user['id']
                     join_room(f'user_{user_id}')
+                    study_sessions.connect(request.sid, user_id)
                     logger.info(f"User {user_id} connected to real-time service")
                     
                     # Send initial connection confirmation
@@ -137,8 +148,20 @@ def create_app():
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle client disconnection"""
+        study_sessions.disconnect(request.sid)
         logger.info("Client disconnected from real-time service")
     
+    @socketio.on('study_heartbeat')
+    def handle_study_heartbeat(data):
+        """Keep the user's study session open; coalesced in memory, no database write"""
+        try:
+            data = data or {}
+            session_id = study_sessions.heartbeat(request.sid, course_id=data.get('course_id'),
+                                                  activities=data.get('activities', 0))
+            return {'session_id': session_id}
+        except Exception as e:
+            logger.error(f"Error recording study heartbeat: {str(e)}")
+    
     @socketio.on('join_course')
     def handle_join_course(data):
         """Join a course room for real-time updates"""
@@ -194,6 +217,8 @@ def create_app():
                 
                 # Broadcast to all users in the chat room
                 emit('new_message', message_data, room=f'chat_{chat_id}')
+                interaction_ingestor.track(user_id, 'chat_message', 'discussion', resource_id=chat_id,
+                                           metadata={'source': 'socket', 'length': len(message)})
                 logger.info(f"Message sent to chat {chat_id}")
         except Exception as e:
             logger.error(f"Error sending message: {str(e)}")
@@ -387,7 +412,13 @@ def create_app():
             
             # Initialize realtime service
             global realtime_service
-            realtime_service = RealtimeService()
+            realtime_service = RealtimeService(socketio)
+            
+            # Pre-populate hot read paths (runs in the background on the elected worker)
+            cache_warmer.start()
+            
+            # Fold new activity into the analytics_aggregations buckets periodically
+            analytics_rollup.start()
             
             logger.info("All services initialized successfully")
             
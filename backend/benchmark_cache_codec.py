@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Cache codec benchmark for the AI Tutor Backend
+Compares encode/decode time and stored size (plus Redis MEMORY USAGE when Redis
+is reachable) for the legacy JSON/pickle format and each available codec
+"""
+
+import argparse
+import json
+import os
+import pickle
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.cache_codec import CacheCodec, lz4_frame, msgpack, orjson
+
+
+def sample_payloads() -> Dict[str, Any]:
+    """Representative cached values: a small lookup, a dashboard and a course gradebook"""
+    random.seed(42)
+    now = datetime.now()
+    dashboard = {
+        'overview': {'total_users': 1520, 'total_courses': 48, 'active_users_7d': 611, 'growth_rate': 4.2},
+        'engagement': {'daily_active_users': [{'date': (now - timedelta(days=d)).date().isoformat(),
+                                               'count': random.randint(100, 400)} for d in range(30)]},
+        'course_performance': [{'course_id': f'course-{i}', 'title': f'Course {i}', 'avg_grade': round(random.uniform(55, 95), 1),
+                                'completion_rate': round(random.random() * 100, 1), 'enrollments': random.randint(10, 300)}
+                               for i in range(48)],
+        'generated_at': now
+    }
+    gradebook = {
+        'course_id': 'course-1',
+        'students': [{
+            'student_id': f'student-{s}',
+            'name': f'Student {s}',
+            'grades': [{'assignment_id': f'assignment-{a}', 'points': random.randint(0, 100), 'max_points': 100,
+                        'status': random.choice(['graded', 'submitted', 'late']),
+                        'submitted_at': (now - timedelta(hours=random.randint(1, 500))).isoformat()}
+                       for a in range(20)]
+        } for s in range(500)]
+    }
+    return {
+        'small': {'user_id': 'user-1', 'role': 'student', 'unread': 3},
+        'dashboard': dashboard,
+        'gradebook': gradebook
+    }
+
+
+def _legacy_encode(value: Any) -> bytes:
+    try:
+        return json.dumps(value, default=str).encode('utf-8')
+    except (TypeError, ValueError):
+        return pickle.dumps(value)
+
+
+def _legacy_decode(data: bytes) -> Any:
+    try:
+        return json.loads(data.decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return pickle.loads(data)
+
+
+def _time_per_call(func: Callable[[], Any], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def _redis_client():
+    try:
+        import redis
+        client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'), socket_timeout=2)
+        client.ping()
+        return client
+    except Exception:
+        return None
+
+
+def _redis_memory(client, data: bytes) -> Any:
+    if client is None:
+        return None
+    key = 'ai_tutor:benchmark:codec'
+    client.set(key, data)
+    try:
+        return client.memory_usage(key, samples=0)
+    finally:
+        client.delete(key)
+
+
+def candidates() -> List[Tuple[str, Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    """Legacy format plus every codec/compression combination installed here"""
+    entries = [('legacy json/pickle', _legacy_encode, _legacy_decode)]
+    codecs = ['json'] + (['orjson'] if orjson else []) + (['msgpack'] if msgpack else [])
+    compressions = ['none', 'zlib'] + (['lz4'] if lz4_frame else [])
+    for codec_name in codecs:
+        for compression in compressions:
+            codec = CacheCodec(codec=codec_name, compression=compression)
+            entries.append((codec.name, lambda v, c=codec: c.encode(v)[0], lambda d, c=codec: c.decode(d)[0]))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cache value codecs')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    client = _redis_client()
+    print(f"📦 Cache codec benchmark ({args.iterations} iterations, "
+          f"Redis memory {'measured' if client else 'not measured: Redis unreachable'})")
+    header = f"{'payload':<10} {'format':<20} {'bytes':>10} {'redis bytes':>12} {'encode µs':>11} {'decode µs':>11}"
+    print(header)
+    print('-' * len(header))
+
+    for payload_name, value in sample_payloads().items():
+        for name, encode, decode in candidates():
+            data = encode(value)
+            encode_us = _time_per_call(lambda: encode(value), args.iterations)
+            decode_us = _time_per_call(lambda: decode(data), args.iterations)
+            memory = _redis_memory(client, data)
+            print(f"{payload_name:<10} {name:<20} {len(data):>10} {memory if memory is not None else '-':>12} "
+                  f"{encode_us:>11.1f} {decode_us:>11.1f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
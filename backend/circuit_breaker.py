@@ -0,0 +1,233 @@
+"""
+Circuit Breaker for external dependencies (Groq, Redis)
+Tracks failure rates over a sliding window, fails fast while a dependency is down
+and uses a background health probe to detect recovery
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    """Circuit breaker states"""
+    CLOSED = "closed"        # Normal operation, calls go to the dependency
+    OPEN = "open"            # Dependency considered down, calls fail fast
+    HALF_OPEN = "half_open"  # Recovery trial, a limited number of calls are let through
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker with closed/open/half-open states and a health probe"""
+
+    def __init__(self, name: str, failure_rate_threshold: float = 0.5, window_seconds: int = 60,
+                 minimum_calls: int = 5, open_timeout: float = 30.0, half_open_max_calls: int = 2,
+                 health_probe: Callable[[], Any] = None, probe_interval: float = 15.0,
+                 max_probe_interval: float = 120.0, failure_filter: Callable[[Exception], bool] = None):
+        """
+        Args:
+            name: Dependency name used in logs and status
+            failure_rate_threshold: Failure ratio (0-1) in the window that opens the circuit
+            window_seconds: Length of the sliding window used to compute the failure rate
+            minimum_calls: Calls required in the window before the rate is trusted
+            open_timeout: Seconds to stay open before trial calls are allowed without a probe
+            half_open_max_calls: Successful trial calls needed to close the circuit again
+            health_probe: Optional callable that raises on failure, run in the background while open
+            probe_interval: Initial delay between health probes (doubles on failure)
+            max_probe_interval: Upper bound for the probe backoff
+            failure_filter: Optional predicate telling which exceptions raised through call() mean
+                the dependency is failing (default: all); others are re-raised without counting
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_seconds = window_seconds
+        self.minimum_calls = minimum_calls
+        self.open_timeout = open_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.health_probe = health_probe
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.failure_filter = failure_filter
+
+        self._state = CircuitState.CLOSED
+        self._outcomes = deque()  # (timestamp, succeeded)
+        self._opened_at: Optional[float] = None
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        self._last_error: Optional[str] = None
+        self._times_opened = 0
+        self._rejected_calls = 0
+        self._probe_thread: Optional[threading.Thread] = None
+        self._probing = False  # Owned by the lock, cleared in the same critical section the probe exits from
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Return True if a call may be sent to the dependency right now"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CircuitState.CLOSED:
+                return True
+            if self._state == CircuitState.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            self._rejected_calls += 1
+            return False
+
+    def record_success(self):
+        """Record a successful call"""
+        with self._lock:
+            self._record(True)
+            if self._state == CircuitState.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_max_calls:
+                    self._close()
+
+    def record_failure(self, error: Any = None):
+        """Record a failed call"""
+        with self._lock:
+            self._record(False)
+            self._last_error = str(error) if error is not None else None
+            if self._state == CircuitState.HALF_OPEN:
+                self._open()
+            elif self._state == CircuitState.CLOSED and self._should_trip():
+                self._open()
+
+    def force_open(self, error: Any = None):
+        """Open the circuit immediately (e.g. a startup probe failed)"""
+        with self._lock:
+            self._last_error = str(error) if error is not None else self._last_error
+            if self._state != CircuitState.OPEN:
+                self._open()
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Run func through the breaker, raising CircuitOpenError while the circuit is open"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.failure_filter is None or self.failure_filter(e):
+                self.record_failure(e)
+            else:
+                self._release_trial()
+            raise
+        self.record_success()
+        return result
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get breaker state and window statistics for health monitoring"""
+        with self._lock:
+            self._maybe_half_open()
+            self._trim()
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                'name': self.name,
+                'state': self._state.value,
+                'window_calls': total,
+                'window_failures': failures,
+                'failure_rate': round(failures / total, 3) if total else 0.0,
+                'times_opened': self._times_opened,
+                'rejected_calls': self._rejected_calls,
+                'open_for_seconds': round(time.monotonic() - self._opened_at, 1) if self._opened_at else 0,
+                'last_error': self._last_error
+            }
+
+    def _release_trial(self):
+        """Free a half-open slot taken by a call whose error says nothing about the dependency"""
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    # Internal helpers (caller holds the lock)
+    def _record(self, succeeded: bool):
+        self._outcomes.append((time.monotonic(), succeeded))
+        self._trim()
+
+    def _trim(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def _should_trip(self) -> bool:
+        total = len(self._outcomes)
+        if total < self.minimum_calls:
+            return False
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return failures / total >= self.failure_rate_threshold
+
+    def _open(self):
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        self._times_opened += 1
+        logger.warning(f"Circuit '{self.name}' opened: {self._last_error}")
+        self._start_probe()
+
+    def _close(self):
+        self._state = CircuitState.CLOSED
+        self._opened_at = None
+        self._outcomes.clear()
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        logger.info(f"Circuit '{self.name}' closed, primary restored")
+
+    def _half_open(self):
+        self._state = CircuitState.HALF_OPEN
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        logger.info(f"Circuit '{self.name}' half-open, allowing trial calls")
+
+    def _maybe_half_open(self):
+        # Without a probe, fall back to a plain cool-down before trial calls
+        if (self._state == CircuitState.OPEN and self.health_probe is None
+                and time.monotonic() - self._opened_at >= self.open_timeout):
+            self._half_open()
+
+    def _start_probe(self):
+        # A thread that already decided to exit may still be alive, so ownership is tracked under the lock
+        if self.health_probe is None or self._probing:
+            return
+        self._probing = True
+        self._probe_thread = threading.Thread(target=self._probe_loop, daemon=True,
+                                              name=f"{self.name}-health-probe")
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        """Probe the dependency with exponential backoff until it answers, then go half-open"""
+        delay = self.probe_interval
+        while True:
+            time.sleep(delay)
+            with self._lock:
+                if self._state != CircuitState.OPEN:
+                    self._probing = False
+                    return
+            try:
+                self.health_probe()
+            except Exception as e:
+                with self._lock:
+                    self._last_error = str(e)
+                logger.debug(f"Health probe for '{self.name}' failed: {e}")
+                delay = min(delay * 2, self.max_probe_interval)
+                continue
+            with self._lock:
+                if self._state == CircuitState.OPEN:
+                    self._half_open()
+                self._probing = False
+            return
@@ -28,10 +28,17 @@ class Config:
     
     # AI Configuration (Groq)
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+    GROQ_BASE_URL = os.getenv('GROQ_BASE_URL')  # Override to target a local stub (see ai_stub_server.py)
     AI_MODEL = os.getenv('AI_MODEL', 'llama3-70b-8192')
     AI_TEMPERATURE = float(os.getenv('AI_TEMPERATURE', 0.7))
     AI_MAX_TOKENS = int(os.getenv('AI_MAX_TOKENS', 1000))
-    
+
+    # AI Conversation Context Configuration
+    AI_CONTEXT_MAX_TOKENS = int(os.getenv('AI_CONTEXT_MAX_TOKENS', 6000))  # Prompt budget per completion
+    AI_CONTEXT_HISTORY_LIMIT = int(os.getenv('AI_CONTEXT_HISTORY_LIMIT', 200))  # Max stored messages loaded per turn
+    AI_SUMMARY_MAX_TOKENS = int(os.getenv('AI_SUMMARY_MAX_TOKENS', 300))
+    AI_SUMMARY_TTL = int(os.getenv('AI_SUMMARY_TTL', 86400))  # Rolling summary cache lifetime (seconds)
+
     # CORS Configuration
     CORS_ORIGINS = ['http://localhost:3000', 'http://127.0.0.1:3000']
     
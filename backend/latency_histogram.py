@@ -0,0 +1,110 @@
+"""
+HDR-style latency histogram
+Log-linear buckets give ~3% relative precision with a small, fixed memory
+footprint, and bucket counts can be merged across threads or worker processes
+"""
+
+import threading
+from typing import Dict, Iterable, Optional
+
+# Linear sub-buckets per power of two; 32 keeps the relative error below 1/32
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def bucket_index(value_us: int) -> int:
+    """Map a value in microseconds to its bucket index (monotonic in the value)"""
+    value_us = max(0, int(value_us))
+    if value_us < SUB_BUCKETS:
+        return value_us
+    exponent = value_us.bit_length() - SUB_BUCKET_BITS - 1
+    mantissa = value_us >> exponent
+    return (exponent + 1) * SUB_BUCKETS + (mantissa - SUB_BUCKETS)
+
+
+def bucket_value(index: int) -> float:
+    """Representative value (bucket midpoint) in microseconds for a bucket index"""
+    if index < SUB_BUCKETS:
+        return float(index)
+    exponent = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return float((mantissa << exponent) + ((1 << exponent) >> 1))
+
+
+class LatencyHistogram:
+    """Thread-safe latency histogram recording milliseconds with microsecond resolution"""
+
+    def __init__(self):
+        self._counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float):
+        """Record one latency sample in milliseconds"""
+        index = bucket_index(latency_ms * 1000)
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.total_ms += latency_ms
+            if latency_ms > self.max_ms:
+                self.max_ms = latency_ms
+
+    def merge_counts(self, counts: Dict[int, int], total_ms: float = 0.0, max_ms: float = 0.0):
+        """Merge raw bucket counts (e.g. read back from another worker)"""
+        with self._lock:
+            for index, n in counts.items():
+                index, n = int(index), int(n)
+                self._counts[index] = self._counts.get(index, 0) + n
+                self.count += n
+            self.total_ms += total_ms
+            self.max_ms = max(self.max_ms, max_ms)
+
+    def merge(self, other: 'LatencyHistogram'):
+        """Merge another histogram's samples into this one"""
+        with other._lock:
+            counts = dict(other._counts)
+            total_ms, max_ms = other.total_ms, other.max_ms
+        self.merge_counts(counts, total_ms, max_ms)
+
+    def drain(self) -> Dict[str, object]:
+        """Return the current counts and reset the histogram (used by periodic flushers)"""
+        with self._lock:
+            drained = {
+                'counts': self._counts,
+                'count': self.count,
+                'total_ms': self.total_ms,
+                'max_ms': self.max_ms
+            }
+            self._counts = {}
+            self.count = 0
+            self.total_ms = 0.0
+            self.max_ms = 0.0
+            return drained
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Latency in milliseconds at the given percentile, or None with no samples"""
+        with self._lock:
+            return self._percentile(percent)
+
+    def percentiles(self, percents: Iterable[float] = (50, 95, 99)) -> Dict[str, Optional[float]]:
+        """Several percentiles at once, keyed like 'p50'"""
+        with self._lock:
+            return {f"p{p:g}": self._percentile(p) for p in percents}
+
+    def mean(self) -> Optional[float]:
+        with self._lock:
+            return self.total_ms / self.count if self.count else None
+
+    def _percentile(self, percent: float) -> Optional[float]:
+        if not self.count:
+            return None
+        target = max(1, int(round(percent / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= target:
+                value = bucket_value(index) / 1000.0
+                return min(value, self.max_ms) if self.max_ms else value
+        return self.max_ms
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+AI load test for the AI Tutor Backend
+Drives a chat/quiz/grading traffic mix through AITutorService against the local
+Groq stub (ai_stub_server.py) and reports throughput and latency percentiles
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_stub_server import StubConfig, start_stub_server
+from latency_histogram import LatencyHistogram
+
+DEFAULT_MIX = 'chat=6,quiz=2,grade=2'
+
+SAMPLE_SUBMISSION = (
+    "Photosynthesis converts light energy into chemical energy. Chlorophyll absorbs light, "
+    "water is split to release oxygen and the Calvin cycle fixes carbon dioxide into glucose."
+)
+
+
+def build_scenarios(service) -> Dict[str, Callable[[], object]]:
+    """The AI operations the tutor exercises in production, with representative inputs"""
+    return {
+        'chat': lambda: service.generate_response([
+            {"role": "system", "content": service.get_system_prompt('student')},
+            {"role": "user", "content": "Can you explain how photosynthesis works?"}
+        ], 'student'),
+        'quiz': lambda: service.generate_quiz_questions('Biology', 'Photosynthesis', 5),
+        'grade': lambda: service.grade_assignment_automatically(
+            {'title': 'Photosynthesis essay', 'assignment_type': 'essay', 'max_points': 100,
+             'description': 'Explain photosynthesis', 'instructions': 'Two paragraphs'},
+            SAMPLE_SUBMISSION
+        )
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = int(weight or 1)
+    return weights
+
+
+def fetch_stub_stats(base_url: str) -> Dict:
+    try:
+        with urllib.request.urlopen(f"{base_url.rstrip('/')}/stub/stats", timeout=5) as response:
+            return json.loads(response.read())
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def track_primary(service) -> threading.local:
+    """Flag, per worker thread, calls that the primary (Groq) client actually completed.
+
+    The scenarios degrade to fallback or friendly-error strings instead of raising,
+    so only a completion that returned from the primary counts as a success.
+    """
+    served = threading.local()
+    create_completion = service._create_completion
+
+    def _tracked(*args, **kwargs):
+        response = create_completion(*args, **kwargs)
+        served.primary = True
+        return response
+
+    service._create_completion = _tracked
+    return served
+
+
+def run_load_test(scenarios: Dict[str, Callable[[], object]], weights: Dict[str, int],
+                  concurrency: int, duration: float, served: threading.local = None) -> Dict:
+    """Run weighted scenarios from `concurrency` workers for `duration` seconds"""
+    names = [name for name in weights if name in scenarios]
+    if not names:
+        raise ValueError(f"No known scenarios in mix; choose from {', '.join(scenarios)}")
+    # Latencies of successful calls only; degraded answers return instantly and would flatter them
+    histograms = {name: LatencyHistogram() for name in names}
+    attempts = {name: 0 for name in names}
+    failures = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def _worker():
+        while time.monotonic() < deadline:
+            name = random.choices(names, weights=[weights[n] for n in names])[0]
+            started_at = time.perf_counter()
+            if served is not None:
+                served.primary = False
+            try:
+                scenarios[name]()
+                succeeded = served is None or served.primary
+            except Exception:
+                succeeded = False
+            with lock:
+                attempts[name] += 1
+                if not succeeded:
+                    failures[name] += 1
+            if succeeded:
+                histograms[name].record((time.perf_counter() - started_at) * 1000)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(_worker)
+    elapsed = time.monotonic() - started
+
+    total = sum(h.count for h in histograms.values())
+    return {
+        'duration_seconds': round(elapsed, 2),
+        'concurrency': concurrency,
+        'requests': sum(attempts.values()),
+        'successes': total,
+        'failures': sum(failures.values()),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'scenarios': {
+            name: {
+                'requests': attempts[name],
+                'successes': histograms[name].count,
+                'failures': failures[name],
+                'throughput_rps': round(histograms[name].count / elapsed, 2) if elapsed else 0.0,
+                'latency_ms': {k: round(v, 1) if v is not None else None
+                               for k, v in histograms[name].percentiles((50, 95, 99)).items()}
+            }
+            for name in names
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the AI tutor against the Groq stub')
+    parser.add_argument('--base-url', help='Stub/Groq base URL (default: start an in-process stub)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Scenario weights (default {DEFAULT_MIX})')
+    parser.add_argument('--latency-ms', type=float, help='In-process stub: median latency')
+    parser.add_argument('--tokens-per-sec', type=float, help='In-process stub: generation rate')
+    parser.add_argument('--error-rate', type=float, help='In-process stub: fraction of 500s')
+    parser.add_argument('--rate-limit-rate', type=float, help='In-process stub: fraction of 429s')
+    parser.add_argument('--requests-per-minute', type=int, help='In-process stub: enforced quota')
+    parser.add_argument('--scheduler-rpm', default='0',
+                        help='AI_RATE_LIMIT_RPM for the client under test (default 0: unthrottled)')
+    parser.add_argument('--scheduler-tpm', default='0',
+                        help='AI_RATE_LIMIT_TPM for the client under test (default 0: unthrottled)')
+    args = parser.parse_args()
+
+    stub = None
+    base_url = args.base_url
+    if not base_url:
+        config = StubConfig(**{name: getattr(args, name) for name in StubConfig.FIELDS if hasattr(args, name)})
+        stub = start_stub_server(port=0, config=config)
+        base_url = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    # The service reads these at client creation, so set them before importing it. The
+    # client-side rate limits would measure the scheduler, not the stub, so they are off
+    # unless asked for.
+    os.environ['GROQ_BASE_URL'] = base_url
+    os.environ.setdefault('GROQ_API_KEY', 'stub-key')
+    os.environ['AI_RATE_LIMIT_RPM'] = str(args.scheduler_rpm)
+    os.environ['AI_RATE_LIMIT_TPM'] = str(args.scheduler_tpm)
+    from ai_service import ai_service
+    from ai_telemetry import ai_telemetry
+
+    ai_service.ensure_primary_ready()
+    if ai_service.client is None:
+        print("❌ Groq client did not initialize; nothing to load test")
+        sys.exit(1)
+    served = track_primary(ai_service)
+
+    print(f"🚀 AI load test: {args.concurrency} workers for {args.duration:.0f}s against {base_url} ({args.mix})")
+    report = run_load_test(build_scenarios(ai_service), parse_mix(args.mix), args.concurrency, args.duration,
+                           served=served)
+    report['ai_telemetry'] = ai_telemetry.get_snapshot()['overall']
+    report['circuit_breaker'] = ai_service.breaker.get_status()
+    report['stub'] = fetch_stub_stats(base_url)
+    print(json.dumps(report, indent=2))
+
+    if stub:
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
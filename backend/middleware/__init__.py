@@ -20,6 +20,7 @@ import jwt
 import os
 from datetime import datetime
 import logging
+from services.activity_tracker import activity_tracker
 
 logger = logging.getLogger(__name__)
 
@@ -79,6 +80,7 @@ def authenticate_token(f):
             
             # Set current user in Flask's g object
             g.current_user = current_user
+            activity_tracker.record(current_user['user_id'])
             
             logger.debug(f"Authenticated user: {current_user['email']} ({current_user['role']})")
             
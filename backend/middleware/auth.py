@@ -1,6 +1,7 @@
 from functools import wraps
 from flask import request, jsonify
 from services.auth_service import AuthService
+from services.activity_tracker import activity_tracker
 
 def auth_middleware(f):
     @wraps(f)
@@ -46,6 +47,7 @@ def authenticate_token(f):
         
         # Add user info to request context
         request.current_user = payload
+        activity_tracker.record(payload.get('user_id'))
         
         return f(*args, **kwargs)
     
@@ -1,5 +1,6 @@
 from functools import wraps
 from flask import jsonify
+from werkzeug.exceptions import HTTPException
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +15,13 @@ def error_handler(f):
             return jsonify({"error": "An internal error occurred"}), 500
     return decorated
 
+def handle_exception(e):
+    """App-wide handler for exceptions a route did not catch (HTTP errors pass through)"""
+    if isinstance(e, HTTPException):
+        return e
+    logger.error(f"Unhandled error: {e}")
+    return jsonify({"error": "An internal error occurred"}), 500
+
 def handle_errors(f):
     """Decorator to handle common errors"""
     @wraps(f)
@@ -0,0 +1,41 @@
+-- Phase 5: Admin stats snapshot
+-- File: backend/migrations/phase5_admin_stats_snapshot.sql
+-- One round trip of grouped counts for /api/admin/stats (see services/stats_snapshot.py)
+
+CREATE OR REPLACE FUNCTION admin_stats_snapshot()
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'users', (
+            SELECT jsonb_build_object(
+                'total', COUNT(*),
+                'students', COUNT(*) FILTER (WHERE role = 'student'),
+                'staff', COUNT(*) FILTER (WHERE role = 'staff'),
+                'admins', COUNT(*) FILTER (WHERE role = 'admin'),
+                'new_today', COUNT(*) FILTER (WHERE created_at >= date_trunc('day', NOW()))
+            ) FROM users
+        ),
+        'courses', (
+            SELECT jsonb_build_object(
+                'total', COUNT(*),
+                'active', COUNT(*) FILTER (WHERE is_active)
+            ) FROM courses
+        ),
+        'enrollments', (SELECT COUNT(*) FROM course_enrollments),
+        'assignments', (
+            SELECT jsonb_build_object(
+                'total', COUNT(*),
+                'published', COUNT(*) FILTER (WHERE is_published)
+            ) FROM assignments
+        ),
+        'submissions', (
+            SELECT jsonb_build_object(
+                'total', COUNT(*) FILTER (WHERE status NOT IN ('draft', 'archived')),
+                'pending_grades', COUNT(*) FILTER (WHERE status = 'submitted'),
+                'today', COUNT(*) FILTER (WHERE submitted_at >= date_trunc('day', NOW()))
+            ) FROM assignment_submissions
+        )
+    );
+$$;
@@ -0,0 +1,41 @@
+-- Phase 5: Incremental analytics rollups
+-- File: backend/migrations/phase5_analytics_rollups.sql
+-- Keys analytics_aggregations by (type, granularity, scope, date) so rollups can upsert
+-- daily/weekly buckets per course and platform, and stores the per-source watermarks
+
+ALTER TABLE analytics_aggregations ADD COLUMN IF NOT EXISTS granularity TEXT NOT NULL DEFAULT 'day'
+    CHECK (granularity IN ('day', 'week'));
+-- 'platform' or a course id
+ALTER TABLE analytics_aggregations ADD COLUMN IF NOT EXISTS scope TEXT NOT NULL DEFAULT 'platform';
+ALTER TABLE analytics_aggregations ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+ALTER TABLE analytics_aggregations DROP CONSTRAINT IF EXISTS analytics_aggregations_aggregation_type_check;
+ALTER TABLE analytics_aggregations ADD CONSTRAINT analytics_aggregations_aggregation_type_check
+    CHECK (aggregation_type IN (
+        'daily_active_users', 'course_completion_rates', 'avg_session_duration',
+        'popular_content', 'performance_trends', 'engagement_metrics', 'user_signups'
+    ));
+
+-- Drop duplicate sample rows before the bucket key becomes unique
+DELETE FROM analytics_aggregations a USING analytics_aggregations b
+    WHERE a.aggregation_type = b.aggregation_type AND a.date_period = b.date_period
+      AND a.granularity = b.granularity AND a.scope = b.scope AND a.created_at < b.created_at;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_analytics_aggregations_bucket
+    ON analytics_aggregations(aggregation_type, granularity, scope, date_period);
+
+-- Last processed (timestamp, id) per rollup source; the id breaks ties between rows sharing the timestamp
+CREATE TABLE IF NOT EXISTS analytics_rollup_state (
+    source TEXT PRIMARY KEY,
+    watermark TIMESTAMP WITH TIME ZONE,
+    watermark_id TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+ALTER TABLE analytics_rollup_state ADD COLUMN IF NOT EXISTS watermark_id TEXT;
+
+-- Watermark scans
+CREATE INDEX IF NOT EXISTS idx_user_interactions_created_at ON user_interactions(created_at);
+CREATE INDEX IF NOT EXISTS idx_assignment_grades_updated_at ON assignment_grades(updated_at);
+CREATE INDEX IF NOT EXISTS idx_course_enrollments_enrolled_at ON course_enrollments(enrolled_at);
+CREATE INDEX IF NOT EXISTS idx_course_enrollments_completed_at ON course_enrollments(completed_at);
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
@@ -0,0 +1,17 @@
+-- Phase 5: Cohort retention
+-- File: backend/migrations/phase5_cohort_retention.sql
+-- Distinct active users for a closed week, read page by page by services/cohort_retention.py
+
+CREATE OR REPLACE FUNCTION active_user_ids(p_start TIMESTAMP WITH TIME ZONE, p_end TIMESTAMP WITH TIME ZONE)
+RETURNS TABLE (user_id UUID)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT DISTINCT i.user_id
+    FROM user_interactions i
+    WHERE i.timestamp >= p_start
+      AND i.timestamp < p_end
+      AND i.user_id IS NOT NULL;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at);
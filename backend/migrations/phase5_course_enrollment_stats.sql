@@ -0,0 +1,29 @@
+-- Phase 5: Per-course enrollment aggregates
+-- File: backend/migrations/phase5_course_enrollment_stats.sql
+-- One grouped query for the dashboard's course performance section (see services/analytics_service.py)
+
+CREATE OR REPLACE FUNCTION course_enrollment_stats(p_course_ids UUID[] DEFAULT NULL)
+RETURNS TABLE (
+    course_id UUID,
+    course_title TEXT,
+    enrollment_count BIGINT,
+    completion_count BIGINT,
+    avg_progress NUMERIC
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        c.id,
+        c.title,
+        COUNT(e.id),
+        COUNT(e.completed_at),
+        COALESCE(AVG(e.progress_percentage), 0)
+    FROM courses c
+    LEFT JOIN course_enrollments e ON e.course_id = c.id
+    WHERE p_course_ids IS NULL OR c.id = ANY(p_course_ids)
+    GROUP BY c.id, c.title
+    ORDER BY COUNT(e.id) DESC;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_course_enrollments_course_id ON course_enrollments(course_id);
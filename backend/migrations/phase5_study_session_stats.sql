@@ -0,0 +1,22 @@
+-- Phase 5: Study session statistics
+-- File: backend/migrations/phase5_study_session_stats.sql
+-- Sessions are written by services/study_sessions.py; this averages the closed ones in one query.
+-- A session with a single heartbeat closes with zero duration, so it is left out of the average
+-- (rows written before performance_summary existed fall back to a non-zero duration).
+
+CREATE OR REPLACE FUNCTION study_session_stats(p_since TIMESTAMP WITH TIME ZONE, p_user_ids UUID[] DEFAULT NULL)
+RETURNS TABLE (
+    sessions BIGINT,
+    avg_duration_minutes NUMERIC
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT COUNT(*), COALESCE(AVG(total_duration_minutes), 0)
+    FROM study_sessions
+    WHERE session_end >= p_since
+      AND COALESCE((performance_summary->>'heartbeats')::INT >= 2, total_duration_minutes > 0)
+      AND (p_user_ids IS NULL OR user_id = ANY(p_user_ids));
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_study_sessions_end ON study_sessions(session_end DESC);
@@ -0,0 +1,260 @@
+"""
+Active User Tracker for AI Tutor Platform
+Counts distinct active users per day in Redis HyperLogLogs (about 12KB per day,
+whatever the user count) for DAU/WAU/MAU and retention, with an in-process stand-in
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from services.cache_service import cache_service, CacheService
+
+logger = logging.getLogger(__name__)
+
+
+class HyperLogLog:
+    """Minimal HyperLogLog with Redis' precision (2^14 registers, ~0.81% standard error)"""
+
+    PRECISION = 14
+    REGISTERS = 1 << PRECISION
+    _RANK_BITS = 64 - PRECISION
+
+    def __init__(self):
+        self.registers = bytearray(self.REGISTERS)
+
+    def add(self, member: str):
+        value = int.from_bytes(hashlib.blake2b(member.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = value >> self._RANK_BITS
+        remainder = value & ((1 << self._RANK_BITS) - 1)
+        rank = self._RANK_BITS - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class ActivityTracker:
+    """Records authenticated user ids per UTC day and answers distinct-user queries.
+
+    Ids are buffered per day in memory and flushed with one PFADD per day, so a request
+    costs a set insert. Without Redis the counts come from per-process HyperLogLogs, and
+    the buffer is capped (oldest days first) so an outage cannot grow it without bound.
+    """
+
+    KEY_PREFIX = "active_users"
+
+    def __init__(self, cache: CacheService):
+        self.cache = cache
+        self.flush_interval = float(os.getenv('ACTIVE_USERS_FLUSH_INTERVAL', 5))
+        self.retention_days = int(os.getenv('ACTIVE_USERS_RETENTION_DAYS', 400))
+        self.local_retention_days = int(os.getenv('ACTIVE_USERS_LOCAL_RETENTION_DAYS', 62))
+        self.pending_max_days = max(1, int(os.getenv('ACTIVE_USERS_PENDING_MAX_DAYS', 7)))
+        self.pending_max_ids = int(os.getenv('ACTIVE_USERS_PENDING_MAX_IDS', 50000))
+        self._pending: Dict[str, Set[str]] = {}
+        self._dropped_pending = 0
+        self._local: Dict[str, HyperLogLog] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+
+    def record(self, user_id: Optional[str]):
+        """Mark a user active today (no I/O)"""
+        if not user_id:
+            return
+        user_id = str(user_id)
+        day = datetime.utcnow().date().isoformat()
+        with self._lock:
+            pending = self._pending.get(day)
+            if pending is None:
+                pending = self._pending[day] = set()
+                self._prune_pending()
+            if user_id in pending:
+                return
+            if len(pending) < self.pending_max_ids:
+                pending.add(user_id)
+            else:
+                # Still counted locally, only lost to Redis (a repeat visitor may be counted again)
+                self._dropped_pending += 1
+            local = self._local.get(day)
+            if local is None:
+                local = self._local[day] = HyperLogLog()
+                self._prune_local()
+            local.add(user_id)
+        self._ensure_flusher()
+
+    def flush(self) -> bool:
+        """PFADD buffered ids to Redis; they are kept for the next flush if Redis is down"""
+        if not self.cache.is_available():
+            return False
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return True
+        try:
+            ttl = self.retention_days * 86400
+            pipe = self.cache.redis_client.pipeline(transaction=False)
+            for day, user_ids in pending.items():
+                key = self._day_key(day)
+                pipe.pfadd(key, *user_ids)
+                pipe.expire(key, ttl)
+            with self.cache._operation('pfadd'):
+                pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Active user flush failed, keeping ids for the next flush: {str(e)}")
+            with self._lock:
+                for day, user_ids in pending.items():
+                    self._pending.setdefault(day, set()).update(user_ids)
+                self._prune_pending()
+            return False
+
+    # Queries
+    def count_active(self, days: int = 1, end: date = None) -> int:
+        """Distinct users active in the `days` days ending on `end` (default today)"""
+        return self._count(self._days(days, end))
+
+    def get_active_users(self) -> Dict[str, int]:
+        return {
+            'daily_active_users': self.count_active(1),
+            'weekly_active_users': self.count_active(7),
+            'monthly_active_users': self.count_active(30)
+        }
+
+    def retention_rate(self, period_days: int = 7, end: date = None) -> float:
+        """Share of users active in the previous period who were active again in the latest one"""
+        end = end or datetime.utcnow().date()
+        current = self._days(period_days, end)
+        previous = self._days(period_days, end - timedelta(days=period_days))
+        previous_count = self._count(previous)
+        if not previous_count:
+            return 0.0
+        # |A ∩ B| = |A| + |B| - |A ∪ B|; clamp estimator noise
+        retained = previous_count + self._count(current) - self._count(previous + current)
+        return round(max(0.0, min(100.0, retained / previous_count * 100)), 2)
+
+    def merge_period(self, days: List[str], destination: str) -> bool:
+        """PFMERGE day sets into a named period key (e.g. a closed week) for cheap reuse"""
+        if not self.cache.is_available():
+            return False
+        try:
+            with self.cache._operation('pfmerge'):
+                key = self._key(destination)
+                self.cache.redis_client.pfmerge(key, *[self._day_key(day) for day in days])
+                self.cache.redis_client.expire(key, self.retention_days * 86400)
+            return True
+        except Exception as e:
+            logger.error(f"Active user merge error for {destination}: {str(e)}")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(len(ids) for ids in self._pending.values())
+            dropped = self._dropped_pending
+            local_days = len(self._local)
+        return {
+            'backend': 'redis' if self.cache.is_available() else 'local',
+            'pending_ids': pending,
+            'dropped_pending_ids': dropped,
+            'local_days': local_days,
+            **self.get_active_users()
+        }
+
+    # Internal helpers
+    def _key(self, name: str) -> str:
+        return self.cache._serialize_key(f"{self.KEY_PREFIX}:{name}")
+
+    def _day_key(self, day: str) -> str:
+        return self._key(day)
+
+    def _days(self, days: int, end: date = None) -> List[str]:
+        end = end or datetime.utcnow().date()
+        return [(end - timedelta(days=offset)).isoformat() for offset in range(max(days, 1))]
+
+    def _count(self, days: List[str]) -> int:
+        if self.cache.is_available():
+            self.flush()
+            try:
+                closed = self._closed_weeks(days)
+                keys = [self._key(f"week:{week}") for week in closed]
+                keys += [self._day_key(day) for day in days
+                         if self._week_of(day) not in closed]
+                with self.cache._operation('pfcount'):
+                    return int(self.cache.redis_client.pfcount(*keys))
+            except Exception as e:
+                logger.warning(f"Active user count from Redis failed, using local counts: {str(e)}")
+
+        merged = HyperLogLog()
+        with self._lock:
+            for day in days:
+                if day in self._local:
+                    merged.merge(self._local[day])
+        return merged.count()
+
+    def _week_of(self, day: str) -> str:
+        parsed = date.fromisoformat(day)
+        return (parsed - timedelta(days=parsed.weekday())).isoformat()
+
+    def _closed_weeks(self, days: List[str]) -> List[str]:
+        """Full weeks covered by `days` that have ended; their merged keys are built once"""
+        requested = set(days)
+        this_week = self._week_of(datetime.utcnow().date().isoformat())
+        weeks = []
+        for week in sorted({self._week_of(day) for day in days}):
+            week_days = [(date.fromisoformat(week) + timedelta(days=i)).isoformat() for i in range(7)]
+            if week == this_week or not requested.issuperset(week_days):
+                continue
+            if not self.cache.redis_client.exists(self._key(f"week:{week}")):
+                if not self.merge_period(week_days, f"week:{week}"):
+                    continue
+            weeks.append(week)
+        return weeks
+
+    def _prune_local(self):
+        """Drop stand-in days (and unflushed ids) past local retention (caller holds the lock)"""
+        cutoff = (datetime.utcnow().date() - timedelta(days=self.local_retention_days)).isoformat()
+        for day in [d for d in self._local if d < cutoff]:
+            del self._local[day]
+        for day in [d for d in self._pending if d < cutoff]:
+            del self._pending[day]
+
+    def _prune_pending(self):
+        """Cap the unflushed ids: keep the latest days, then trim each day (caller holds the lock)"""
+        for day in sorted(self._pending)[:-self.pending_max_days]:
+            self._dropped_pending += len(self._pending.pop(day))
+        for user_ids in self._pending.values():
+            for _ in range(len(user_ids) - self.pending_max_ids):
+                user_ids.pop()
+                self._dropped_pending += 1
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name='active-users-flusher')
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+# Global activity tracker instance
+activity_tracker = ActivityTracker(cache_service)
@@ -1,8 +1,12 @@
 from groq import Groq
 from typing import List, Dict, Any, Optional
 import logging
+import time
 from config import get_config
+from ai_telemetry import ai_telemetry
+from ai_scheduler import AIPriority, ai_scheduler, estimate_request_tokens
 from services.database import db_service
+from services.context_builder import context_builder
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +24,7 @@ class AIService:
             if not self.config.GROQ_API_KEY:
                 raise ValueError("Groq API key is required")
             
-            self._client = Groq(api_key=self.config.GROQ_API_KEY)
+            self._client = Groq(api_key=self.config.GROQ_API_KEY, base_url=self.config.GROQ_BASE_URL)
             logger.info("Groq AI client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Groq client: {str(e)}")
@@ -33,12 +37,47 @@ class AIService:
             self._initialize_client()
         return self._client
     
+    def _create_completion(self, operation: str, priority: AIPriority, messages: List[Dict[str, str]],
+                           temperature: float, max_tokens: int, user_id: str = None,
+                           session_id: str = None) -> tuple:
+        """
+        Send a chat completion through the shared scheduler and record its telemetry
+        
+        Returns:
+            Tuple of (response, latency in ms of the API call itself)
+        """
+        latency = {}
+
+        def _send():
+            start_time = time.perf_counter()
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.config.AI_MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    top_p=1,
+                    stream=False
+                )
+            except Exception:
+                ai_telemetry.record_response(operation, start_time, success=False, model=self.config.AI_MODEL)
+                raise
+            # The ai_interactions row (when session/user are known) is written in the background batch
+            latency['ms'] = ai_telemetry.record_response(operation, start_time, response, model=self.config.AI_MODEL,
+                                                         user_id=user_id, session_id=session_id)
+            # The scheduler settles the token reservation from response.usage
+            return response
+
+        response = ai_scheduler.run(priority, _send, estimated_tokens=estimate_request_tokens(messages, max_tokens))
+        return response, latency['ms']
+    
     def chat_completion(self, messages: List[Dict[str, str]], user_id: str, session_id: str = None) -> Dict[str, Any]:
         """
         Generate AI chat response using Groq
         
         Args:
-            messages: List of message objects with 'role' and 'content'
+            messages: List of message objects with 'role' and 'content'; for an existing
+                session a single new message is enough, history is loaded from the database
             user_id: ID of the user making the request
             session_id: Optional chat session ID
         
@@ -50,6 +89,10 @@ class AIService:
             if not session_id:
                 session = db_service.create_chat_session(user_id)
                 session_id = session['id'] if session else None
+            elif len(messages) == 1:
+                # Only the new turn was sent: continue from the stored (bounded) session history
+                history = db_service.get_session_messages(session_id, user_id, limit=self.config.AI_CONTEXT_HISTORY_LIMIT)
+                messages = history + messages
             
             # Prepare system message for educational context
             system_message = {
@@ -65,24 +108,28 @@ class AIService:
                 )
             }
             
-            # Combine system message with conversation
-            full_messages = [system_message] + messages
+            # Combine system message with conversation, bounded by the context token budget
+            full_messages = context_builder.build(
+                system_message,
+                messages,
+                session_id=session_id,
+                summarizer=self._summarize_conversation
+            )
             
-            # Make API call to Groq
-            start_time = __import__('time').time()
-            response = self.client.chat.completions.create(
-                model=self.config.AI_MODEL,
-                messages=full_messages,
-                temperature=self.config.AI_TEMPERATURE,
-                max_tokens=self.config.AI_MAX_TOKENS,
-                top_p=1,
-                stream=False
+            # Make API call to Groq (live chat is served ahead of generation and grading)
+            response, response_time_ms = self._create_completion(
+                'chat',
+                AIPriority.INTERACTIVE,
+                full_messages,
+                self.config.AI_TEMPERATURE,
+                self.config.AI_MAX_TOKENS,
+                user_id=user_id,
+                session_id=session_id
             )
-            end_time = __import__('time').time()
+            response_time_ms = int(response_time_ms)
             
             # Extract response data
             ai_response = response.choices[0].message.content
-            response_time_ms = int((end_time - start_time) * 1000)
             
             # Save user message to database
             if session_id:
@@ -102,20 +149,6 @@ class AIService:
                     'role': 'assistant',
                     'content': ai_response
                 })
-                
-                # Save AI interaction metadata
-                try:
-                    db_service.client.table('ai_interactions').insert({
-                        'session_id': session_id,
-                        'user_id': user_id,
-                        'model_used': self.config.AI_MODEL,
-                        'prompt_tokens': response.usage.prompt_tokens if hasattr(response, 'usage') else 0,
-                        'completion_tokens': response.usage.completion_tokens if hasattr(response, 'usage') else 0,
-                        'total_tokens': response.usage.total_tokens if hasattr(response, 'usage') else 0,
-                        'response_time_ms': response_time_ms
-                    }).execute()
-                except Exception as e:
-                    logger.warning(f"Failed to save AI interaction metadata: {str(e)}")
             
             return {
                 'success': True,
@@ -136,6 +169,28 @@ class AIService:
                 'response': "I apologize, but I'm having trouble processing your request right now. Please try again in a moment."
             }
     
+    def _summarize_conversation(self, previous_summary: str, turns: List[Dict[str, str]]) -> str:
+        """Fold older conversation turns into a rolling summary (runs off the request path)"""
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        prompt = (
+            "Update the running summary of a tutoring conversation.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New turns:\n{transcript}\n\n"
+            "Return a concise bullet-point summary of the topics covered, what the student "
+            "understood or struggled with, and any open questions."
+        )
+        response, _ = self._create_completion(
+            'summary',
+            AIPriority.BATCH,
+            [
+                {"role": "system", "content": "You summarize tutoring conversations accurately and briefly."},
+                {"role": "user", "content": prompt}
+            ],
+            0.2,
+            self.config.AI_SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content
+
     def generate_content(self, prompt: str, content_type: str = "general") -> Dict[str, Any]:
         """
         Generate educational content using AI
@@ -163,13 +218,13 @@ class AIService:
                 {"role": "user", "content": prompt}
             ]
             
-            response = self.client.chat.completions.create(
-                model=self.config.AI_MODEL,
-                messages=messages,
-                temperature=self.config.AI_TEMPERATURE,
-                max_tokens=self.config.AI_MAX_TOKENS,
-                top_p=1,
-                stream=False
+            operation = {'quiz': 'quiz', 'explanation': 'explain'}.get(content_type, 'content')
+            response, _ = self._create_completion(
+                operation,
+                AIPriority.CONTENT,
+                messages,
+                self.config.AI_TEMPERATURE,
+                self.config.AI_MAX_TOKENS
             )
             
             generated_content = response.choices[0].message.content
@@ -236,13 +291,12 @@ class AIService:
                 {"role": "user", "content": analysis_prompt}
             ]
             
-            response = self.client.chat.completions.create(
-                model=self.config.AI_MODEL,
-                messages=messages,
-                temperature=0.3,  # Lower temperature for more consistent feedback
-                max_tokens=self.config.AI_MAX_TOKENS,
-                top_p=1,
-                stream=False
+            response, _ = self._create_completion(
+                'grade',
+                AIPriority.BATCH,
+                messages,
+                0.3,  # Lower temperature for more consistent feedback
+                self.config.AI_MAX_TOKENS
             )
             
             feedback = response.choices[0].message.content
@@ -273,20 +327,15 @@ class AIService:
                 {"role": "user", "content": "Health check"}
             ]
             
-            response = self.client.chat.completions.create(
-                model=self.config.AI_MODEL,
-                messages=test_messages,
-                temperature=0,
-                max_tokens=10,
-                top_p=1,
-                stream=False
-            )
+            response, _ = self._create_completion('health', AIPriority.HEALTH, test_messages, 0, 10)
             
             return {
                 'status': 'healthy',
                 'message': 'AI service is operational',
                 'model': self.config.AI_MODEL,
-                'response': response.choices[0].message.content.strip()
+                'response': response.choices[0].message.content.strip(),
+                'latency': ai_telemetry.get_snapshot(),
+                'scheduler': ai_scheduler.get_metrics()
             }
             
         except Exception as e:
@@ -294,7 +343,9 @@ class AIService:
             return {
                 'status': 'unhealthy',
                 'message': f'AI service error: {str(e)}',
-                'model': self.config.AI_MODEL
+                'model': self.config.AI_MODEL,
+                'latency': ai_telemetry.get_snapshot(),
+                'scheduler': ai_scheduler.get_metrics()
             }
 
 # Global AI service instance
@@ -0,0 +1,408 @@
+"""
+Analytics Rollup Service for AI Tutor Platform
+Incrementally folds new interaction, submission, grade, enrollment and signup rows
+into daily/weekly analytics_aggregations buckets per course and for the platform
+"""
+
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from services.database import db_service
+from services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+PLATFORM_SCOPE = 'platform'
+# (timestamp, id) of the last row a source folded in
+Watermark = Tuple[str, Optional[str]]
+
+
+def _summarize_interactions(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    summary = defaultdict(lambda: {'interactions': 0, 'duration_seconds': 0, 'actions': defaultdict(int),
+                                   'resources': defaultdict(int)})
+    for row in rows:
+        metadata = row.get('metadata') or {}
+        course_id = row.get('resource_id') if row.get('resource_type') == 'course' else metadata.get('course_id')
+        for scope in filter(None, (PLATFORM_SCOPE, course_id)):
+            bucket = summary[scope]
+            bucket['interactions'] += 1
+            bucket['duration_seconds'] += row.get('duration_seconds') or 0
+            bucket['actions'][row.get('action_type')] += 1
+            bucket['resources'][row.get('resource_type')] += 1
+    return summary
+
+
+def _summarize_submissions(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    summary = defaultdict(lambda: {'submissions': 0, 'late_submissions': 0})
+    for row in rows:
+        course_id = (row.get('assignment') or {}).get('course_id')
+        for scope in filter(None, (PLATFORM_SCOPE, course_id)):
+            summary[scope]['submissions'] += 1
+            summary[scope]['late_submissions'] += 1 if row.get('is_late') else 0
+    return summary
+
+
+def _summarize_grades(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    summary = defaultdict(lambda: {'graded': 0, 'points_earned': 0.0, 'points_possible': 0.0})
+    for row in rows:
+        assignment = ((row.get('submission') or {}).get('assignment') or {})
+        for scope in filter(None, (PLATFORM_SCOPE, assignment.get('course_id'))):
+            bucket = summary[scope]
+            bucket['graded'] += 1
+            bucket['points_earned'] += float(row.get('points_earned') or 0)
+            bucket['points_possible'] += float(assignment.get('max_points') or 100)
+    return summary
+
+
+def _summarize_enrollments(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    summary = defaultdict(lambda: {'enrollments': 0})
+    for row in rows:
+        for scope in filter(None, (PLATFORM_SCOPE, row.get('course_id'))):
+            summary[scope]['enrollments'] += 1
+    return summary
+
+
+def _summarize_completions(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    summary = defaultdict(lambda: {'completions': 0})
+    for row in rows:
+        for scope in filter(None, (PLATFORM_SCOPE, row.get('course_id'))):
+            summary[scope]['completions'] += 1
+    return summary
+
+
+def _summarize_signups(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    summary = defaultdict(lambda: {'new_users': 0, 'by_role': defaultdict(int)})
+    for row in rows:
+        summary[PLATFORM_SCOPE]['new_users'] += 1
+        summary[PLATFORM_SCOPE]['by_role'][row.get('role') or 'student'] += 1
+    return summary
+
+
+class RollupSource:
+    """A raw table folded into one aggregation type
+
+    New rows are found through `watermark_column` (ties broken by id); rows are bucketed by the day of
+    `day_column`. A touched day is recomputed from scratch, so re-running is idempotent.
+    `day_column` must not change when a row is updated, or the row's old day keeps counting it.
+    """
+
+    def __init__(self, name: str, table: str, aggregation_type: str, watermark_column: str, day_column: str,
+                 columns: str, summarize: Callable[[List[Dict[str, Any]]], Dict[str, Dict[str, Any]]],
+                 empty: Dict[str, Any]):
+        self.name = name
+        self.table = table
+        self.aggregation_type = aggregation_type
+        self.watermark_column = watermark_column
+        self.day_column = day_column
+        self.columns = columns
+        self.summarize = summarize
+        # Fields this source owns inside aggregated_data (sources may share a bucket row)
+        self.empty = empty
+
+
+ROLLUP_SOURCES = [
+    RollupSource('interactions', 'user_interactions', 'engagement_metrics', 'created_at', 'timestamp',
+                 'timestamp, action_type, resource_type, resource_id, duration_seconds, metadata',
+                 _summarize_interactions,
+                 {'interactions': 0, 'duration_seconds': 0, 'actions': {}, 'resources': {}}),
+    RollupSource('submissions', 'assignment_submissions', 'performance_trends', 'submitted_at', 'submitted_at',
+                 'submitted_at, is_late, assignment:assignment_id(course_id)',
+                 _summarize_submissions,
+                 {'submissions': 0, 'late_submissions': 0}),
+    # Regrades move graded_at, so grades are bucketed by the day they were first recorded
+    RollupSource('grades', 'assignment_grades', 'performance_trends', 'updated_at', 'created_at',
+                 'created_at, points_earned, submission:submission_id(assignment:assignment_id(course_id, max_points))',
+                 _summarize_grades,
+                 {'graded': 0, 'points_earned': 0.0, 'points_possible': 0.0}),
+    RollupSource('enrollments', 'course_enrollments', 'course_completion_rates', 'enrolled_at', 'enrolled_at',
+                 'enrolled_at, course_id', _summarize_enrollments, {'enrollments': 0}),
+    RollupSource('completions', 'course_enrollments', 'course_completion_rates', 'completed_at', 'completed_at',
+                 'completed_at, course_id', _summarize_completions, {'completions': 0}),
+    RollupSource('signups', 'users', 'user_signups', 'created_at', 'created_at',
+                 'created_at, role', _summarize_signups, {'new_users': 0, 'by_role': {}})
+]
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _add_counts(target: Dict[str, Any], source: Dict[str, Any]):
+    """Sum numeric fields (recursively for nested count maps) of source into target"""
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _add_counts(target.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            target[key] = target.get(key, 0) + value
+
+
+def _plain(value: Any) -> Any:
+    """defaultdicts to dicts, floats rounded, ready for JSONB"""
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+class AnalyticsRollupService:
+    """Maintains pre-aggregated analytics buckets and serves them to the dashboards"""
+
+    TABLE = 'analytics_aggregations'
+    STATE_TABLE = 'analytics_rollup_state'
+    LOCK_NAME = 'analytics_rollup'
+    PAGE_SIZE = 1000
+
+    def __init__(self, sources: List[RollupSource] = None):
+        self.db = db_service
+        self.sources = sources or ROLLUP_SOURCES
+        self.interval = int(os.getenv('ANALYTICS_ROLLUP_INTERVAL', 300))
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    # Pipeline
+    def run(self) -> Dict[str, Any]:
+        """
+        Fold rows newer than each source's watermark into their buckets
+
+        Returns:
+            Summary with the days touched per source
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return {'status': 'running'}
+        token = cache_service.acquire_lock(self.LOCK_NAME, max(self.interval, 60))
+        if token is None:
+            self._run_lock.release()
+            return {'status': 'skipped', 'message': 'Another worker is running the rollup'}
+
+        started = datetime.utcnow()
+        summary = {'status': 'completed', 'started_at': started.isoformat(), 'sources': {}}
+        try:
+            watermarks = self._load_watermarks()
+            for source in self.sources:
+                try:
+                    summary['sources'][source.name] = self._run_source(source, watermarks.get(source.name))
+                except Exception as e:
+                    logger.error(f"Analytics rollup of {source.name} failed: {str(e)}")
+                    summary['sources'][source.name] = {'error': str(e)}
+                    summary['status'] = 'partial'
+
+            if any(s.get('days') for s in summary['sources'].values()):
+                cache_service.invalidate_tags('analytics')
+            summary['duration_ms'] = round((datetime.utcnow() - started).total_seconds() * 1000, 1)
+            self.last_run = summary
+            logger.info(f"Analytics rollup {summary['status']} in {summary['duration_ms']:.0f}ms")
+            return summary
+        finally:
+            cache_service.release_lock(self.LOCK_NAME, token)
+            self._run_lock.release()
+
+    def start(self):
+        """Run the rollup every ANALYTICS_ROLLUP_INTERVAL seconds in the background"""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='analytics-rollup', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Analytics rollup error: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def _run_source(self, source: RollupSource, watermark: Optional[Watermark]) -> Dict[str, Any]:
+        days, new_watermark = self._touched_days(source, watermark)
+        for day in sorted(days):
+            self._rebuild_day(source, day)
+        for week in sorted({_week_start(day) for day in days}):
+            self._rebuild_week(source.aggregation_type, week)
+        if new_watermark and new_watermark != watermark:
+            self._save_watermark(source.name, new_watermark)
+        return {'days': len(days), 'watermark': new_watermark[0] if new_watermark else None}
+
+    def _touched_days(self, source: RollupSource,
+                      watermark: Optional[Watermark]) -> Tuple[Set[date], Optional[Watermark]]:
+        """Days holding rows strictly past the (timestamp, id) watermark, and the new watermark
+
+        Pages on the same keyset, so any number of rows sharing one timestamp are all read
+        and a run with nothing new touches no day.
+        """
+        column = source.watermark_column
+        days: Set[date] = set()
+        last = watermark
+        timestamp, after_id = watermark if watermark else (None, None)
+        # Rows sharing `timestamp` come first, then the rows past it
+        in_tie = timestamp is not None
+        while True:
+            query = (self.db.client.table(source.table)
+                     .select(f"id, {column}, {source.day_column}")
+                     .not_.is_(column, 'null'))
+            if in_tie:
+                query = query.eq(column, timestamp)
+                # A watermark saved without an id re-reads its timestamp once
+                if after_id is not None:
+                    query = query.gt('id', after_id)
+            elif timestamp is not None:
+                query = query.gt(column, timestamp)
+            rows = query.order(column).order('id').limit(self.PAGE_SIZE).execute().data or []
+            days.update(date.fromisoformat(row[source.day_column][:10]) for row in rows if row.get(source.day_column))
+            if rows:
+                last = (rows[-1][column], str(rows[-1]['id']))
+            if len(rows) == self.PAGE_SIZE:
+                (timestamp, after_id), in_tie = last, True
+            elif in_tie:
+                in_tie = False
+            else:
+                return days, last
+
+    def _rebuild_day(self, source: RollupSource, day: date):
+        """Recompute one source's fields in every scope's bucket for a day"""
+        start, end = day.isoformat(), (day + timedelta(days=1)).isoformat()
+        rows = self._fetch_all(lambda: (self.db.client.table(source.table).select(source.columns)
+                                        .gte(source.day_column, start).lt(source.day_column, end)))
+        fresh = source.summarize(rows)
+        existing = self._load_buckets(source.aggregation_type, 'day', day, day)
+
+        buckets = []
+        for scope in set(fresh) | {scope for scope, _ in existing}:
+            data = dict(existing.get((scope, day), {}))
+            data.update(source.empty)
+            data.update(fresh.get(scope, {}))
+            buckets.append(self._bucket(source.aggregation_type, 'day', scope, day, data))
+        self._upsert(buckets)
+
+    def _rebuild_week(self, aggregation_type: str, week: date):
+        """Weekly buckets are the sum of their daily buckets"""
+        totals: Dict[str, Dict[str, Any]] = defaultdict(dict)
+        for (scope, _), data in self._load_buckets(aggregation_type, 'day', week, week + timedelta(days=6)).items():
+            _add_counts(totals[scope], data)
+        self._upsert([self._bucket(aggregation_type, 'week', scope, week, data) for scope, data in totals.items()])
+
+    # Storage helpers
+    def _fetch_all(self, build_query: Callable[[], Any]) -> List[Dict[str, Any]]:
+        rows, offset = [], 0
+        while True:
+            page = build_query().range(offset, offset + self.PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < self.PAGE_SIZE:
+                return rows
+            offset += self.PAGE_SIZE
+
+    def _load_buckets(self, aggregation_type: str, granularity: str, start: date, end: date,
+                      scope: Union[str, List[str], None] = None) -> Dict[Tuple[str, date], Dict[str, Any]]:
+        if isinstance(scope, list) and not scope:
+            return {}
+
+        def build():
+            query = (self.db.client.table(self.TABLE).select('scope, date_period, aggregated_data')
+                     .eq('aggregation_type', aggregation_type).eq('granularity', granularity)
+                     .gte('date_period', start.isoformat()).lte('date_period', end.isoformat()))
+            if isinstance(scope, list):
+                return query.in_('scope', scope)
+            return query.eq('scope', scope) if scope else query
+        return {(row['scope'], date.fromisoformat(row['date_period'][:10])): row.get('aggregated_data') or {}
+                for row in self._fetch_all(build)}
+
+    def _bucket(self, aggregation_type: str, granularity: str, scope: str, day: date,
+                data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'aggregation_type': aggregation_type,
+            'granularity': granularity,
+            'scope': scope,
+            'date_period': day.isoformat(),
+            'aggregated_data': _plain(data),
+            'updated_at': datetime.utcnow().isoformat()
+        }
+
+    def _upsert(self, buckets: List[Dict[str, Any]]):
+        for i in range(0, len(buckets), self.PAGE_SIZE):
+            (self.db.client.table(self.TABLE)
+             .upsert(buckets[i:i + self.PAGE_SIZE], on_conflict='aggregation_type,granularity,scope,date_period')
+             .execute())
+
+    def _load_watermarks(self) -> Dict[str, Watermark]:
+        rows = self.db.client.table(self.STATE_TABLE).select('source, watermark, watermark_id').execute().data or []
+        return {row['source']: (row['watermark'], row.get('watermark_id')) for row in rows if row.get('watermark')}
+
+    def _save_watermark(self, source_name: str, watermark: Watermark):
+        self.db.client.table(self.STATE_TABLE).upsert({
+            'source': source_name,
+            'watermark': watermark[0],
+            'watermark_id': watermark[1],
+            'updated_at': datetime.utcnow().isoformat()
+        }, on_conflict='source').execute()
+
+    # Read API used by the dashboards
+    def get_series(self, aggregation_type: str, days: int = 30, scope: Union[str, List[str]] = PLATFORM_SCOPE,
+                   granularity: str = 'day', end: date = None) -> List[Dict[str, Any]]:
+        """
+        Buckets for the last `days` days, oldest first, with empty periods filled in
+        (a list of scopes, e.g. course ids, is summed per period)
+
+        Returns:
+            List of {"date": "YYYY-MM-DD", **aggregated_data}
+        """
+        end = end or datetime.utcnow().date()
+        start = end - timedelta(days=days - 1)
+        step = timedelta(days=1)
+        if granularity == 'week':
+            start, end, step = _week_start(start), _week_start(end), timedelta(days=7)
+        try:
+            buckets = self._load_buckets(aggregation_type, granularity, start, end, scope=scope)
+        except Exception as e:
+            logger.error(f"Error loading {aggregation_type} rollups: {str(e)}")
+            buckets = {}
+
+        periods: Dict[date, Dict[str, Any]] = defaultdict(dict)
+        for (_, period), data in buckets.items():
+            _add_counts(periods[period], data)
+
+        series, current = [], start
+        while current <= end:
+            series.append({'date': current.isoformat(), **periods.get(current, {})})
+            current += step
+        return series
+
+    def get_totals(self, aggregation_type: str, scope: Union[str, List[str]] = PLATFORM_SCOPE,
+                   days: int = None) -> Dict[str, Any]:
+        """Sum of the scope's (or scopes') buckets, over the last `days` days or all time (read from weekly rows)"""
+        end = datetime.utcnow().date()
+        totals: Dict[str, Any] = {}
+        try:
+            if days:
+                rows = self._load_buckets(aggregation_type, 'day', end - timedelta(days=days - 1), end, scope=scope)
+            else:
+                rows = self._load_buckets(aggregation_type, 'week', date(1970, 1, 1), end, scope=scope)
+            for data in rows.values():
+                _add_counts(totals, data)
+        except Exception as e:
+            logger.error(f"Error loading {aggregation_type} totals: {str(e)}")
+        return totals
+
+    def get_status(self) -> Dict[str, Any]:
+        try:
+            watermarks = {name: watermark[0] for name, watermark in self._load_watermarks().items()}
+        except Exception as e:
+            watermarks = {'error': str(e)}
+        return {
+            'interval_seconds': self.interval,
+            'sources': [source.name for source in self.sources],
+            'watermarks': watermarks,
+            'last_run': self.last_run
+        }
+
+
+# Global analytics rollup service instance
+analytics_rollup = AnalyticsRollupService()
@@ -1,16 +1,82 @@
-w"""
+"""
 Analytics Service for AI Tutor Platform
 Comprehensive learning analytics and performance tracking
 """
 
 import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from collections import defaultdict
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple, Union
 from services.database import db_service
-from services.cache_service import cache_service, cached, monitor_performance
+from services.cache_service import cache_service, monitor_performance, performance_monitor
+from services.cache_warmer import cache_warmer
+from services.local_cache import LocalCache, MISSING
+from services.analytics_rollup import analytics_rollup, PLATFORM_SCOPE
+from services.activity_tracker import activity_tracker
+from services.stats_snapshot import stats_snapshot
+from services.cohort_retention import cohort_retention
 
 logger = logging.getLogger(__name__)
 
+# Dashboard sections: builder method, seconds the cached result counts as fresh, and
+# seconds a request waits for a recompute before falling back to the stale copy
+DASHBOARD_SECTIONS = {
+    "overview": ("_get_overview_metrics", 300, 5),
+    "user_engagement": ("_get_user_engagement_metrics", 300, 5),
+    "course_performance": ("_get_course_performance_metrics", 600, 8),
+    "ai_usage": ("_get_ai_usage_metrics", 900, 3),
+    "recent_activity": ("_get_recent_activity", 60, 3),
+    "performance_trends": ("_get_performance_trends", 900, 8),
+    "system_health": ("_get_system_health_metrics", 30, 3),
+    "cohort_retention": ("_get_cohort_retention", 3600, 10)
+}
+# Platform-wide sections left out of instructor and student dashboards
+ADMIN_ONLY_SECTIONS = {"system_health", "cohort_retention"}
+# Stale copies of cached sections are kept this many TTLs to serve while degraded
+# (untagged, so rollup invalidation ends freshness without deleting the fallback)
+STALE_FACTOR = 12
+# Seconds a resolved instructor/student scope (course and student ids) is reused
+SCOPE_TTL = 300
+# Ids per IN (...) filter, keeping request URLs bounded
+ID_CHUNK_SIZE = 200
+PAGE_SIZE = 1000
+# Hour buckets of the performance monitor behind the health section's latency and error rate
+HEALTH_WINDOW_HOURS = 1
+
+class AnalyticsScope:
+    """What a dashboard may see: the whole platform, an instructor's courses or a student's enrollments"""
+    
+    def __init__(self, key: str, course_ids: Optional[List[str]] = None, student_ids: Optional[List[str]] = None,
+                 student_id: Optional[str] = None):
+        self.key = key
+        # None means unrestricted (the platform scope)
+        self.course_ids = course_ids
+        self.student_ids = student_ids
+        # Set for a student's own dashboard: enrollment rows are restricted to this student
+        self.student_id = student_id
+    
+    @property
+    def is_platform(self) -> bool:
+        return self.course_ids is None
+    
+    @property
+    def rollup_scope(self) -> Union[str, List[str]]:
+        """analytics_aggregations scope(s): the platform bucket or one bucket per course"""
+        return PLATFORM_SCOPE if self.is_platform else self.course_ids
+
+PLATFORM = AnalyticsScope(PLATFORM_SCOPE)
+
+def _has_duration(session: Dict[str, Any]) -> bool:
+    """Whether a study session row spans at least two heartbeats (a single one closes at zero length)"""
+    heartbeats = (session.get('performance_summary') or {}).get('heartbeats')
+    if heartbeats is None:
+        return (session.get('total_duration_minutes') or 0) > 0
+    return heartbeats >= 2
+
 class AnalyticsService:
     """Advanced analytics service for learning platform"""
     
@@ -18,31 +84,33 @@ class AnalyticsService:
         """Initialize analytics service"""
         self.db = db_service
         self.cache = cache_service
+        self.rollups = analytics_rollup
+        self.activity = activity_tracker
+        self.snapshots = stats_snapshot
+        self.cohorts = cohort_retention
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv('ANALYTICS_SECTION_WORKERS', 8)),
+                                            thread_name_prefix='analytics-section')
+        # Section computations in flight, so a slow section is never computed twice at once
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        # Last good result per section in this process, for when the cache is unavailable
+        # (an LRU bounded in bytes and age, since there is a key per instructor and student)
+        self._last_good = LocalCache(
+            max_bytes=int(os.getenv('ANALYTICS_LAST_GOOD_MAX_BYTES', 16 * 1024 * 1024)),
+            max_entry_bytes=int(os.getenv('ANALYTICS_LAST_GOOD_MAX_ENTRY_BYTES', 1024 * 1024)),
+            default_ttl=float(os.getenv('ANALYTICS_LAST_GOOD_TTL', 86400))
+        )
         logger.info("Analytics service initialized")
     
-    @cached(ttl=600, key_prefix="analytics")
     @monitor_performance
     def get_dashboard_data(self, user_id: str = None, role: str = "admin") -> Dict[str, Any]:
         """
         Get comprehensive dashboard analytics
-        Cached for 10 minutes for performance
+        Each section is cached with its own TTL and stale sections are recomputed concurrently
         """
         try:
-            dashboard_data = {
-                "overview": self._get_overview_metrics(),
-                "user_engagement": self._get_user_engagement_metrics(),
-                "course_performance": self._get_course_performance_metrics(),
-                "ai_usage": self._get_ai_usage_metrics(),
-                "recent_activity": self._get_recent_activity(),
-                "performance_trends": self._get_performance_trends(),
-                "system_health": self._get_system_health_metrics()
-            }
-            
-            # Filter data based on user role
-            if role == "instructor":
-                dashboard_data = self._filter_instructor_data(dashboard_data, user_id)
-            elif role == "student":
-                dashboard_data = self._filter_student_data(dashboard_data, user_id)
+            # Instructors and students get sections computed over their own courses only
+            dashboard_data = self._collect_sections(self._resolve_scope(role, user_id))
             
             logger.info(f"Dashboard data generated for role: {role}")
             return dashboard_data
@@ -51,303 +119,507 @@ class AnalyticsService:
             logger.error(f"Dashboard data generation error: {str(e)}")
             return self._get_fallback_dashboard_data()
     
-    def _get_overview_metrics(self) -> Dict[str, Any]:
-        """Get high-level platform metrics"""
-        try:
-            # Use database service to get counts
-            total_users = len(self.db.get_all_users())
-            total_courses = len(self.db.get_courses())
-            total_assignments = len(self.db.get_assignments())
-            
-            # Calculate active users (users active in last 7 days)
-            active_users = self._count_active_users(days=7)
-            
-            # Calculate completion rates
-            completion_rate = self._calculate_overall_completion_rate()
-            
-            return {
-                "total_users": total_users,
-                "total_courses": total_courses,
-                "total_assignments": total_assignments,
-                "active_users": active_users,
-                "completion_rate": completion_rate,
-                "growth_rate": self._calculate_growth_rate()
-            }
-        except Exception as e:
-            logger.error(f"Overview metrics error: {str(e)}")
-            return {
-                "total_users": 0,
-                "total_courses": 0,
-                "total_assignments": 0,
-                "active_users": 0,
-                "completion_rate": 0.0,
-                "growth_rate": 0.0
-            }
+    def _resolve_scope(self, role: str, user_id: Optional[str]) -> AnalyticsScope:
+        """Course and student ids a role may see, resolved once and cached briefly"""
+        if role in ("instructor", "staff") and user_id:
+            key = f"instructor:{user_id}"
+        elif role == "student" and user_id:
+            key = f"student:{user_id}"
+        else:
+            return PLATFORM
+        
+        cache_key = f"analytics:scope:{key}"
+        ids = self.cache.get(cache_key)
+        if ids is None:
+            if role == "student":
+                enrollments = self._fetch_all(lambda: self.db.client.table('course_enrollments')
+                                              .select('course_id').eq('student_id', user_id).order('course_id'))
+                ids = {"course_ids": sorted({row['course_id'] for row in enrollments}), "student_ids": [user_id]}
+            else:
+                courses = self.db.client.table('courses').select('id').eq('instructor_id', user_id).execute().data or []
+                course_ids = sorted(course['id'] for course in courses)
+                enrollments = self._fetch_by_ids(
+                    course_ids, lambda chunk: self.db.client.table('course_enrollments')
+                    .select('student_id').in_('course_id', chunk).order('id'))
+                ids = {"course_ids": course_ids, "student_ids": sorted({row['student_id'] for row in enrollments})}
+            # Course and enrollment writers (db_service and course_db) invalidate the 'courses' tag
+            self.cache.set(cache_key, ids, ttl=SCOPE_TTL, tags=["courses", "analytics"])
+        
+        return AnalyticsScope(key, ids["course_ids"], ids["student_ids"],
+                              student_id=user_id if role == "student" else None)
+    
+    def _collect_sections(self, scope: AnalyticsScope) -> Dict[str, Any]:
+        """Serve fresh sections from the cache and recompute the rest on the thread pool.
+        
+        A section that fails or misses its timeout is served from its stale cached copy,
+        or from the fallback values if it has never been computed.
+        """
+        started = time.time()
+        fallback = self._get_fallback_dashboard_data()
+        dashboard_data: Dict[str, Any] = {}
+        sections: Dict[str, Dict[str, Any]] = {}
+        pending = {}
+        
+        for name, (_, ttl, _) in DASHBOARD_SECTIONS.items():
+            if name in ADMIN_ONLY_SECTIONS and not scope.is_platform:
+                continue
+            entry, live = self._read_section(scope, name)
+            if live and entry and started - entry["computed_at"] < ttl:
+                dashboard_data[name] = entry["data"]
+                sections[name] = {"status": "cached", "age_seconds": int(started - entry["computed_at"])}
+            else:
+                stale = entry or self._get_last_good(self._section_key(scope, name))
+                pending[name] = (self._submit_section(scope, name), stale)
+        
+        for name, (future, stale) in pending.items():
+            timeout = DASHBOARD_SECTIONS[name][2]
+            try:
+                dashboard_data[name] = future.result(timeout=max(0.0, started + timeout - time.time()))["data"]
+                sections[name] = {"status": "computed", "age_seconds": 0}
+            except Exception as e:
+                reason = "timed out" if not future.done() else str(e)
+                if stale:
+                    logger.warning(f"Dashboard section {name} ({scope.key}) {reason}, serving stale data")
+                    dashboard_data[name] = stale["data"]
+                    sections[name] = {"status": "stale", "age_seconds": int(started - stale["computed_at"])}
+                else:
+                    logger.error(f"Dashboard section {name} ({scope.key}) {reason}, serving fallback data")
+                    dashboard_data[name] = fallback[name]
+                    sections[name] = {"status": "fallback", "age_seconds": None}
+        
+        dashboard_data["meta"] = {
+            "scope": scope.key,
+            "generated_at": datetime.utcnow().isoformat(),
+            "build_ms": round((time.time() - started) * 1000, 1),
+            "sections": sections
+        }
+        return dashboard_data
     
-    def _get_user_engagement_metrics(self) -> Dict[str, Any]:
+    def _section_key(self, scope: AnalyticsScope, name: str) -> str:
+        return f"analytics:section:{scope.key}:{name}"
+    
+    def _read_section(self, scope: AnalyticsScope, name: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """The section's cached entry, and whether it may be served as fresh (not only as a stale fallback)"""
+        key = self._section_key(scope, name)
+        if not self.cache.is_available():
+            return self._get_last_good(key), True
+        entries = self.cache.get_many([key, f"{key}:stale"])
+        if key in entries:
+            return entries[key], True
+        return entries.get(f"{key}:stale"), False
+    
+    def _get_last_good(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._last_good.get(key)
+        return None if entry is MISSING else entry
+    
+    def _submit_section(self, scope: AnalyticsScope, name: str) -> Future:
+        key = self._section_key(scope, name)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._compute_section, scope, name)
+                self._inflight[key] = future
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            return future
+    
+    def _compute_section(self, scope: AnalyticsScope, name: str) -> Dict[str, Any]:
+        """Build one section and cache it; a late finish still lands in the cache"""
+        builder, ttl, _ = DASHBOARD_SECTIONS[name]
+        entry = {"data": getattr(self, builder)(scope), "computed_at": time.time()}
+        key = self._section_key(scope, name)
+        self._last_good.set(key, entry, self.cache.codec.encode(entry)[1])
+        self.cache.set(key, entry, ttl=ttl, tags=["analytics"])
+        self.cache.set(f"{key}:stale", entry, ttl=ttl * STALE_FACTOR)
+        return entry
+    
+    def _get_overview_metrics(self, scope: AnalyticsScope = PLATFORM) -> Dict[str, Any]:
+        """Get high-level metrics for the platform, or the scope's courses and students"""
+        if scope.is_platform:
+            # Platform counts come from the admin stats snapshot instead of listing every row
+            stats = self.snapshots.get_snapshot()["stats"]
+            total_users = stats["users"]["total"]
+            total_courses = stats["courses"]["total"]
+            total_assignments = stats["assignments"]["total"]
+        else:
+            total_users = len(scope.student_ids)
+            total_courses = len(scope.course_ids)
+            total_assignments = self._count_assignments(scope)
+        
+        return {
+            "total_users": total_users,
+            "total_courses": total_courses,
+            "total_assignments": total_assignments,
+            "active_users": self._count_active_users(days=7, scope=scope),
+            "completion_rate": self._calculate_overall_completion_rate(scope),
+            "growth_rate": self._calculate_growth_rate(scope)
+        }
+    
+    def _get_user_engagement_metrics(self, scope: AnalyticsScope = PLATFORM) -> Dict[str, Any]:
         """Get user engagement analytics"""
-        try:
-            # Calculate daily/weekly/monthly active users
+        # Calculate daily/weekly/monthly active users
+        if scope.is_platform:
             daily_active = self._count_active_users(days=1)
             weekly_active = self._count_active_users(days=7)
             monthly_active = self._count_active_users(days=30)
-            
-            # Session duration analytics
-            avg_session_duration = self._calculate_avg_session_duration()
-            
-            # Feature usage
-            feature_usage = self._get_feature_usage_stats()
-            
-            return {
-                "daily_active_users": daily_active,
-                "weekly_active_users": weekly_active,
-                "monthly_active_users": monthly_active,
-                "avg_session_duration": avg_session_duration,
-                "feature_usage": feature_usage,
-                "retention_rate": self._calculate_retention_rate()
-            }
-        except Exception as e:
-            logger.error(f"User engagement metrics error: {str(e)}")
-            return {
-                "daily_active_users": 0,
-                "weekly_active_users": 0,
-                "monthly_active_users": 0,
-                "avg_session_duration": 0,
-                "feature_usage": {},
-                "retention_rate": 0.0
-            }
+            retention_rate = self._calculate_retention_rate()
+        else:
+            # One read of the scope's last 30 days of activity answers every window
+            activity = self._load_scope_activity(scope, days=30)
+            daily_active = self._active_in(activity, days=1)
+            weekly_active = self._active_in(activity, days=7)
+            monthly_active = self._active_in(activity, days=30)
+            retention_rate = self._scope_retention_rate(activity)
+        
+        # Session duration analytics
+        avg_session_duration = self._calculate_avg_session_duration(scope)
+        
+        # Feature usage
+        feature_usage = self._get_feature_usage_stats(scope)
+        
+        return {
+            "daily_active_users": daily_active,
+            "weekly_active_users": weekly_active,
+            "monthly_active_users": monthly_active,
+            "avg_session_duration": avg_session_duration,
+            "feature_usage": feature_usage,
+            "retention_rate": retention_rate
+        }
     
-    def _get_course_performance_metrics(self) -> Dict[str, Any]:
+    def _get_course_performance_metrics(self, scope: AnalyticsScope = PLATFORM) -> Dict[str, Any]:
         """Get course performance analytics"""
-        try:
-            courses = self.db.get_courses()
-            course_stats = []
-            
-            for course in courses:
-                course_id = course.get('id')
-                enrollments = self.db.get_course_enrollments(course_id)
-                
-                # Calculate course metrics
-                enrollment_count = len(enrollments)
-                completion_count = len([e for e in enrollments if e.get('completed_at')])
-                completion_rate = (completion_count / enrollment_count * 100) if enrollment_count > 0 else 0
-                
-                # Average progress
-                avg_progress = sum([e.get('progress_percentage', 0) for e in enrollments]) / enrollment_count if enrollment_count > 0 else 0
-                
-                course_stats.append({
-                    "course_id": course_id,
-                    "course_title": course.get('title'),
-                    "enrollment_count": enrollment_count,
-                    "completion_rate": round(completion_rate, 2),
-                    "avg_progress": round(avg_progress, 2),
-                    "rating": course.get('rating', 0)
-                })
-            
-            # Sort by enrollment count
-            course_stats.sort(key=lambda x: x['enrollment_count'], reverse=True)
-            
-            return {
-                "top_courses": course_stats[:10],
-                "total_enrollments": sum([c['enrollment_count'] for c in course_stats]),
-                "avg_completion_rate": round(sum([c['completion_rate'] for c in course_stats]) / len(course_stats), 2) if course_stats else 0
-            }
-            
-        except Exception as e:
-            logger.error(f"Course performance metrics error: {str(e)}")
-            return {
-                "top_courses": [],
-                "total_enrollments": 0,
-                "avg_completion_rate": 0.0
-            }
+        course_stats = []
+        for row in self._get_course_enrollment_stats(scope):
+            enrollment_count = row["enrollment_count"]
+            completion_rate = (row["completion_count"] / enrollment_count * 100) if enrollment_count > 0 else 0
+            course_stats.append({
+                "course_id": row["course_id"],
+                "course_title": row.get("course_title"),
+                "enrollment_count": enrollment_count,
+                "completion_rate": round(completion_rate, 2),
+                "avg_progress": round(float(row.get("avg_progress") or 0), 2),
+                "rating": row.get("rating", 0)
+            })
+        
+        # Sort by enrollment count
+        course_stats.sort(key=lambda x: x['enrollment_count'], reverse=True)
+        
+        return {
+            "top_courses": course_stats[:10],
+            "total_enrollments": sum([c['enrollment_count'] for c in course_stats]),
+            "avg_completion_rate": round(sum([c['completion_rate'] for c in course_stats]) / len(course_stats), 2) if course_stats else 0
+        }
     
-    def _get_ai_usage_metrics(self) -> Dict[str, Any]:
+    def _get_ai_usage_metrics(self, scope: AnalyticsScope = PLATFORM) -> Dict[str, Any]:
         """Get AI tutoring usage analytics"""
-        try:
-            # This would require implementing chat/session tracking
-            # For now, return placeholder data
-            return {
-                "total_conversations": 0,
-                "avg_messages_per_session": 0,
-                "most_popular_subjects": [],
-                "ai_response_time": 0,
-                "user_satisfaction": 0
-            }
-        except Exception as e:
-            logger.error(f"AI usage metrics error: {str(e)}")
-            return {
-                "total_conversations": 0,
-                "avg_messages_per_session": 0,
-                "most_popular_subjects": [],
-                "ai_response_time": 0,
-                "user_satisfaction": 0
-            }
+        # This would require implementing chat/session tracking
+        # For now, return placeholder data
+        return {
+            "total_conversations": 0,
+            "avg_messages_per_session": 0,
+            "most_popular_subjects": [],
+            "ai_response_time": 0,
+            "user_satisfaction": 0
+        }
     
-    def _get_recent_activity(self) -> List[Dict[str, Any]]:
+    def _get_recent_activity(self, scope: AnalyticsScope = PLATFORM) -> List[Dict[str, Any]]:
         """Get recent platform activity"""
-        try:
-            # Placeholder for recent activity feed
-            return []
-        except Exception as e:
-            logger.error(f"Recent activity error: {str(e)}")
-            return []
+        # Placeholder for recent activity feed
+        return []
     
-    def _get_performance_trends(self) -> Dict[str, Any]:
+    def _get_performance_trends(self, scope: AnalyticsScope = PLATFORM) -> Dict[str, Any]:
         """Get performance trend data"""
-        try:
-            # Calculate trends over last 30 days
-            return {
-                "user_growth": self._calculate_user_growth_trend(),
-                "engagement_trend": self._calculate_engagement_trend(),
-                "completion_trend": self._calculate_completion_trend()
-            }
-        except Exception as e:
-            logger.error(f"Performance trends error: {str(e)}")
-            return {
-                "user_growth": [],
-                "engagement_trend": [],
-                "completion_trend": []
-            }
+        # Calculate trends over last 30 days
+        return {
+            "user_growth": self._calculate_user_growth_trend(scope),
+            "engagement_trend": self._calculate_engagement_trend(scope),
+            "completion_trend": self._calculate_completion_trend(scope)
+        }
     
-    def _get_system_health_metrics(self) -> Dict[str, Any]:
+    def _get_system_health_metrics(self, scope: AnalyticsScope = PLATFORM) -> Dict[str, Any]:
         """Get system health and performance metrics"""
+        # Get cache statistics
+        cache_stats = self.cache.get_stats() if self.cache.is_available() else {"status": "disabled"}
+        
+        # Database health (basic check)
+        db_healthy = self.db.health_check().get('status') == 'healthy'
+        calls, errors, total_ms = self._get_performance_totals()
+        
+        return {
+            "database_status": "healthy" if db_healthy else "unhealthy",
+            "cache_status": cache_stats.get("status", "unknown"),
+            "cache_hit_rate": cache_stats.get("hit_rate", 0),
+            "response_time": self._get_avg_response_time(calls, total_ms),
+            "error_rate": self._get_error_rate(calls, errors)
+        }
+    
+    def _get_cohort_retention(self, scope: AnalyticsScope = PLATFORM) -> Dict[str, Any]:
+        """Weekly signup cohorts and the share of each still active N weeks later"""
+        return self.cohorts.get_matrix(weeks=12)
+    
+    # Helper methods
+    def _fetch_all(self, build_query: Callable[[], Any]) -> List[Dict[str, Any]]:
+        """All rows of an (ordered) query, a page at a time"""
+        rows, offset = [], 0
+        while True:
+            page = build_query().range(offset, offset + PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+            offset += PAGE_SIZE
+    
+    def _fetch_by_ids(self, ids: List[str], build_query: Callable[[List[str]], Any]) -> List[Dict[str, Any]]:
+        """_fetch_all over an IN (...) filter, split into bounded chunks of ids"""
+        rows = []
+        for i in range(0, len(ids), ID_CHUNK_SIZE):
+            chunk = ids[i:i + ID_CHUNK_SIZE]
+            rows.extend(self._fetch_all(lambda: build_query(chunk)))
+        return rows
+    
+    def _count_assignments(self, scope: AnalyticsScope) -> int:
+        """Assignments in the scope's courses (published ones only for a student)"""
+        total = 0
+        for i in range(0, len(scope.course_ids), ID_CHUNK_SIZE):
+            query = (self.db.client.table('assignments').select('id', count='exact')
+                     .in_('course_id', scope.course_ids[i:i + ID_CHUNK_SIZE]))
+            if scope.student_id:
+                query = query.eq('is_published', True)
+            total += query.limit(1).execute().count or 0
+        return total
+    
+    def _get_course_enrollment_stats(self, scope: AnalyticsScope = PLATFORM) -> List[Dict[str, Any]]:
+        """Per-course enrollment, completion and progress aggregates from one grouped query"""
+        if scope.student_id:
+            # A student sees their own enrollment rows, not the class aggregates
+            return self._aggregate_course_enrollments(scope)
+        if not scope.is_platform and not scope.course_ids:
+            return []
+        params = {} if scope.is_platform else {"p_course_ids": scope.course_ids}
         try:
-            # Get cache statistics
-            cache_stats = self.cache.get_stats() if self.cache.is_available() else {"status": "disabled"}
-            
-            # Database health (basic check)
-            db_healthy = self.db.health_check().get('status') == 'healthy'
-            
-            return {
-                "database_status": "healthy" if db_healthy else "unhealthy",
-                "cache_status": cache_stats.get("status", "unknown"),
-                "cache_hit_rate": cache_stats.get("hit_rate", 0),
-                "response_time": self._get_avg_response_time(),
-                "error_rate": self._get_error_rate()
-            }
+            rows = self.db.client.rpc('course_enrollment_stats', params).execute().data
+            if rows is not None:
+                return rows
         except Exception as e:
-            logger.error(f"System health metrics error: {str(e)}")
-            return {
-                "database_status": "unknown",
-                "cache_status": "unknown",
-                "cache_hit_rate": 0,
-                "response_time": 0,
-                "error_rate": 0
-            }
+            logger.warning(f"course_enrollment_stats() unavailable, aggregating enrollments in one scan: {str(e)}")
+        return self._aggregate_course_enrollments(scope)
     
-    # Helper methods
-    def _count_active_users(self, days: int) -> int:
-        """Count active users in the last N days"""
+    def _aggregate_course_enrollments(self, scope: AnalyticsScope = PLATFORM) -> List[Dict[str, Any]]:
+        """Fallback for the grouped query: one paged scan of narrow enrollment rows"""
+        def enrollments_query(course_ids: Optional[List[str]] = None):
+            query = self.db.client.table('course_enrollments').select('course_id, completed_at, progress_percentage')
+            if course_ids is not None:
+                query = query.in_('course_id', course_ids)
+            if scope.student_id:
+                query = query.eq('student_id', scope.student_id)
+            return query.order('id')
+        
+        if scope.is_platform:
+            courses = self.db.client.table('courses').select('id, title').execute().data or []
+            enrollments = self._fetch_all(enrollments_query)
+        else:
+            courses = self._fetch_by_ids(scope.course_ids, lambda chunk: self.db.client.table('courses')
+                                         .select('id, title').in_('id', chunk).order('id'))
+            enrollments = self._fetch_by_ids(scope.course_ids, enrollments_query)
+        
+        totals = {course['id']: {"course_id": course['id'], "course_title": course.get('title'),
+                                 "enrollment_count": 0, "completion_count": 0, "progress_sum": 0}
+                  for course in courses}
+        for row in enrollments:
+            course = totals.get(row.get('course_id'))
+            if course is None:
+                continue
+            course["enrollment_count"] += 1
+            course["completion_count"] += 1 if row.get('completed_at') else 0
+            course["progress_sum"] += row.get('progress_percentage') or 0
+        
+        for course in totals.values():
+            progress_sum = course.pop("progress_sum")
+            course["avg_progress"] = progress_sum / course["enrollment_count"] if course["enrollment_count"] else 0
+        return list(totals.values())
+    
+    def _load_scope_activity(self, scope: AnalyticsScope, days: int) -> Dict[str, Set[str]]:
+        """Days each of the scope's students interacted with the platform, over the last N days"""
+        since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+        rows = self._fetch_by_ids(scope.student_ids, lambda chunk: self.db.client.table('user_interactions')
+                                  .select('user_id, timestamp').in_('user_id', chunk)
+                                  .gte('timestamp', since).order('timestamp'))
+        activity: Dict[str, Set[str]] = defaultdict(set)
+        for row in rows:
+            activity[str(row['user_id'])].add(row['timestamp'][:10])
+        return activity
+    
+    def _active_in(self, activity: Dict[str, Set[str]], days: int) -> int:
+        since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+        return sum(1 for active_days in activity.values() if max(active_days) >= since)
+    
+    def _scope_retention_rate(self, activity: Dict[str, Set[str]]) -> float:
+        """Week-over-week retention among the scope's students (exact, from their activity)"""
+        today = datetime.utcnow().date()
+        this_week = (today - timedelta(days=6)).isoformat()
+        last_week = (today - timedelta(days=13)).isoformat()
+        previous = {user for user, active_days in activity.items()
+                    if any(last_week <= day < this_week for day in active_days)}
+        if not previous:
+            return 0.0
+        retained = sum(1 for user in previous if max(activity[user]) >= this_week)
+        return round(retained / len(previous) * 100, 2)
+    
+    def _count_active_users(self, days: int, scope: AnalyticsScope = PLATFORM) -> int:
+        """Count distinct active users in the last N days (HyperLogLog estimate for the platform)"""
         try:
-            # This would require activity tracking in the database
-            # For now, return a placeholder calculation
-            all_users = self.db.get_all_users()
-            return len(all_users) // 2  # Placeholder: assume 50% are active
+            if scope.is_platform:
+                return self.activity.count_active(days)
+            return self._active_in(self._load_scope_activity(scope, days), days)
         except Exception:
             return 0
     
-    def _calculate_overall_completion_rate(self) -> float:
-        """Calculate overall platform completion rate"""
+    def _calculate_overall_completion_rate(self, scope: AnalyticsScope = PLATFORM) -> float:
+        """Calculate the completion rate from the enrollment rollups (or the scope's enrollments)"""
         try:
-            # Placeholder calculation
-            return 75.5  # Example completion rate
+            if scope.is_platform:
+                totals = self.rollups.get_totals('course_completion_rates')
+                enrollments = totals.get('enrollments', 0)
+                completions = totals.get('completions', 0)
+            else:
+                rows = self._get_course_enrollment_stats(scope)
+                enrollments = sum(row["enrollment_count"] for row in rows)
+                completions = sum(row["completion_count"] for row in rows)
+            return round(completions / enrollments * 100, 2) if enrollments else 0.0
         except Exception:
             return 0.0
     
-    def _calculate_growth_rate(self) -> float:
-        """Calculate user growth rate"""
+    def _calculate_growth_rate(self, scope: AnalyticsScope = PLATFORM) -> float:
+        """Calculate growth over the last 30 days relative to before: signups for the platform,
+        enrollments for a scope's courses"""
         try:
-            # Placeholder calculation
-            return 12.3  # Example growth rate
+            aggregation_type, field = self._growth_source(scope)
+            total = self.rollups.get_totals(aggregation_type, scope=scope.rollup_scope).get(field, 0)
+            recent = self.rollups.get_totals(aggregation_type, scope=scope.rollup_scope, days=30).get(field, 0)
+            previous = total - recent
+            return round(recent / previous * 100, 2) if previous > 0 else 0.0
         except Exception:
             return 0.0
     
-    def _calculate_avg_session_duration(self) -> int:
-        """Calculate average session duration in minutes"""
+    def _growth_source(self, scope: AnalyticsScope) -> Tuple[str, str]:
+        """Rollup (type, field) counting new users: signups, or enrollments in a scope's courses"""
+        return ('user_signups', 'new_users') if scope.is_platform else ('course_completion_rates', 'enrollments')
+    
+    def _calculate_avg_session_duration(self, scope: AnalyticsScope = PLATFORM, days: int = 30) -> int:
+        """Average length in minutes of the study sessions closed in the last N days"""
+        since = (datetime.utcnow() - timedelta(days=days)).isoformat()
+        if not scope.is_platform and not scope.student_ids:
+            return 0
         try:
-            # Placeholder calculation
-            return 45  # Example: 45 minutes average
+            params = {"p_since": since}
+            if not scope.is_platform:
+                params["p_user_ids"] = scope.student_ids
+            rows = self.db.client.rpc('study_session_stats', params).execute().data
+            row = rows[0] if isinstance(rows, list) and rows else rows
+            if row:
+                return int(round(float(row.get("avg_duration_minutes") or 0)))
+        except Exception as e:
+            logger.warning(f"study_session_stats() unavailable, averaging sessions in one scan: {str(e)}")
+        
+        try:
+            def sessions_query(user_ids: Optional[List[str]] = None):
+                query = (self.db.client.table('study_sessions')
+                         .select('total_duration_minutes, performance_summary')
+                         .gte('session_end', since))
+                if user_ids is not None:
+                    query = query.in_('user_id', user_ids)
+                return query.order('session_end')
+            
+            if scope.is_platform:
+                rows = self._fetch_all(sessions_query)
+            else:
+                rows = self._fetch_by_ids(scope.student_ids, sessions_query)
+            durations = [row.get('total_duration_minutes') or 0 for row in rows if _has_duration(row)]
+            return int(round(sum(durations) / len(durations))) if durations else 0
         except Exception:
             return 0
     
-    def _get_feature_usage_stats(self) -> Dict[str, int]:
-        """Get feature usage statistics"""
+    def _get_feature_usage_stats(self, scope: AnalyticsScope = PLATFORM) -> Dict[str, int]:
+        """Get feature usage statistics (interactions per resource over the last 30 days)"""
         try:
+            resources = self.rollups.get_totals('engagement_metrics', scope=scope.rollup_scope,
+                                                days=30).get('resources', {})
             return {
-                "ai_tutor": 0,
-                "assignments": 0,
-                "courses": 0,
-                "discussions": 0
+                "ai_tutor": resources.get('ai_tutor', 0),
+                "assignments": resources.get('assignment', 0),
+                "courses": resources.get('course', 0),
+                "discussions": resources.get('discussion', 0)
             }
         except Exception:
             return {}
     
     def _calculate_retention_rate(self) -> float:
-        """Calculate user retention rate"""
+        """Calculate week-over-week retention: last week's active users seen again this week"""
         try:
-            return 85.2  # Placeholder
+            return self.activity.retention_rate(period_days=7)
         except Exception:
             return 0.0
     
-    def _calculate_user_growth_trend(self) -> List[Dict[str, Any]]:
-        """Calculate user growth trend data"""
+    def _calculate_user_growth_trend(self, scope: AnalyticsScope = PLATFORM) -> List[Dict[str, Any]]:
+        """Calculate user growth trend data for the last 30 days from the signup rollups
+        (enrollment rollups for a scope's courses)"""
         try:
-            # Generate placeholder trend data for last 30 days
-            trend_data = []
-            base_date = datetime.now() - timedelta(days=30)
+            aggregation_type, field = self._growth_source(scope)
+            series = self.rollups.get_series(aggregation_type, days=30, scope=scope.rollup_scope)
+            total_users = self.rollups.get_totals(aggregation_type, scope=scope.rollup_scope).get(field, 0)
+            running_total = total_users - sum(day.get(field, 0) for day in series)
             
-            for i in range(30):
-                date = base_date + timedelta(days=i)
+            trend_data = []
+            for day in series:
+                running_total += day.get(field, 0)
                 trend_data.append({
-                    "date": date.strftime("%Y-%m-%d"),
-                    "new_users": i % 5 + 1,  # Placeholder data
-                    "total_users": 100 + i * 2  # Placeholder data
+                    "date": day['date'],
+                    "new_users": day.get(field, 0),
+                    "total_users": running_total
                 })
             
             return trend_data
         except Exception:
             return []
     
-    def _calculate_engagement_trend(self) -> List[Dict[str, Any]]:
-        """Calculate engagement trend data"""
+    def _calculate_engagement_trend(self, scope: AnalyticsScope = PLATFORM) -> List[Dict[str, Any]]:
+        """Calculate engagement trend data for the last 30 days from the interaction rollups"""
         try:
-            # Placeholder engagement trend
-            return []
+            return [{
+                "date": day['date'],
+                "interactions": day.get('interactions', 0),
+                "duration_minutes": round(day.get('duration_seconds', 0) / 60, 1)
+            } for day in self.rollups.get_series('engagement_metrics', days=30, scope=scope.rollup_scope)]
         except Exception:
             return []
     
-    def _calculate_completion_trend(self) -> List[Dict[str, Any]]:
-        """Calculate completion trend data"""
+    def _calculate_completion_trend(self, scope: AnalyticsScope = PLATFORM) -> List[Dict[str, Any]]:
+        """Calculate completion trend data for the last 30 days from the enrollment rollups"""
         try:
-            # Placeholder completion trend
-            return []
+            return [{
+                "date": day['date'],
+                "enrollments": day.get('enrollments', 0),
+                "completions": day.get('completions', 0)
+            } for day in self.rollups.get_series('course_completion_rates', days=30, scope=scope.rollup_scope)]
         except Exception:
             return []
     
-    def _get_avg_response_time(self) -> float:
-        """Get average API response time"""
-        try:
-            # Get from cache performance metrics
-            return 150.0  # Placeholder: 150ms
-        except Exception:
-            return 0.0
+    def _get_performance_totals(self) -> Tuple[int, int, float]:
+        """Calls, errors and total milliseconds of monitored functions over the health window, all workers merged"""
+        report = performance_monitor.get_report(hours=HEALTH_WINDOW_HOURS)
+        calls, errors, total_ms = 0, 0, 0.0
+        for function in report.get('functions', {}).values():
+            overall = function.get('overall') or {}
+            calls += overall.get('count', 0)
+            errors += overall.get('errors', 0)
+            total_ms += (overall.get('avg_ms') or 0.0) * overall.get('count', 0)
+        return calls, errors, total_ms
     
-    def _get_error_rate(self) -> float:
-        """Get system error rate"""
-        try:
-            return 0.5  # Placeholder: 0.5% error rate
-        except Exception:
-            return 0.0
-    
-    def _filter_instructor_data(self, data: Dict[str, Any], instructor_id: str) -> Dict[str, Any]:
-        """Filter dashboard data for instructor view"""
-        # Filter to show only instructor's courses and students
-        return data  # Placeholder implementation
+    def _get_avg_response_time(self, calls: int, total_ms: float) -> float:
+        """Average response time of monitored functions in milliseconds"""
+        return round(total_ms / calls, 2) if calls else 0.0
     
-    def _filter_student_data(self, data: Dict[str, Any], student_id: str) -> Dict[str, Any]:
-        """Filter dashboard data for student view"""
-        # Filter to show only student's progress and courses
-        return data  # Placeholder implementation
+    def _get_error_rate(self, calls: int, errors: int) -> float:
+        """Share of monitored calls that raised, in percent"""
+        return round(errors / calls * 100, 2) if calls else 0.0
     
     def _get_fallback_dashboard_data(self) -> Dict[str, Any]:
         """Fallback dashboard data when analytics fail"""
@@ -392,8 +664,16 @@ class AnalyticsService:
                 "cache_hit_rate": 0,
                 "response_time": 0,
                 "error_rate": 0
+            },
+            "cohort_retention": {
+                "weeks": [],
+                "cohorts": [],
+                "average_retention": []
             }
         }
 
 # Global analytics service instance
 analytics_service = AnalyticsService()
+
+# Admin dashboard is the slowest cold read after a deploy
+cache_warmer.register('analytics_dashboard', analytics_service.get_dashboard_data)
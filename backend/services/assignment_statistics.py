@@ -0,0 +1,147 @@
+"""
+Assignment Statistics Engine for AI Tutor Platform
+Streams an assignment's graded points into a NumPy array page by page and summarizes
+them in one pass, without loading submission content
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+# Letter bands by grade percentage, lowest first, so np.digitize maps F..A to 0..4
+LETTER_GRADES = ('F', 'D', 'C', 'B', 'A')
+LETTER_CUTOFFS = np.array([60, 70, 80, 90], dtype=float)
+PERCENTILES = (25, 50, 75, 90)
+
+
+class AssignmentStatisticsEngine:
+    """Grade statistics and bounded submission pages for a single assignment"""
+
+    PAGE_SIZE = 1000
+    MAX_SUBMISSIONS_PAGE = 200
+    # Listing columns only; submission content and file urls stay in the database
+    SUBMISSION_COLUMNS = ('id, student_id, status, attempt_number, submitted_at, is_late, late_minutes, '
+                          'student:users!assignment_submissions_student_id_fkey(id, name, email), '
+                          'grade:assignment_grades(points_earned, letter_grade, graded_at)')
+
+    def __init__(self):
+        self.db = db_service
+
+    def get_statistics(self, assignment_id: str, max_points: float = 100) -> Dict[str, Any]:
+        """
+        Args:
+            assignment_id: Assignment to summarize
+            max_points: Points the assignment is out of, for percentages and letter bands
+
+        Returns:
+            Submission counts, summary statistics of the graded points and the letter distribution
+        """
+        total_submissions, points = self._stream_points(assignment_id)
+        max_points = float(max_points or 100)
+        graded = int(points.size)
+
+        statistics = {
+            'total_submissions': total_submissions,
+            'graded_submissions': graded,
+            'pending_submissions': total_submissions - graded,
+            'average_grade': 0,
+            'median_grade': 0,
+            'std_deviation': 0,
+            'min_grade': 0,
+            'max_grade': 0,
+            'average_percentage': 0,
+            'percentiles': {f'p{p}': 0 for p in PERCENTILES},
+            'grade_distribution': {letter: 0 for letter in reversed(LETTER_GRADES)}
+        }
+        if not graded:
+            return statistics
+
+        # One sort serves the median and every percentile
+        quantiles = np.percentile(points, (50,) + PERCENTILES)
+        bands = np.bincount(np.digitize(points / max_points * 100, LETTER_CUTOFFS), minlength=len(LETTER_GRADES))
+        statistics.update({
+            'average_grade': round(float(points.mean()), 1),
+            'median_grade': round(float(quantiles[0]), 1),
+            'std_deviation': round(float(points.std()), 2),
+            'min_grade': round(float(points.min()), 1),
+            'max_grade': round(float(points.max()), 1),
+            'average_percentage': round(float(points.mean() / max_points * 100), 1),
+            'percentiles': {f'p{p}': round(float(q), 1) for p, q in zip(PERCENTILES, quantiles[1:])},
+            'grade_distribution': {letter: int(bands[i]) for i, letter in reversed(list(enumerate(LETTER_GRADES)))}
+        })
+        return statistics
+
+    def count_enrollments(self, course_id: str) -> int:
+        """Enrolled students, counted by the database"""
+        try:
+            return (self.db.client.table('course_enrollments').select('id', count='exact')
+                    .eq('course_id', course_id).limit(1).execute().count or 0)
+        except Exception as e:
+            logger.error(f"Error counting enrollments for course {course_id}: {str(e)}")
+            return 0
+
+    def get_submissions_page(self, assignment_id: str, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """One page of submission listings, newest first"""
+        limit = max(1, min(limit, self.MAX_SUBMISSIONS_PAGE))
+        offset = max(0, offset)
+        try:
+            response = (self.db.client.table('assignment_submissions')
+                        .select(self.SUBMISSION_COLUMNS, count='exact')
+                        .eq('assignment_id', assignment_id)
+                        .order('submitted_at', desc=True)
+                        .range(offset, offset + limit - 1)
+                        .execute())
+            items = response.data or []
+            total = response.count if response.count is not None else offset + len(items)
+        except Exception as e:
+            logger.error(f"Error getting submissions page for assignment {assignment_id}: {str(e)}")
+            items, total = [], 0
+
+        for item in items:
+            if isinstance(item.get('grade'), list):
+                item['grade'] = item['grade'][0] if item['grade'] else None
+        return {
+            'items': items,
+            'limit': limit,
+            'offset': offset,
+            'total': total,
+            'has_more': offset + len(items) < total
+        }
+
+    # Internal helpers
+    def _stream_points(self, assignment_id: str) -> Tuple[int, np.ndarray]:
+        """Count submissions and collect graded points, one page of narrow rows at a time"""
+        pages: List[np.ndarray] = []
+        total = 0
+        offset = 0
+        while True:
+            rows = (self.db.client.table('assignment_submissions')
+                    .select('id, grade:assignment_grades(points_earned)')
+                    .eq('assignment_id', assignment_id)
+                    .order('id')
+                    .range(offset, offset + self.PAGE_SIZE - 1)
+                    .execute().data or [])
+            total += len(rows)
+            page = np.fromiter((_points_earned(row) for row in rows), dtype=float, count=len(rows))
+            pages.append(page[~np.isnan(page)])
+            if len(rows) < self.PAGE_SIZE:
+                break
+            offset += self.PAGE_SIZE
+        return total, np.concatenate(pages)
+
+
+def _points_earned(row: Dict[str, Any]) -> float:
+    grade = row.get('grade')
+    if isinstance(grade, list):
+        grade = grade[0] if grade else None
+    points: Optional[float] = (grade or {}).get('points_earned')
+    return float(points) if points is not None else np.nan
+
+
+# Global assignment statistics engine instance
+assignment_statistics = AssignmentStatisticsEngine()
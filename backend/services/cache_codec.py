@@ -0,0 +1,183 @@
+"""
+Cache Value Codec for AI Tutor Platform
+Serializes cached values with a one-byte header naming the codec and compression,
+so values are decoded without trial-and-error and large payloads are compressed
+"""
+
+import json
+import logging
+import os
+import pickle
+import zlib
+from typing import Any, Callable, Dict, Tuple
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # Optional dependency
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+# Header byte: low 3 bits = codec, bits 3-4 = compression. Every header is a control
+# character, so it can never be the first byte of a legacy JSON value or a pickle (0x80)
+CODEC_JSON = 0x01
+CODEC_ORJSON = 0x02
+CODEC_MSGPACK = 0x03
+CODEC_PICKLE = 0x04
+CODEC_MASK = 0x07
+
+COMPRESSION_NONE = 0x00
+COMPRESSION_ZLIB = 0x08
+COMPRESSION_LZ4 = 0x10
+COMPRESSION_MASK = 0x18
+
+CODEC_NAMES = {'json': CODEC_JSON, 'orjson': CODEC_ORJSON, 'msgpack': CODEC_MSGPACK, 'pickle': CODEC_PICKLE}
+COMPRESSION_NAMES = {'none': COMPRESSION_NONE, 'zlib': COMPRESSION_ZLIB, 'lz4': COMPRESSION_LZ4}
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=str, separators=(',', ':')).encode('utf-8')
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgpack_dumps(value: Any) -> bytes:
+    return msgpack.packb(value, default=str, use_bin_type=True)
+
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class CacheCodec:
+    """Encodes values for Redis: [header byte][payload], payload optionally compressed"""
+
+    def __init__(self, codec: str = None, compression: str = None, compression_threshold: int = None,
+                 compression_level: int = 1):
+        """
+        Args:
+            codec: json, orjson, msgpack, pickle or auto (fastest installed)
+            compression: zlib, lz4, none or auto (lz4 when installed)
+            compression_threshold: Payloads at least this many bytes are compressed
+            compression_level: zlib level (1 favours speed, cached values are hot)
+        """
+        self._encoders: Dict[int, Callable[[Any], bytes]] = {CODEC_JSON: _json_dumps, CODEC_PICKLE: pickle.dumps}
+        self._decoders: Dict[int, Callable[[bytes], Any]] = {CODEC_JSON: json.loads, CODEC_PICKLE: pickle.loads}
+        if orjson is not None:
+            self._encoders[CODEC_ORJSON] = _orjson_dumps
+            self._decoders[CODEC_ORJSON] = orjson.loads
+        if msgpack is not None:
+            self._encoders[CODEC_MSGPACK] = _msgpack_dumps
+            self._decoders[CODEC_MSGPACK] = _msgpack_loads
+
+        self.codec = self._resolve_codec(codec or os.getenv('CACHE_CODEC', 'auto'))
+        self.compression = self._resolve_compression(compression or os.getenv('CACHE_COMPRESSION', 'auto'))
+        self.compression_threshold = (compression_threshold if compression_threshold is not None
+                                      else int(os.getenv('CACHE_COMPRESSION_THRESHOLD', 1024)))
+        self.compression_level = compression_level
+
+    def _resolve_codec(self, name: str) -> int:
+        if name == 'auto':
+            for codec in (CODEC_MSGPACK, CODEC_ORJSON):
+                if codec in self._encoders:
+                    return codec
+            return CODEC_JSON
+        codec = CODEC_NAMES.get(name)
+        if codec not in self._encoders:
+            logger.warning(f"Cache codec {name} unavailable, using json")
+            return CODEC_JSON
+        return codec
+
+    def _resolve_compression(self, name: str) -> int:
+        if name == 'auto':
+            return COMPRESSION_LZ4 if lz4_frame is not None else COMPRESSION_ZLIB
+        compression = COMPRESSION_NAMES.get(name)
+        if compression is None or (compression == COMPRESSION_LZ4 and lz4_frame is None):
+            logger.warning(f"Cache compression {name} unavailable, using zlib")
+            return COMPRESSION_ZLIB
+        return compression
+
+    @property
+    def name(self) -> str:
+        codec = next(k for k, v in CODEC_NAMES.items() if v == self.codec)
+        compression = next(k for k, v in COMPRESSION_NAMES.items() if v == self.compression)
+        return f"{codec}+{compression}"
+
+    def encode(self, value: Any) -> Tuple[bytes, int]:
+        """
+        Serialize a value
+
+        Returns:
+            Tuple of (bytes to store, uncompressed payload size)
+        """
+        codec = self.codec
+        try:
+            payload = self._encoders[codec](value)
+        except (TypeError, ValueError, OverflowError):
+            # Objects the structured codecs cannot represent
+            codec = CODEC_PICKLE
+            payload = pickle.dumps(value)
+
+        raw_size = len(payload)
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and raw_size >= self.compression_threshold:
+            compressed = self._compress(self.compression, payload)
+            if len(compressed) < raw_size:
+                payload, compression = compressed, self.compression
+        return bytes((codec | compression,)) + payload, raw_size
+
+    def decode(self, data: bytes) -> Tuple[Any, int]:
+        """
+        Deserialize a stored value
+
+        Returns:
+            Tuple of (value, uncompressed payload size)
+        """
+        header = data[0] if data else 0
+        codec = header & CODEC_MASK
+        if not data or header > COMPRESSION_MASK | CODEC_MASK or codec not in CODEC_NAMES.values():
+            return self._decode_legacy(data), len(data)
+
+        decoder = self._decoders.get(codec)
+        if decoder is None:
+            # Written by a worker that has an optional codec this one lacks
+            raise ValueError(f"Cached value uses codec {codec}, which is not installed")
+        payload = data[1:]
+        compression = header & COMPRESSION_MASK
+        if compression:
+            payload = self._decompress(compression, payload)
+        return decoder(payload), len(payload)
+
+    def _compress(self, compression: int, payload: bytes) -> bytes:
+        if compression == COMPRESSION_LZ4:
+            return lz4_frame.compress(payload)
+        return zlib.compress(payload, self.compression_level)
+
+    def _decompress(self, compression: int, payload: bytes) -> bytes:
+        if compression == COMPRESSION_LZ4:
+            if lz4_frame is None:
+                raise ValueError("Cached value is lz4-compressed but lz4 is not installed")
+            return lz4_frame.decompress(payload)
+        return zlib.decompress(payload)
+
+    def _decode_legacy(self, data: bytes) -> Any:
+        """Values written before the header existed: JSON text or a pickle"""
+        if data[:1] == b'\x80':
+            return pickle.loads(data)
+        return json.loads(data.decode('utf-8'))
+
+
+# Shared codec instance used by the cache service
+cache_codec = CacheCodec()
@@ -5,20 +5,98 @@ Provides high-performance caching for frequently accessed data
 
 import redis
 import json
-import pickle
 import logging
-from typing import Any, Optional, Dict, List
+import hashlib
+import inspect
+import math
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Optional, Dict, List
 from functools import wraps
 from datetime import datetime, timedelta
 import os
 
+from circuit_breaker import CircuitBreaker, CircuitState
+from latency_histogram import LatencyHistogram
+from services.cache_codec import cache_codec
+from services.local_cache import LocalCache, MISSING
+
+# Errors that mean Redis itself is unreachable (as opposed to a bad command or value)
+REDIS_CONNECTION_ERRORS = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+
 logger = logging.getLogger(__name__)
 
+# Deletes every key registered under the given tag sets, then the tag sets themselves.
+# Runs atomically, so a concurrent set() either lands before (and is deleted) or after.
+INVALIDATE_TAGS_SCRIPT = """
+local deleted = {}
+for _, tag_key in ipairs(KEYS) do
+    local members = redis.call('SMEMBERS', tag_key)
+    for i = 1, #members, 500 do
+        local chunk = {unpack(members, i, math.min(i + 499, #members))}
+        redis.call('DEL', unpack(chunk))
+        for _, member in ipairs(chunk) do
+            deleted[#deleted + 1] = member
+        end
+    end
+    redis.call('DEL', tag_key)
+end
+return deleted
+"""
+
+# Releases a lock only if it still holds our token (it may have expired and been re-acquired)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 class CacheService:
-    """Redis-based caching service for performance optimization"""
+    """Two-tier cache: in-process LRU in front of Redis, kept coherent via pub/sub invalidation"""
+    
+    INVALIDATION_CHANNEL = "ai_tutor:cache:invalidate"
+    SCAN_BATCH_SIZE = 500
     
     def __init__(self):
         """Initialize Redis connection"""
+        # Cache configuration
+        self.default_ttl = 300  # 5 minutes default TTL
+        
+        # In-process tier; short TTL bounds staleness if an invalidation message is ever missed
+        self.local = LocalCache(
+            max_bytes=int(os.getenv('CACHE_LOCAL_MAX_BYTES', 32 * 1024 * 1024)),
+            max_entry_bytes=int(os.getenv('CACHE_LOCAL_MAX_ENTRY_BYTES', 1024 * 1024)),
+            default_ttl=float(os.getenv('CACHE_LOCAL_TTL', 30))
+        )
+        self.codec = cache_codec
+        self.instance_id = uuid.uuid4().hex
+        self._invalidation_seq = 0
+        self._listener: Optional[threading.Thread] = None
+        self._tier_stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0}
+        self.tag_ttl = int(os.getenv('CACHE_TAG_TTL', 86400))  # Tag sets outlive the entries they index
+        self._invalidate_tags_script = None
+        self._release_lock_script = None
+        self._op_stats: Dict[str, Dict[str, Any]] = {}
+        self._op_stats_lock = threading.Lock()
+        self._short_circuited = 0
+        
+        # Connection state: cache calls fail fast while Redis is marked down and a
+        # background PING with exponential backoff detects recovery
+        self.breaker = CircuitBreaker(
+            name='redis',
+            failure_rate_threshold=float(os.getenv('CACHE_BREAKER_FAILURE_RATE', 0.5)),
+            window_seconds=int(os.getenv('CACHE_BREAKER_WINDOW_SECONDS', 30)),
+            minimum_calls=int(os.getenv('CACHE_BREAKER_MIN_CALLS', 3)),
+            half_open_max_calls=int(os.getenv('CACHE_BREAKER_HALF_OPEN_CALLS', 2)),
+            health_probe=self._health_probe,
+            probe_interval=float(os.getenv('CACHE_BREAKER_PROBE_INTERVAL', 1)),
+            max_probe_interval=float(os.getenv('CACHE_BREAKER_MAX_PROBE_INTERVAL', 30))
+        )
+        
         try:
             # Redis configuration
             self.redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
@@ -29,59 +107,120 @@ class CacheService:
                 socket_connect_timeout=5,
                 health_check_interval=30
             )
-            
-            # Test connection
-            self.redis_client.ping()
-            logger.info("Redis cache service initialized successfully")
-            
-            # Cache configuration
-            self.default_ttl = 300  # 5 minutes default TTL
+            self._invalidate_tags_script = self.redis_client.register_script(INVALIDATE_TAGS_SCRIPT)
+            self._release_lock_script = self.redis_client.register_script(RELEASE_LOCK_SCRIPT)
             self.enabled = True
-            
         except Exception as e:
-            logger.warning(f"Redis not available, caching disabled: {str(e)}")
+            logger.warning(f"Redis not configured, caching disabled: {str(e)}")
             self.redis_client = None
             self.enabled = False
+            return
+        
+        # Test connection once; if Redis is down the breaker keeps probing in the background
+        try:
+            self.redis_client.ping()
+            logger.info("Redis cache service initialized successfully")
+        except Exception as e:
+            logger.warning(f"Redis not available, caching paused until it recovers: {str(e)}")
+            self.breaker.force_open(e)
+        self._start_invalidation_listener()
     
     def is_available(self) -> bool:
-        """Check if cache service is available"""
+        """Check if cache service is available (connection state only, no round trip)"""
         if not self.enabled or not self.redis_client:
             return False
-        
+        if self.breaker.state == CircuitState.OPEN:
+            self._short_circuited += 1
+            return False
+        return True
+    
+    def _health_probe(self):
+        """PING used by the breaker's background recovery check"""
+        self.redis_client.ping()
+    
+    @contextmanager
+    def _operation(self, name: str):
+        """Time a Redis round trip and feed connection failures to the breaker"""
+        started = time.perf_counter()
+        failed = False
         try:
-            self.redis_client.ping()
-            return True
+            yield
+        except REDIS_CONNECTION_ERRORS as e:
+            failed = True
+            self.breaker.record_failure(e)
+            raise
         except Exception:
-            return False
+            failed = True
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            stats = self._op_stats.get(name)
+            if stats is None:
+                with self._op_stats_lock:
+                    stats = self._op_stats.setdefault(name, {'histogram': LatencyHistogram(), 'errors': 0})
+            stats['histogram'].record((time.perf_counter() - started) * 1000)
+            if failed:
+                stats['errors'] += 1
+    
+    def _get_operation_stats(self) -> Dict[str, Any]:
+        """Per-operation Redis latency percentiles and error counts"""
+        with self._op_stats_lock:
+            operations = dict(self._op_stats)
+        report = {}
+        for name, stats in sorted(operations.items()):
+            histogram = stats['histogram']
+            percentiles = histogram.percentiles((50, 95, 99))
+            report[name] = {
+                'calls': histogram.count,
+                'errors': stats['errors'],
+                **{f"{k}_ms": round(v, 2) if v is not None else None for k, v in percentiles.items()}
+            }
+        return report
     
     def _serialize_key(self, key: str) -> str:
         """Ensure key is properly formatted"""
         return f"ai_tutor:{key}"
     
+    def _tag_key(self, tag: str) -> str:
+        """Redis set holding the cache keys registered under a tag"""
+        return self._serialize_key(f"tag:{tag}")
+    
     def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+        """Get value from cache (local tier first, then Redis)"""
+        cache_key = self._serialize_key(key)
+        value = self.local.get(cache_key)
+        if value is not MISSING:
+            self._tier_stats['local_hits'] += 1
+            return value
+        
         if not self.is_available():
             return None
         
         try:
-            cache_key = self._serialize_key(key)
-            data = self.redis_client.get(cache_key)
+            seq = self._invalidation_seq
+            with self._operation('get'):
+                data = self.redis_client.get(cache_key)
             
             if data is None:
+                self._tier_stats['misses'] += 1
                 return None
             
-            # Try to deserialize as JSON first, then pickle
-            try:
-                return json.loads(data.decode('utf-8'))
-            except (json.JSONDecodeError, UnicodeDecodeError):
-                return pickle.loads(data)
+            # The header byte names the codec, no trial decoding
+            value, size = self.codec.decode(data)
+            
+            self._tier_stats['redis_hits'] += 1
+            # Skip the local fill if an invalidation arrived while we were reading
+            if seq == self._invalidation_seq:
+                self.local.set(cache_key, value, size)
+            return value
                 
         except Exception as e:
             logger.error(f"Cache get error for key {key}: {str(e)}")
             return None
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Set value in cache with optional TTL"""
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, tags: Optional[List[str]] = None) -> bool:
+        """Set value in cache with optional TTL, registering the key under the given tags"""
         if not self.is_available():
             return False
         
@@ -89,47 +228,215 @@ class CacheService:
             cache_key = self._serialize_key(key)
             ttl = ttl or self.default_ttl
             
-            # Try to serialize as JSON first, then pickle
-            try:
-                data = json.dumps(value, default=str).encode('utf-8')
-            except (TypeError, ValueError):
-                data = pickle.dumps(value)
+            # Codec header + payload, compressed above the size threshold
+            data, size = self.codec.encode(value)
             
-            result = self.redis_client.setex(cache_key, ttl, data)
+            pipe = self.redis_client.pipeline(transaction=bool(tags))
+            pipe.setex(cache_key, ttl, data)
+            for tag in tags or []:
+                tag_key = self._tag_key(tag)
+                pipe.sadd(tag_key, cache_key)
+                pipe.expire(tag_key, max(ttl, self.tag_ttl))
+            self._queue_invalidation(pipe, keys=[cache_key])
+            with self._operation('set'):
+                result = pipe.execute()[0]
+            # Keep what a Redis hit would return (e.g. ISO strings, lists), not the caller's object
+            self.local.set(cache_key, self.codec.decode(data)[0], size, ttl)
             return bool(result)
             
         except Exception as e:
             logger.error(f"Cache set error for key {key}: {str(e)}")
             return False
     
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Get several values in one round trip (local tier first, then MGET); misses are omitted"""
+        results = {}
+        pending = []
+        for key in dict.fromkeys(keys):
+            value = self.local.get(self._serialize_key(key))
+            if value is not MISSING:
+                self._tier_stats['local_hits'] += 1
+                results[key] = value
+            else:
+                pending.append(key)
+        
+        if not pending or not self.is_available():
+            return results
+        
+        try:
+            seq = self._invalidation_seq
+            cache_keys = [self._serialize_key(key) for key in pending]
+            with self._operation('get_many'):
+                values = self.redis_client.mget(cache_keys)
+            
+            for key, cache_key, data in zip(pending, cache_keys, values):
+                if data is None:
+                    self._tier_stats['misses'] += 1
+                    continue
+                try:
+                    value, size = self.codec.decode(data)
+                except Exception as e:
+                    logger.error(f"Cache decode error for key {key}: {str(e)}")
+                    continue
+                self._tier_stats['redis_hits'] += 1
+                results[key] = value
+                if seq == self._invalidation_seq:
+                    self.local.set(cache_key, value, size)
+            return results
+        except Exception as e:
+            logger.error(f"Cache get_many error for {len(pending)} keys: {str(e)}")
+            return results
+    
+    def set_many(self, mapping: Dict[str, Any], ttl: Optional[int] = None,
+                 tags: Optional[Dict[str, List[str]]] = None) -> bool:
+        """
+        Set several values in one pipelined round trip
+        
+        Args:
+            mapping: Key -> value
+            ttl: TTL applied to every key (default TTL if omitted)
+            tags: Optional key -> tags to register each entry under
+        """
+        if not mapping or not self.is_available():
+            return False
+        
+        try:
+            ttl = ttl or self.default_ttl
+            encoded = {}
+            pipe = self.redis_client.pipeline(transaction=bool(tags))
+            for key, value in mapping.items():
+                cache_key = self._serialize_key(key)
+                data, size = self.codec.encode(value)
+                encoded[cache_key] = (data, size)
+                pipe.setex(cache_key, ttl, data)
+                for tag in (tags or {}).get(key, []):
+                    tag_key = self._tag_key(tag)
+                    pipe.sadd(tag_key, cache_key)
+                    pipe.expire(tag_key, max(ttl, self.tag_ttl))
+            self._queue_invalidation(pipe, keys=list(encoded))
+            with self._operation('set_many'):
+                pipe.execute()
+            
+            for cache_key, (data, size) in encoded.items():
+                self.local.set(cache_key, self.codec.decode(data)[0], size, ttl)
+            return True
+        except Exception as e:
+            logger.error(f"Cache set_many error for {len(mapping)} keys: {str(e)}")
+            return False
+    
+    def delete_many(self, keys: List[str]) -> int:
+        """Delete several keys in one round trip"""
+        cache_keys = [self._serialize_key(key) for key in dict.fromkeys(keys)]
+        self.local.delete(cache_keys)
+        if not cache_keys or not self.is_available():
+            return 0
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.unlink(*cache_keys)
+            self._queue_invalidation(pipe, keys=cache_keys)
+            with self._operation('delete_many'):
+                return pipe.execute()[0]
+        except Exception as e:
+            logger.error(f"Cache delete_many error for {len(cache_keys)} keys: {str(e)}")
+            return 0
+    
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
+        cache_key = self._serialize_key(key)
+        self.local.delete([cache_key])
         if not self.is_available():
             return False
         
         try:
-            cache_key = self._serialize_key(key)
-            result = self.redis_client.delete(cache_key)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.delete(cache_key)
+            self._queue_invalidation(pipe, keys=[cache_key])
+            with self._operation('delete'):
+                result = pipe.execute()[0]
             return bool(result)
         except Exception as e:
             logger.error(f"Cache delete error for key {key}: {str(e)}")
             return False
     
-    def delete_pattern(self, pattern: str) -> int:
-        """Delete all keys matching pattern"""
-        if not self.is_available():
+    def invalidate_tags(self, *tags: str) -> int:
+        """Atomically delete every entry registered under any of the tags"""
+        tags = [tag for tag in tags if tag]
+        if not tags or not self.is_available():
             return 0
         
         try:
-            cache_pattern = self._serialize_key(pattern)
-            keys = self.redis_client.keys(cache_pattern)
+            with self._operation('invalidate_tags'):
+                deleted = self._invalidate_tags_script(keys=[self._tag_key(tag) for tag in tags])
+            keys = [k.decode('utf-8') if isinstance(k, bytes) else k for k in deleted or []]
             if keys:
-                return self.redis_client.delete(*keys)
+                self.local.delete(keys)
+                with self._operation('publish'):
+                    self._publish_invalidation(keys=keys)
+            logger.debug(f"Cache invalidated {len(keys)} keys for tags: {', '.join(tags)}")
+            return len(keys)
+        except Exception as e:
+            logger.error(f"Cache tag invalidation error for {tags}: {str(e)}")
+            return 0
+    
+    def acquire_lock(self, name: str, timeout: float = 10) -> Optional[str]:
+        """
+        Try to take a short-lived cross-process lock without blocking
+        
+        Returns:
+            A token to pass to release_lock, or None if another worker holds the lock.
+            Without Redis the lock is always granted (single-flight then stays per process).
+        """
+        token = uuid.uuid4().hex
+        if not self.is_available():
+            return token
+        try:
+            with self._operation('lock'):
+                acquired = self.redis_client.set(self._serialize_key(f"lock:{name}"), token,
+                                                 nx=True, px=int(timeout * 1000))
+            return token if acquired else None
+        except Exception as e:
+            logger.error(f"Cache lock error for {name}: {str(e)}")
+            return token
+    
+    def release_lock(self, name: str, token: str):
+        """Release a lock taken with acquire_lock"""
+        if not token or not self.is_available():
+            return
+        try:
+            with self._operation('unlock'):
+                self._release_lock_script(keys=[self._serialize_key(f"lock:{name}")], args=[token])
+        except Exception as e:
+            logger.error(f"Cache lock release error for {name}: {str(e)}")
+    
+    def delete_pattern(self, pattern: str) -> int:
+        """Delete all keys matching pattern (incremental SCAN, never blocks Redis like KEYS)"""
+        cache_pattern = self._serialize_key(pattern)
+        self.local.delete_pattern(cache_pattern)
+        if not self.is_available():
             return 0
+        
+        try:
+            with self._operation('delete_pattern'):
+                self._publish_invalidation(pattern=cache_pattern)
+                return self._scan_delete(cache_pattern)
         except Exception as e:
             logger.error(f"Cache pattern delete error for {pattern}: {str(e)}")
             return 0
     
+    def _scan_delete(self, cache_pattern: str) -> int:
+        """SCAN for matching keys and UNLINK them in batches (memory is reclaimed off the main thread)"""
+        deleted = 0
+        batch = []
+        for key in self.redis_client.scan_iter(match=cache_pattern, count=self.SCAN_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= self.SCAN_BATCH_SIZE:
+                deleted += self.redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += self.redis_client.unlink(*batch)
+        return deleted
+    
     def increment(self, key: str, amount: int = 1, ttl: Optional[int] = None) -> Optional[int]:
         """Increment a counter in cache"""
         if not self.is_available():
@@ -137,13 +444,16 @@ class CacheService:
         
         try:
             cache_key = self._serialize_key(key)
+            self.local.delete([cache_key])
             
             # Use pipeline for atomic operation
             pipe = self.redis_client.pipeline()
             pipe.incr(cache_key, amount)
             if ttl:
                 pipe.expire(cache_key, ttl)
-            result = pipe.execute()
+            self._queue_invalidation(pipe, keys=[cache_key])
+            with self._operation('increment'):
+                result = pipe.execute()
             
             return result[0]
             
@@ -154,10 +464,17 @@ class CacheService:
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         if not self.is_available():
-            return {"status": "disabled"}
+            return {
+                "status": "unavailable" if self.enabled else "disabled",
+                "connection": self.breaker.get_status(),
+                "short_circuited_calls": self._short_circuited,
+                "tiers": self._get_tier_stats(),
+                "operations": self._get_operation_stats()
+            }
         
         try:
-            info = self.redis_client.info()
+            with self._operation('info'):
+                info = self.redis_client.info()
             return {
                 "status": "active",
                 "connected_clients": info.get("connected_clients", 0),
@@ -165,7 +482,12 @@ class CacheService:
                 "total_commands_processed": info.get("total_commands_processed", 0),
                 "keyspace_hits": info.get("keyspace_hits", 0),
                 "keyspace_misses": info.get("keyspace_misses", 0),
-                "hit_rate": self._calculate_hit_rate(info)
+                "hit_rate": self._calculate_hit_rate(info),
+                "tiers": self._get_tier_stats(),
+                "connection": self.breaker.get_status(),
+                "short_circuited_calls": self._short_circuited,
+                "operations": self._get_operation_stats(),
+                "codec": self.codec.name
             }
         except Exception as e:
             logger.error(f"Cache stats error: {str(e)}")
@@ -182,16 +504,99 @@ class CacheService:
         
         return round((hits / total) * 100, 2)
     
+    def _get_tier_stats(self) -> Dict[str, Any]:
+        """Hit rates for this process: local tier over all gets, Redis over local misses"""
+        local_hits = self._tier_stats['local_hits']
+        redis_hits = self._tier_stats['redis_hits']
+        misses = self._tier_stats['misses']
+        total = local_hits + redis_hits + misses
+        return {
+            "local": {
+                "hits": local_hits,
+                "hit_rate": round(local_hits / total * 100, 2) if total else 0.0,
+                **self.local.get_stats()
+            },
+            "redis": {
+                "hits": redis_hits,
+                "misses": misses,
+                "hit_rate": round(redis_hits / (redis_hits + misses) * 100, 2) if redis_hits + misses else 0.0
+            },
+            "overall_hit_rate": round((local_hits + redis_hits) / total * 100, 2) if total else 0.0
+        }
+    
+    # Cross-process invalidation
+    def _invalidation_message(self, keys: List[str] = None, pattern: str = None, flush: bool = False) -> str:
+        return json.dumps({'origin': self.instance_id, 'keys': keys or [], 'pattern': pattern, 'flush': flush})
+    
+    def _queue_invalidation(self, pipe, keys: List[str] = None, pattern: str = None, flush: bool = False):
+        """Add an invalidation broadcast to a pipeline so it costs no extra round trip"""
+        pipe.publish(self.INVALIDATION_CHANNEL, self._invalidation_message(keys, pattern, flush))
+    
+    def _publish_invalidation(self, keys: List[str] = None, pattern: str = None, flush: bool = False):
+        self.redis_client.publish(self.INVALIDATION_CHANNEL, self._invalidation_message(keys, pattern, flush))
+    
+    def _start_invalidation_listener(self):
+        if not self.local.enabled or (self._listener and self._listener.is_alive()):
+            return
+        self._listener = threading.Thread(target=self._listen_for_invalidations, daemon=True,
+                                          name="cache-invalidation-listener")
+        self._listener.start()
+    
+    def _listen_for_invalidations(self):
+        """Drop local entries that other workers changed; resubscribe with backoff on errors"""
+        backoff = 1
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                # Messages may have been missed while unsubscribed
+                self.local.clear()
+                backoff = 1
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self._apply_invalidation(message['data'])
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener error, retrying in {backoff}s: {str(e)}")
+                self.local.clear()
+                self._invalidation_seq += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+    
+    def _apply_invalidation(self, raw: bytes):
+        try:
+            message = json.loads(raw)
+        except (ValueError, TypeError):
+            return
+        if message.get('origin') == self.instance_id:
+            return
+        self._invalidation_seq += 1
+        if message.get('flush'):
+            self.local.clear()
+            return
+        if message.get('keys'):
+            self.local.delete(message['keys'])
+        if message.get('pattern'):
+            self.local.delete_pattern(message['pattern'])
+    
     def flush_all(self) -> bool:
         """Clear all cache (use with caution)"""
+        self.local.clear()
         if not self.is_available():
             return False
         
         try:
-            # Only flush keys with our prefix
-            keys = self.redis_client.keys(self._serialize_key("*"))
-            if keys:
-                self.redis_client.delete(*keys)
+            with self._operation('flush_all'):
+                self._publish_invalidation(flush=True)
+                # Only flush keys with our prefix
+                self._scan_delete(self._serialize_key("*"))
             return True
         except Exception as e:
             logger.error(f"Cache flush error: {str(e)}")
@@ -200,78 +605,370 @@ class CacheService:
 # Global cache service instance
 cache_service = CacheService()
 
-def cached(ttl: int = 300, key_prefix: str = ""):
+def _format_tags(tags: Optional[List[str]], func, args: tuple, kwargs: dict) -> List[str]:
+    """Fill tag templates such as "course:{course_id}" from the call's arguments"""
+    if not tags:
+        return []
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        values = bound.arguments
+    except TypeError:
+        values = kwargs
+    formatted = []
+    for tag in tags:
+        try:
+            formatted.append(tag.format(**values))
+        except (KeyError, IndexError, AttributeError):
+            logger.warning(f"Cache tag {tag} could not be formatted for {func.__name__}")
+    return formatted
+
+# Striped locks so concurrent misses for one key recompute once per process
+_KEY_LOCKS = [threading.Lock() for _ in range(64)]
+
+def _key_lock(cache_key: str) -> threading.Lock:
+    return _KEY_LOCKS[hash(cache_key) % len(_KEY_LOCKS)]
+
+def _make_cache_key(key_prefix: str, func, args: tuple, kwargs: dict) -> str:
+    """Content-hashed key, stable across processes; ignores self/cls and normalizes defaults"""
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+    except TypeError:
+        arguments = {'args': list(args), 'kwargs': kwargs}
+    params = list(inspect.signature(func).parameters)
+    if params and params[0] in ('self', 'cls'):
+        arguments.pop(params[0], None)
+    
+    payload = json.dumps(arguments, sort_keys=True, default=str, separators=(',', ':'))
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+    return f"{key_prefix}:{func.__module__}.{func.__qualname__}:{digest}"
+
+def _should_refresh_early(entry: Dict[str, Any], beta: float) -> bool:
+    """Probabilistic early expiration (XFetch): the closer to expiry and the slower the
+    recomputation, the more likely one caller refreshes before the key expires"""
+    if beta <= 0:
+        return False
+    delta = entry.get('delta', 0)
+    return time.time() - delta * beta * math.log(random.random() or 1e-12) >= entry['expires_at']
+
+def cached(ttl: int = 300, key_prefix: str = "", tags: Optional[List[str]] = None,
+           stale_ttl: int = 0, early_refresh_beta: float = 1.0, lock_timeout: float = 10,
+           fallback: Optional[Callable[..., Any]] = None):
     """
     Decorator for caching function results
     
     Args:
         ttl: Time to live in seconds
         key_prefix: Optional prefix for cache key
+        tags: Tag templates the entry is registered under, formatted from the
+            call's arguments (e.g. "course:{course_id}")
+        stale_ttl: Seconds an expired result may still be served while one caller
+            refreshes it in the background (stale-while-revalidate); 0 disables
+        early_refresh_beta: XFetch aggressiveness for refreshing before expiry; 0 disables
+        lock_timeout: Max seconds a recomputation holds the single-flight lock
+        fallback: Called with the function's arguments when it raises; its result
+            is returned but never cached (without one the exception propagates)
     """
     def decorator(func):
+        def _compute(cache_key: str, args: tuple, kwargs: dict) -> Any:
+            started = time.time()
+            result = func(*args, **kwargs)
+            now = time.time()
+            entry = {'value': result, 'delta': now - started, 'expires_at': now + ttl}
+            cache_service.set(cache_key, entry, ttl + stale_ttl, tags=_format_tags(tags, func, args, kwargs))
+            return result
+        
+        def _compute_or_fallback(cache_key: str, args: tuple, kwargs: dict, entry: Optional[Dict] = None) -> Any:
+            try:
+                return _compute(cache_key, args, kwargs)
+            except Exception as e:
+                if fallback is None:
+                    raise
+                logger.error(f"Error in {func.__name__}, serving a fallback that is not cached: {str(e)}")
+                return entry['value'] if entry else fallback(*args, **kwargs)
+        
+        def _refresh_in_background(cache_key: str, token: str, args: tuple, kwargs: dict):
+            def _run():
+                try:
+                    _compute(cache_key, args, kwargs)
+                except Exception as e:
+                    logger.warning(f"Background refresh of {func.__name__} failed: {str(e)}")
+                finally:
+                    cache_service.release_lock(cache_key, token)
+            threading.Thread(target=_run, daemon=True).start()
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Generate cache key from function name and arguments
-            cache_key = f"{key_prefix}:{func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
+            cache_key = _make_cache_key(key_prefix, func, args, kwargs)
             
             # Try to get from cache first
-            cached_result = cache_service.get(cache_key)
-            if cached_result is not None:
-                logger.debug(f"Cache hit for {func.__name__}")
-                return cached_result
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            cache_service.set(cache_key, result, ttl)
-            logger.debug(f"Cache miss for {func.__name__}, result cached")
+            entry = cache_service.get(cache_key)
+            if isinstance(entry, dict) and 'expires_at' in entry:
+                fresh = time.time() < entry['expires_at']
+                if fresh and not _should_refresh_early(entry, early_refresh_beta):
+                    logger.debug(f"Cache hit for {func.__name__}")
+                    return entry['value']
+                
+                # Early refresh or stale entry: one caller recomputes, everyone else gets the cached value
+                token = cache_service.acquire_lock(cache_key, lock_timeout)
+                if token is None:
+                    return entry['value']
+                if not fresh:
+                    logger.debug(f"Serving stale {func.__name__} while revalidating")
+                    _refresh_in_background(cache_key, token, args, kwargs)
+                    return entry['value']
+                try:
+                    return _compute_or_fallback(cache_key, args, kwargs, entry)
+                finally:
+                    cache_service.release_lock(cache_key, token)
             
-            return result
+            # Miss: single-flight within the process, then across workers
+            with _key_lock(cache_key):
+                entry = cache_service.get(cache_key)
+                if isinstance(entry, dict) and 'expires_at' in entry:
+                    return entry['value']
+                
+                token = cache_service.acquire_lock(cache_key, lock_timeout)
+                deadline = time.time() + lock_timeout
+                while token is None and time.time() < deadline:
+                    # Another worker is computing it; wait for its result
+                    time.sleep(0.05)
+                    entry = cache_service.get(cache_key)
+                    if isinstance(entry, dict) and 'expires_at' in entry:
+                        return entry['value']
+                    token = cache_service.acquire_lock(cache_key, lock_timeout)
+                
+                try:
+                    result = _compute_or_fallback(cache_key, args, kwargs)
+                    logger.debug(f"Cache miss for {func.__name__}, result cached")
+                    return result
+                finally:
+                    cache_service.release_lock(cache_key, token)
+
+        def refresh(*args, **kwargs):
+            """Recompute and store the result whatever is cached (used by the cache warmer)"""
+            return _compute(_make_cache_key(key_prefix, func, args, kwargs), args, kwargs)
+
+        wrapper.refresh = refresh
         return wrapper
     return decorator
 
-def cache_invalidate(pattern: str = "*"):
+def cache_invalidate(pattern: Optional[str] = None, tags: Optional[List[str]] = None):
     """
-    Decorator to invalidate cache patterns after function execution
+    Decorator to invalidate cache entries after function execution
+    
+    Args:
+        pattern: Key pattern deleted via SCAN (O(keyspace), prefer tags)
+        tags: Tag templates formatted from the call's arguments, invalidated atomically
     """
+    if pattern is None and not tags:
+        pattern = "*"
+    
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             result = func(*args, **kwargs)
-            cache_service.delete_pattern(pattern)
-            logger.debug(f"Cache invalidated for pattern: {pattern}")
+            if tags:
+                cache_service.invalidate_tags(*_format_tags(tags, func, args, kwargs))
+            if pattern:
+                cache_service.delete_pattern(pattern)
+            logger.debug(f"Cache invalidated for tags: {tags} pattern: {pattern}")
             return result
         return wrapper
     return decorator
 
-# Performance monitoring decorator
+# Performance monitoring: per-process histograms flushed to Redis hour buckets
+class PerformanceMonitor:
+    """Aggregates decorated-function latencies locally and flushes them with HINCRBY.
+    
+    Each (function, hour) is a Redis hash of histogram bucket -> count plus count,
+    total_us and errors fields, so flushes from every worker merge atomically.
+    """
+    
+    KEY_PREFIX = "perf"
+    
+    def __init__(self, cache: CacheService):
+        self.cache = cache
+        self.flush_interval = float(os.getenv('PERF_FLUSH_INTERVAL', 10))
+        self.retention_hours = int(os.getenv('PERF_RETENTION_HOURS', 168))
+        self._histograms: Dict[tuple, LatencyHistogram] = {}
+        self._errors: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+    
+    def record(self, function: str, seconds: float, failed: bool = False):
+        """Record one call in the current hour bucket (no I/O)"""
+        key = (function, datetime.now().strftime('%Y-%m-%d:%H'))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram())
+        histogram.record(seconds * 1000)
+        if failed:
+            with self._lock:
+                self._errors[key] = self._errors.get(key, 0) + 1
+        self._ensure_flusher()
+    
+    def _hash_key(self, function: str, hour: str) -> str:
+        return f"{self.KEY_PREFIX}:{hour}:{function}"
+    
+    def _index_key(self, hour: str) -> str:
+        return f"{self.KEY_PREFIX}:{hour}:functions"
+    
+    def flush(self) -> bool:
+        """Push accumulated counts to Redis in one pipeline; data is kept locally if Redis is down"""
+        if not self.cache.is_available():
+            return False
+        current_hour = datetime.now().strftime('%Y-%m-%d:%H')
+        with self._lock:
+            histograms = list(self._histograms.items())
+            errors, self._errors = self._errors, {}
+            # Past hours receive no new samples once drained
+            for key, _ in histograms:
+                if key[1] != current_hour:
+                    del self._histograms[key]
+        if not histograms:
+            return True
+        
+        # drain() is atomic per histogram, so concurrent record() calls are never lost
+        drained = {key: histogram.drain() for key, histogram in histograms}
+        try:
+            ttl = self.retention_hours * 3600
+            pipe = self.cache.redis_client.pipeline(transaction=False)
+            for (function, hour), data in drained.items():
+                if not data['count']:
+                    continue
+                hash_key = self.cache._serialize_key(self._hash_key(function, hour))
+                index_key = self.cache._serialize_key(self._index_key(hour))
+                for bucket, count in data['counts'].items():
+                    pipe.hincrby(hash_key, str(bucket), count)
+                pipe.hincrby(hash_key, 'count', data['count'])
+                pipe.hincrby(hash_key, 'total_us', int(data['total_ms'] * 1000))
+                if errors.get((function, hour)):
+                    pipe.hincrby(hash_key, 'errors', errors[(function, hour)])
+                pipe.expire(hash_key, ttl)
+                pipe.sadd(index_key, function)
+                pipe.expire(index_key, ttl)
+            with self.cache._operation('perf_flush'):
+                pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Performance metrics flush failed, keeping them for the next flush: {str(e)}")
+            with self._lock:
+                for key, data in drained.items():
+                    self._histograms.setdefault(key, LatencyHistogram()).merge_counts(
+                        data['counts'], data['total_ms'], data['max_ms'])
+                for key, count in errors.items():
+                    self._errors[key] = self._errors.get(key, 0) + count
+            return False
+    
+    def get_report(self, hours: int = 24, function: str = None) -> Dict[str, Any]:
+        """
+        Merged view across all workers: p50/p95/p99 per function per hour bucket
+        
+        Args:
+            hours: Number of hour buckets to read, newest first
+            function: Only report this function
+        """
+        self.flush()
+        now = datetime.now()
+        hour_buckets = [(now - timedelta(hours=h)).strftime('%Y-%m-%d:%H') for h in range(hours)]
+        report = {'generated_at': now.isoformat(), 'hours': hours, 'functions': {}}
+        if not self.cache.is_available():
+            report['status'] = 'unavailable'
+            return report
+        
+        try:
+            pipe = self.cache.redis_client.pipeline(transaction=False)
+            for hour in hour_buckets:
+                pipe.smembers(self.cache._serialize_key(self._index_key(hour)))
+            with self.cache._operation('perf_read'):
+                indexes = pipe.execute()
+            
+            targets = []
+            pipe = self.cache.redis_client.pipeline(transaction=False)
+            for hour, members in zip(hour_buckets, indexes):
+                for name in sorted(m.decode('utf-8') if isinstance(m, bytes) else m for m in members or []):
+                    if function and name != function:
+                        continue
+                    targets.append((name, hour))
+                    pipe.hgetall(self.cache._serialize_key(self._hash_key(name, hour)))
+            with self.cache._operation('perf_read'):
+                hashes = pipe.execute() if targets else []
+        except Exception as e:
+            logger.error(f"Performance report error: {str(e)}")
+            report['status'] = 'error'
+            return report
+        
+        totals: Dict[str, LatencyHistogram] = {}
+        total_errors: Dict[str, int] = {}
+        for (name, hour), fields in zip(targets, hashes):
+            fields = {(k.decode('utf-8') if isinstance(k, bytes) else k): int(v) for k, v in (fields or {}).items()}
+            # The bucket counts already sum to the call count
+            fields.pop('count', None)
+            total_us = fields.pop('total_us', 0)
+            errors = fields.pop('errors', 0)
+            histogram = LatencyHistogram()
+            histogram.merge_counts({int(bucket): n for bucket, n in fields.items()}, total_us / 1000.0)
+            totals.setdefault(name, LatencyHistogram()).merge(histogram)
+            total_errors[name] = total_errors.get(name, 0) + errors
+            
+            entry = report['functions'].setdefault(name, {'hours': {}})
+            entry['hours'][hour] = self._summarize(histogram, errors)
+        
+        for name, histogram in totals.items():
+            report['functions'][name]['overall'] = self._summarize(histogram, total_errors[name])
+        report['status'] = 'active'
+        return report
+    
+    def _summarize(self, histogram: LatencyHistogram, errors: int) -> Dict[str, Any]:
+        percentiles = histogram.percentiles((50, 95, 99))
+        mean = histogram.mean()
+        return {
+            'count': histogram.count,
+            'errors': errors,
+            'avg_ms': round(mean, 2) if mean is not None else None,
+            **{f"{k}_ms": round(v, 2) if v is not None else None for k, v in percentiles.items()}
+        }
+    
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name='perf-metrics-flusher')
+                self._flusher.start()
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+# Global performance monitor instance
+performance_monitor = PerformanceMonitor(cache_service)
+
 def monitor_performance(func):
-    """Monitor function performance and cache metrics"""
+    """Monitor function performance (recorded in-process, flushed to Redis in the background)"""
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
         try:
             result = func(*args, **kwargs)
-            execution_time = (datetime.now() - start_time).total_seconds()
+            execution_time = time.perf_counter() - start_time
             
             # Log performance metrics
             logger.debug(f"{func.__name__} executed in {execution_time:.3f}s")
-            
-            # Store performance metrics in cache
-            perf_key = f"performance:{func.__name__}:{datetime.now().strftime('%Y-%m-%d:%H')}"
-            current_stats = cache_service.get(perf_key) or {"count": 0, "total_time": 0, "avg_time": 0}
-            
-            current_stats["count"] += 1
-            current_stats["total_time"] += execution_time
-            current_stats["avg_time"] = current_stats["total_time"] / current_stats["count"]
-            
-            cache_service.set(perf_key, current_stats, 3600)  # 1 hour TTL
+            performance_monitor.record(func.__name__, execution_time)
             
             return result
             
         except Exception as e:
-            execution_time = (datetime.now() - start_time).total_seconds()
+            execution_time = time.perf_counter() - start_time
             logger.error(f"{func.__name__} failed after {execution_time:.3f}s: {str(e)}")
+            performance_monitor.record(func.__name__, execution_time, failed=True)
             raise
             
     return wrapper
@@ -0,0 +1,178 @@
+"""
+Cache Warmer for AI Tutor Platform
+Registry of hot read paths that are pre-populated into the cache tiers on startup
+(and optionally on a schedule) by a single elected worker, with a coverage report
+"""
+
+import inspect
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupSpec:
+    """One cache entry to pre-populate: a loader and the arguments requests call it with"""
+
+    def __init__(self, name: str, loader: Callable, args: tuple = (), kwargs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.loader = loader
+        self.args = args
+        self.kwargs = kwargs or {}
+
+    def run(self) -> Any:
+        """Recompute the entry, bypassing whatever is cached"""
+        refresh = getattr(self.loader, 'refresh', None)
+        if refresh is None:
+            # Not @cached: calling it still fills whatever it caches internally
+            return self.loader(*self.args, **self.kwargs)
+        if inspect.ismethod(self.loader):
+            # The refresh hook lives on the plain function, so pass the instance explicitly
+            refresh = partial(refresh, self.loader.__self__)
+        return refresh(*self.args, **self.kwargs)
+
+
+class CacheWarmer:
+    """Runs registered warm-up specs with bounded concurrency on one worker at a time"""
+
+    LEADER_LOCK = 'cache_warmup:leader'
+
+    def __init__(self):
+        self.enabled = os.getenv('CACHE_WARMUP_ENABLED', 'true').lower() == 'true'
+        self.concurrency = max(1, int(os.getenv('CACHE_WARMUP_CONCURRENCY', 4)))
+        self.timeout = float(os.getenv('CACHE_WARMUP_TIMEOUT', 120))
+        # Seconds between periodic re-warms; 0 warms once at startup only
+        self.interval = int(os.getenv('CACHE_WARMUP_INTERVAL', 0))
+        # The leader lock is never released, so it also spaces out warm-ups across workers
+        self.leader_ttl = self.interval or int(os.getenv('CACHE_WARMUP_LEADER_TTL', 60))
+
+        self._specs: Dict[str, WarmupSpec] = {}
+        self._specs_lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    def register(self, name: str, loader: Callable, *args, **kwargs) -> WarmupSpec:
+        """
+        Register a hot read path
+
+        Args:
+            name: Unique spec name shown in the report
+            loader: Function to warm, ideally decorated with @cached
+            *args, **kwargs: Arguments the hot requests call it with
+        """
+        spec = WarmupSpec(name, loader, args, kwargs)
+        with self._specs_lock:
+            self._specs[name] = spec
+        return spec
+
+    def get_specs(self) -> List[str]:
+        with self._specs_lock:
+            return list(self._specs)
+
+    def warm(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Run every registered spec once
+
+        Args:
+            force: Skip leader election (manual trigger from the admin API)
+
+        Returns:
+            Report with duration, coverage and per-spec outcome
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return {'status': 'running', 'message': 'A warm-up is already in progress on this worker'}
+        try:
+            if not force and cache_service.acquire_lock(self.LEADER_LOCK, self.leader_ttl) is None:
+                logger.info("Cache warm-up skipped, another worker is the leader")
+                return {'status': 'skipped', 'message': 'Another worker warmed the cache recently'}
+
+            report = self._run_specs()
+            self.last_report = report
+            logger.info(f"Cache warm-up finished: {report['warmed']}/{report['total']} entries "
+                        f"in {report['duration_ms']:.0f}ms")
+            return report
+        finally:
+            self._run_lock.release()
+
+    def start(self):
+        """Warm in the background after startup, then every interval if one is configured"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='cache-warmer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'concurrency': self.concurrency,
+            'interval_seconds': self.interval,
+            'registered': self.get_specs(),
+            'last_report': self.last_report
+        }
+
+    # Internal helpers
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.warm()
+            except Exception as e:
+                logger.error(f"Cache warm-up error: {str(e)}")
+            if not self.interval:
+                return
+            self._stop.wait(self.interval)
+
+    def _run_specs(self) -> Dict[str, Any]:
+        with self._specs_lock:
+            specs = list(self._specs.values())
+
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        entries: Dict[str, Dict[str, Any]] = {spec.name: {'status': 'timed_out'} for spec in specs}
+
+        def _warm(spec: WarmupSpec):
+            spec_started = time.perf_counter()
+            try:
+                spec.run()
+                entries[spec.name] = {'status': 'warmed'}
+            except Exception as e:
+                logger.warning(f"Cache warm-up of {spec.name} failed: {str(e)}")
+                entries[spec.name] = {'status': 'failed', 'error': str(e)}
+            entries[spec.name]['duration_ms'] = round((time.perf_counter() - spec_started) * 1000, 1)
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='cache-warmup')
+        try:
+            wait([executor.submit(_warm, spec) for spec in specs], timeout=self.timeout)
+        finally:
+            # Do not block on loaders that overran the budget; they finish in the background
+            executor.shutdown(wait=False)
+
+        entries = dict(entries)
+        counts = {status: sum(1 for e in entries.values() if e['status'] == status)
+                  for status in ('warmed', 'failed', 'timed_out')}
+        return {
+            'status': 'completed',
+            'started_at': started_at.isoformat(),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'total': len(specs),
+            **counts,
+            'coverage': round(counts['warmed'] / len(specs) * 100, 1) if specs else 100.0,
+            'entries': entries
+        }
+
+
+# Global cache warmer instance
+cache_warmer = CacheWarmer()
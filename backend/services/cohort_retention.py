@@ -0,0 +1,189 @@
+"""
+Cohort Retention Engine for AI Tutor Platform
+Weekly signup cohorts from users.created_at against weekly activity from user_interactions,
+counted with NumPy boolean masks; each closed week is computed once and cached
+"""
+
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from services.database import db_service
+from services.cache_service import cache_service
+from services.cache_warmer import cache_warmer
+
+logger = logging.getLogger(__name__)
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+class CohortRetentionEngine:
+    """Retention matrix over the last N closed weeks.
+
+    A closed week's entry holds its signup count and, per cohort, how many of that
+    cohort's users were active in it. Neither changes once the week is over, so a new
+    week only adds one entry; the matrix is assembled from the cached entries.
+    """
+
+    PAGE_SIZE = 1000
+    # Widest matrix; a week's entry counts the cohorts of up to this many weeks before it
+    MAX_WEEKS = 52
+    KEY_PREFIX = 'cohort_retention:week'
+    # Closed weeks do not change; keep them well past the widest matrix
+    WEEK_TTL = 400 * 86400
+
+    def __init__(self):
+        self.db = db_service
+        self.cache = cache_service
+        self._local: Dict[str, Dict[str, Any]] = {}
+        self._build_lock = threading.Lock()
+
+    def get_matrix(self, weeks: int = 12, end: date = None) -> Dict[str, Any]:
+        """
+        Args:
+            weeks: Number of closed weeks (and so cohorts) to cover
+            end: Any day of the first week NOT included (default: the current week)
+
+        Returns:
+            {'weeks': [...], 'cohorts': [{'cohort', 'size', 'retention': [% per week since signup]}],
+             'average_retention': [% per week since signup, weighted by cohort size]}
+        """
+        last = _week_start(end or datetime.utcnow().date()) - timedelta(days=7)
+        weeks = min(max(weeks, 1), self.MAX_WEEKS)
+        week_starts = [last - timedelta(days=7 * i) for i in reversed(range(weeks))]
+        entries = self._load_weeks(week_starts)
+        n = len(week_starts)
+
+        # active[w, c]: users of cohort c active in week w (cohorts are the same weeks)
+        sizes = np.array([entries[week]['signups'] for week in week_starts], dtype=float)
+        active = np.array([[entries[week]['active'].get(cohort.isoformat(), 0) for cohort in week_starts]
+                           for week in week_starts], dtype=float)
+
+        # retention[c, k] = active[c + k, c] / size[c], for weeks that have closed
+        cohort_index, offset = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+        week_index = cohort_index + offset
+        observed = week_index < n
+        counts = np.where(observed, active[np.minimum(week_index, n - 1), cohort_index], np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            retention = counts / sizes[:, None] * 100
+            weighted = np.where(observed & (sizes[:, None] > 0), counts, 0).sum(axis=0)
+            exposed = np.where(observed, sizes[:, None], 0).sum(axis=0)
+            average = weighted / exposed * 100
+
+        return {
+            'weeks': [week.isoformat() for week in week_starts],
+            'cohorts': [{
+                'cohort': week.isoformat(),
+                'size': int(sizes[c]),
+                'retention': [None if np.isnan(value) else round(float(value), 1)
+                              for value in retention[c, :n - c]]
+            } for c, week in enumerate(week_starts)],
+            'average_retention': [None if np.isnan(value) else round(float(value), 1) for value in average]
+        }
+
+    # Internal helpers
+    def _week_key(self, week: date) -> str:
+        return f"{self.KEY_PREFIX}:{week.isoformat()}"
+
+    def _load_weeks(self, week_starts: List[date]) -> Dict[date, Dict[str, Any]]:
+        entries = {}
+        for week in week_starts:
+            entry = self.cache.get(self._week_key(week)) or self._local.get(self._week_key(week))
+            if entry is not None:
+                entries[week] = entry
+        missing = [week for week in week_starts if week not in entries]
+        if missing:
+            with self._build_lock:
+                entries.update(self._build_weeks(missing))
+        return entries
+
+    def _build_weeks(self, weeks: List[date]) -> Dict[date, Dict[str, Any]]:
+        """Compute the missing closed weeks against one roster of the cohorts' users"""
+        first, last = min(weeks), max(weeks)
+        # Entries also count older cohorts, so the roster reaches MAX_WEEKS before the first week
+        user_ids, cohort_days = self._load_roster(first - timedelta(days=7 * (self.MAX_WEEKS - 1)),
+                                                  last + timedelta(days=7))
+        order = np.argsort(user_ids)
+        user_ids, cohort_days = user_ids[order], cohort_days[order]
+        cohort_weeks = cohort_days - cohort_days % 7  # days since the Monday epoch, floored to the week
+        epoch = date(1970, 1, 5)  # a Monday
+
+        entries = {}
+        for week in sorted(weeks):
+            active = np.zeros(len(user_ids), dtype=bool)
+            ids = self._load_active_ids(week, week + timedelta(days=7))
+            if len(ids) and len(user_ids):
+                positions = np.searchsorted(user_ids, ids).clip(max=len(user_ids) - 1)
+                active[positions[user_ids[positions] == ids]] = True
+
+            week_day = (week - epoch).days
+            in_cohort = active & (cohort_weeks <= week_day)
+            cohorts, counts = np.unique(cohort_weeks[in_cohort], return_counts=True)
+            entry = {
+                'signups': int(np.count_nonzero(cohort_weeks == week_day)),
+                'active': {(epoch + timedelta(days=int(c))).isoformat(): int(n) for c, n in zip(cohorts, counts)},
+                'computed_at': datetime.utcnow().isoformat()
+            }
+            entries[week] = entry
+            self._local[self._week_key(week)] = entry
+            self.cache.set(self._week_key(week), entry, ttl=self.WEEK_TTL, tags=['cohort_retention'])
+            logger.info(f"Cohort retention week {week.isoformat()} computed "
+                        f"({entry['signups']} signups, {int(active.sum())} active)")
+        return entries
+
+    def _load_roster(self, start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+        """(user ids, signup day counted from the Monday epoch) for signups in [start, end)"""
+        ids, days = [], []
+        epoch = date(1970, 1, 5)
+        offset = 0
+        while True:
+            rows = (self.db.client.table('users').select('id, created_at')
+                    .gte('created_at', start.isoformat()).lt('created_at', end.isoformat())
+                    .order('created_at').range(offset, offset + self.PAGE_SIZE - 1)
+                    .execute().data or [])
+            for row in rows:
+                if row.get('created_at'):
+                    ids.append(str(row['id']))
+                    days.append((date.fromisoformat(row['created_at'][:10]) - epoch).days)
+            if len(rows) < self.PAGE_SIZE:
+                break
+            offset += self.PAGE_SIZE
+        return np.array(ids, dtype=object), np.array(days, dtype=np.int64)
+
+    def _load_active_ids(self, start: date, end: date) -> np.ndarray:
+        """Distinct users with an interaction in [start, end), sorted"""
+        ids = set()
+        try:
+            offset = 0
+            while True:
+                rows = (self.db.client.rpc('active_user_ids', {'p_start': start.isoformat(), 'p_end': end.isoformat()})
+                        .order('user_id').range(offset, offset + self.PAGE_SIZE - 1).execute().data or [])
+                ids.update(str(row['user_id']) for row in rows)
+                if len(rows) < self.PAGE_SIZE:
+                    break
+                offset += self.PAGE_SIZE
+        except Exception as e:
+            logger.warning(f"active_user_ids() unavailable, scanning interactions: {str(e)}")
+            offset = 0
+            while True:
+                rows = (self.db.client.table('user_interactions').select('user_id')
+                        .gte('timestamp', start.isoformat()).lt('timestamp', end.isoformat())
+                        .order('timestamp').range(offset, offset + self.PAGE_SIZE - 1)
+                        .execute().data or [])
+                ids.update(str(row['user_id']) for row in rows if row.get('user_id'))
+                if len(rows) < self.PAGE_SIZE:
+                    break
+                offset += self.PAGE_SIZE
+        return np.array(sorted(ids), dtype=object)
+
+
+# Global cohort retention engine instance
+cohort_retention = CohortRetentionEngine()
+
+# Computes the weeks that closed since the last run, so requests only assemble the matrix
+cache_warmer.register('cohort_retention', cohort_retention.get_matrix)
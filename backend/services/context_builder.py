@@ -0,0 +1,226 @@
+"""
+Conversation Context Builder for AI Tutor Platform
+Keeps chat prompts inside a token budget with a sliding window of recent turns
+and a rolling, per-session summary of older turns
+"""
+
+import hashlib
+import logging
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from config import get_config
+from services.cache_service import cache_service
+
+try:
+    import tiktoken
+except ImportError:  # Optional dependency, fall back to the heuristic estimator
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Tokens the chat format spends on role markers and separators per message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenEstimator:
+    """Local token counter (tiktoken when installed, regex heuristic otherwise)"""
+
+    _PIECE_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:
+                logger.warning(f"tiktoken encoding unavailable, using heuristic estimator: {str(e)}")
+
+    def count(self, text: str) -> int:
+        """Estimate the number of tokens in a piece of text"""
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+
+        # BPE vocabularies keep short words whole and split long ones roughly every 4 characters
+        return sum(max(1, (len(piece) + 3) // 4) for piece in self._PIECE_PATTERN.findall(text))
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        """Estimate the tokens one chat message costs in a prompt"""
+        return self.count(message.get('content') or '') + MESSAGE_OVERHEAD_TOKENS
+
+    def count_messages(self, messages: List[Dict[str, Any]]) -> int:
+        """Estimate the tokens a list of chat messages costs in a prompt"""
+        return sum(self.count_message(m) for m in messages)
+
+
+class ConversationContextBuilder:
+    """Builds bounded prompts: system prompt + rolling summary + most recent turns"""
+
+    def __init__(self):
+        self.config = get_config()
+        self.cache = cache_service
+        self.estimator = TokenEstimator()
+        self.max_tokens = self.config.AI_CONTEXT_MAX_TOKENS
+        self.summary_max_tokens = self.config.AI_SUMMARY_MAX_TOKENS
+        self.summary_ttl = self.config.AI_SUMMARY_TTL
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def build(self, system_message: Dict[str, str], messages: List[Dict[str, Any]],
+              session_id: str = None, summarizer: Callable[[str, List[Dict[str, str]]], str] = None) -> List[Dict[str, str]]:
+        """
+        Build the prompt for a completion within the configured token budget
+
+        Args:
+            system_message: The system prompt message
+            messages: Full conversation so far, oldest first (the last item is the new user turn)
+            session_id: Chat session ID used to cache the rolling summary
+            summarizer: Callable(previous_summary, messages) -> summary, run in the background
+
+        Returns:
+            List of messages ready to send to the model
+        """
+        stored = [m for m in messages if m.get('content')]
+        conversation = [self._normalize(m) for m in stored]
+        budget = self.max_tokens - self.estimator.count_message(system_message)
+
+        if self.estimator.count_messages(conversation) <= budget:
+            return [system_message] + conversation
+
+        # Reserve room for the summary, then keep as many recent turns as fit
+        window_budget = budget - self.summary_max_tokens - MESSAGE_OVERHEAD_TOKENS
+        window = self._recent_window(conversation, window_budget)
+        older = conversation[:len(conversation) - len(window)]
+
+        markers = [self._marker(m) for m in stored[:len(older)]]
+        summary = self._get_summary(session_id, older, markers, summarizer)
+        context = [system_message]
+        if summary:
+            context.append({
+                'role': 'system',
+                'content': f"Summary of the earlier conversation with this student:\n{summary}"
+            })
+        context.extend(window)
+
+        logger.debug(f"Context built for session {session_id}: {len(older)} turns summarized, "
+                     f"{len(window)} kept, ~{self.estimator.count_messages(context)} tokens")
+        return context
+
+    def _normalize(self, message: Dict[str, Any]) -> Dict[str, str]:
+        """Strip stored message rows down to the fields the model accepts"""
+        return {'role': message.get('role', 'user'), 'content': message.get('content', '')}
+
+    def _recent_window(self, conversation: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+        """Select the longest suffix of the conversation that fits the budget (always the last turn)"""
+        window = []
+        used = 0
+        for message in reversed(conversation):
+            cost = self.estimator.count_message(message)
+            if window and used + cost > budget:
+                break
+            window.append(message)
+            used += cost
+        window.reverse()
+        return window
+
+    def _summary_key(self, session_id: str) -> str:
+        return f"chat_summary:{session_id}"
+
+    def _marker(self, message: Dict[str, Any]) -> Dict[str, str]:
+        """Identify a turn independently of its position in the (bounded, sliding) history"""
+        if message.get('id'):
+            return {'at': str(message.get('created_at') or ''), 'id': str(message['id'])}
+        # Client-supplied turns carry no row id, fall back to a fingerprint of the content
+        digest = hashlib.sha1(f"{message.get('role')}:{message.get('content')}".encode('utf-8')).hexdigest()
+        return {'at': str(message.get('created_at') or ''), 'id': digest}
+
+    def _covered_count(self, markers: List[Dict[str, str]], last: Optional[Dict[str, str]]) -> int:
+        """How many of the older turns the summary ending at `last` already covers"""
+        if not last:
+            return 0
+        for i in range(len(markers) - 1, -1, -1):
+            marker = markers[i]
+            if marker == last or (marker['at'] and last.get('at') and marker['at'] <= last['at']):
+                return i + 1
+        # Every turn still in the history is newer than the summary
+        return 0
+
+    def _get_summary(self, session_id: Optional[str], older: List[Dict[str, str]],
+                     markers: List[Dict[str, str]], summarizer: Optional[Callable]) -> str:
+        """Return the best available summary of the older turns, refreshing it in the background"""
+        if not older:
+            return ''
+
+        if not session_id or summarizer is None or not self.cache.is_available():
+            return self._extractive_summary(older)
+
+        cached = self.cache.get(self._summary_key(session_id)) or {}
+        summary = cached.get('summary', '')
+        covered = self._covered_count(markers, cached.get('last'))
+
+        if covered < len(older):
+            self._schedule_refresh(session_id, summary, older[covered:], markers[-1], summarizer)
+
+        if not summary:
+            # First overflow for this session: answer now with a cheap summary instead of waiting
+            return self._extractive_summary(older)
+        if covered < len(older):
+            # Cover the turns the cached summary has not caught up with yet
+            gap = self._extractive_summary(older[covered:])
+            return self._truncate(f"{summary}\n{gap}", self.summary_max_tokens)
+        return summary
+
+    def _schedule_refresh(self, session_id: str, previous_summary: str, new_turns: List[Dict[str, str]],
+                          last: Dict[str, str], summarizer: Callable):
+        """Fold new turns into the rolling summary on a background thread (one refresh per session)"""
+        with self._lock:
+            if session_id in self._refreshing:
+                return
+            self._refreshing.add(session_id)
+
+        def _refresh():
+            try:
+                summary = summarizer(previous_summary, new_turns)
+                if summary:
+                    summary = self._truncate(summary.strip(), self.summary_max_tokens)
+                    self.cache.set(self._summary_key(session_id),
+                                   {'summary': summary, 'last': last},
+                                   self.summary_ttl)
+                    logger.debug(f"Rolling summary refreshed for session {session_id} "
+                                 f"(through {last['at'] or last['id']}, {len(new_turns)} new turns)")
+            except Exception as e:
+                logger.warning(f"Rolling summary refresh failed for session {session_id}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(session_id)
+
+        threading.Thread(target=_refresh, daemon=True).start()
+
+    def _extractive_summary(self, turns: List[Dict[str, str]]) -> str:
+        """Cheap local summary: the opening sentence of each student question"""
+        points = []
+        for turn in turns:
+            if turn['role'] != 'user':
+                continue
+            first_sentence = re.split(r'(?<=[.!?])\s', turn['content'].strip(), maxsplit=1)[0]
+            points.append(f"- Student asked: {first_sentence[:200]}")
+        return self._truncate("\n".join(points), self.summary_max_tokens)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Trim text from the front so the most recent points survive"""
+        if self.estimator.count(text) <= max_tokens:
+            return text
+        lines = text.splitlines()
+        while len(lines) > 1 and self.estimator.count("\n".join(lines)) > max_tokens:
+            lines.pop(0)
+        text = "\n".join(lines)
+        while text and self.estimator.count(text) > max_tokens:
+            text = text[len(text) // 4:]
+        return text
+
+
+# Global context builder instance
+context_builder = ConversationContextBuilder()
@@ -0,0 +1,449 @@
+"""
+Data Export Service for AI Tutor Platform
+Streams gradebook, submission, activity and interaction exports as CSV chunks or
+Parquet row groups, one keyset page at a time, so memory stays flat for any size
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.database import db_service
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency, CSV exports work without it
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'parquet')
+MIMETYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+# Same scale as the JSON gradebook, highest first
+GRADEBOOK_LETTERS = (
+    (97, 'A+'), (93, 'A'), (90, 'A-'), (87, 'B+'), (83, 'B'), (80, 'B-'),
+    (77, 'C+'), (73, 'C'), (70, 'C-'), (67, 'D+'), (65, 'D')
+)
+
+SUBMISSION_COLUMNS = [
+    ('submission_id', 'string'), ('assignment_id', 'string'), ('assignment_title', 'string'),
+    ('student_id', 'string'), ('student_name', 'string'), ('student_email', 'string'),
+    ('status', 'string'), ('attempt_number', 'int'), ('submitted_at', 'timestamp'),
+    ('is_late', 'bool'), ('late_minutes', 'int'), ('points_earned', 'float'), ('max_points', 'float'),
+    ('percentage', 'float'), ('letter_grade', 'string'), ('graded_at', 'timestamp')
+]
+ACTIVITY_COLUMNS = [
+    ('activity_id', 'string'), ('activity_type', 'string'), ('student_id', 'string'),
+    ('student_name', 'string'), ('student_email', 'string'), ('timestamp', 'timestamp'),
+    ('course_id', 'string'), ('resource_id', 'string'), ('resource_title', 'string'),
+    ('status', 'string'), ('grade', 'float'), ('duration_minutes', 'int')
+]
+INTERACTION_COLUMNS = [
+    ('id', 'string'), ('user_id', 'string'), ('action_type', 'string'), ('resource_type', 'string'),
+    ('resource_id', 'string'), ('session_id', 'string'), ('timestamp', 'timestamp'),
+    ('duration_seconds', 'int'), ('metadata', 'string'), ('user_agent', 'string')
+]
+
+# Activity sources in export order; an activity id is "<prefix>_<source row id>"
+ACTIVITY_SOURCES = ('submission', 'enrollment', 'lesson')
+
+
+class ExportError(ValueError):
+    """Invalid export request (unknown format, bad resume key, missing dependency)"""
+
+
+class _ChunkSink:
+    """Write-only file object that hands what the Parquet writer wrote back to the stream"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+class DataExporter:
+    """Keyset-paged exports.
+
+    Every dataset is read in primary key order, so a page is fetched with
+    "id > last id" and never re-scans earlier rows. Each exported row carries its
+    key in the dataset's resume column; passing the last received value as
+    `after` continues an interrupted download with the next row.
+    """
+
+    def __init__(self):
+        self.db = db_service
+        self.page_size = int(os.getenv('EXPORT_PAGE_SIZE', 1000))
+        # Students per gradebook page; their ids go into one submissions filter
+        self.gradebook_page_size = int(os.getenv('EXPORT_GRADEBOOK_PAGE_SIZE', 200))
+
+    @staticmethod
+    def check_format(export_format: str) -> str:
+        if export_format not in FORMATS:
+            raise ExportError(f"Unsupported export format '{export_format}', expected one of {', '.join(FORMATS)}")
+        if export_format == 'parquet' and pa is None:
+            raise ExportError('Parquet exports require pyarrow, which is not installed')
+        return export_format
+
+    def assignment_course(self, assignment_id: str) -> Optional[str]:
+        """Course an assignment belongs to, for access checks"""
+        rows = (self.db.client.table('assignments').select('course_id')
+                .eq('id', assignment_id).limit(1).execute().data or [])
+        return rows[0]['course_id'] if rows else None
+
+    # Datasets: each returns (columns, resume column, page iterator)
+    def gradebook(self, course_id: str, after: str = None) -> Tuple[List[Tuple[str, str]], str, Iterator[List[Dict]]]:
+        """One row per enrolled student: latest graded points per assignment, totals and letter grade"""
+        assignments = self._course_assignments(course_id, 'id, title, max_points')
+        fixed = ('enrollment_id', 'student_id', 'student_name', 'student_email',
+                 'total_points', 'possible_points', 'percentage', 'letter_grade')
+        headers, seen = [], set(fixed)
+        for assignment in assignments:
+            header = assignment.get('title') or assignment['id']
+            if header in seen:
+                header = f"{header} ({assignment['id'][:8]})"
+            seen.add(header)
+            headers.append(header)
+
+        columns = ([(name, 'string') for name in fixed[:4]]
+                   + [(header, 'float') for header in headers]
+                   + [(name, 'float') for name in fixed[4:7]] + [('letter_grade', 'string')])
+        possible = sum(float(a.get('max_points') or 100) for a in assignments)
+
+        def pages():
+            for enrollments in self._keyset_pages(
+                    lambda: (self.db.client.table('course_enrollments')
+                             .select('id, student_id, student:users!course_enrollments_student_id_fkey'
+                                     '(name, first_name, last_name, email)')
+                             .eq('course_id', course_id)),
+                    after, self.gradebook_page_size):
+                latest = self._latest_points([e['student_id'] for e in enrollments],
+                                             [a['id'] for a in assignments])
+                rows = []
+                for enrollment in enrollments:
+                    student = _embedded(enrollment.get('student'))
+                    earned = [latest.get((enrollment['student_id'], a['id'])) for a in assignments]
+                    total = sum(points or 0 for points in earned)
+                    percentage = round(total / possible * 100, 1) if possible else 0
+                    row = {
+                        'enrollment_id': enrollment['id'],
+                        'student_id': enrollment['student_id'],
+                        'student_name': _student_name(student),
+                        'student_email': student.get('email', ''),
+                        'total_points': total,
+                        'possible_points': possible,
+                        'percentage': percentage,
+                        'letter_grade': _letter_grade(percentage) if possible else ''
+                    }
+                    row.update(zip(headers, earned))
+                    rows.append(row)
+                yield rows
+
+        return columns, 'enrollment_id', pages()
+
+    def submissions(self, course_id: str = None, assignment_id: str = None,
+                    after: str = None) -> Tuple[List[Tuple[str, str]], str, Iterator[List[Dict]]]:
+        """Submission listings with their grades, without submission content"""
+        if assignment_id:
+            assignment_ids = [assignment_id]
+        elif course_id:
+            assignment_ids = [a['id'] for a in self._course_assignments(course_id, 'id')]
+        else:
+            raise ExportError('course_id or assignment_id is required')
+
+        def query():
+            return (self.db.client.table('assignment_submissions')
+                    .select('id, assignment_id, student_id, status, attempt_number, submitted_at, is_late, '
+                            'late_minutes, student:users!assignment_submissions_student_id_fkey(name, email), '
+                            'assignment:assignments!assignment_submissions_assignment_id_fkey(title, max_points), '
+                            'grade:assignment_grades(points_earned, percentage, letter_grade, graded_at)')
+                    .in_('assignment_id', assignment_ids))
+
+        def pages():
+            if not assignment_ids:
+                return
+            for submissions in self._keyset_pages(query, after, self.page_size):
+                rows = []
+                for submission in submissions:
+                    student = _embedded(submission.get('student'))
+                    assignment = _embedded(submission.get('assignment'))
+                    grade = _embedded(submission.get('grade'))
+                    rows.append({
+                        'submission_id': submission['id'],
+                        'assignment_id': submission['assignment_id'],
+                        'assignment_title': assignment.get('title'),
+                        'student_id': submission['student_id'],
+                        'student_name': student.get('name'),
+                        'student_email': student.get('email'),
+                        'status': submission.get('status'),
+                        'attempt_number': submission.get('attempt_number'),
+                        'submitted_at': submission.get('submitted_at'),
+                        'is_late': submission.get('is_late'),
+                        'late_minutes': submission.get('late_minutes'),
+                        'points_earned': grade.get('points_earned'),
+                        'max_points': assignment.get('max_points'),
+                        'percentage': grade.get('percentage'),
+                        'letter_grade': grade.get('letter_grade'),
+                        'graded_at': grade.get('graded_at')
+                    })
+                yield rows
+
+        return SUBMISSION_COLUMNS, 'submission_id', pages()
+
+    def activities(self, since: str = None, until: str = None, student_id: str = None,
+                   after: str = None) -> Tuple[List[Tuple[str, str]], str, Iterator[List[Dict]]]:
+        """Submissions, enrollments and lesson completions, exported source by source"""
+        start_source, start_id = 0, None
+        if after:
+            prefix, _, start_id = after.partition('_')
+            if prefix not in ACTIVITY_SOURCES or not start_id:
+                raise ExportError(f"Invalid activity resume key '{after}'")
+            start_source = ACTIVITY_SOURCES.index(prefix)
+
+        def window(query, column):
+            query = query.not_.is_(column, 'null')
+            if since:
+                query = query.gte(column, since)
+            if until:
+                query = query.lt(column, until)
+            return query.eq('student_id', student_id) if student_id else query
+
+        sources = {
+            'submission': (
+                lambda: window(self.db.client.table('assignment_submissions')
+                               .select('id, student_id, assignment_id, status, submitted_at, '
+                                       'student:users!assignment_submissions_student_id_fkey(name, email), '
+                                       'assignment:assignments!assignment_submissions_assignment_id_fkey'
+                                       '(title, course_id), grade:assignment_grades(percentage)'), 'submitted_at'),
+                lambda row, student, parent, grade: {
+                    'activity_type': 'assignment_submission', 'timestamp': row.get('submitted_at'),
+                    'course_id': parent.get('course_id'), 'resource_id': row.get('assignment_id'),
+                    'resource_title': parent.get('title'), 'status': row.get('status'),
+                    'grade': grade.get('percentage'), 'duration_minutes': None}),
+            'enrollment': (
+                lambda: window(self.db.client.table('course_enrollments')
+                               .select('id, student_id, course_id, enrolled_at, '
+                                       'student:users!course_enrollments_student_id_fkey(name, email), '
+                                       'course:courses!course_enrollments_course_id_fkey(title)'), 'enrolled_at'),
+                lambda row, student, parent, grade: {
+                    'activity_type': 'course_enrollment', 'timestamp': row.get('enrolled_at'),
+                    'course_id': row.get('course_id'), 'resource_id': row.get('course_id'),
+                    'resource_title': parent.get('title'), 'status': 'enrolled',
+                    'grade': None, 'duration_minutes': None}),
+            'lesson': (
+                lambda: window(self.db.client.table('lesson_progress')
+                               .select('id, student_id, lesson_id, completed_at, time_spent_minutes, '
+                                       'student:users!lesson_progress_student_id_fkey(name, email), '
+                                       'lesson:lessons!lesson_progress_lesson_id_fkey(title, course_id)'),
+                               'completed_at'),
+                lambda row, student, parent, grade: {
+                    'activity_type': 'lesson_completion', 'timestamp': row.get('completed_at'),
+                    'course_id': parent.get('course_id'), 'resource_id': row.get('lesson_id'),
+                    'resource_title': parent.get('title'), 'status': 'completed',
+                    'grade': None, 'duration_minutes': row.get('time_spent_minutes')})
+        }
+        parents = {'submission': 'assignment', 'enrollment': 'course', 'lesson': 'lesson'}
+
+        def pages():
+            for index, source in enumerate(ACTIVITY_SOURCES[start_source:], start_source):
+                query, describe = sources[source]
+                for source_rows in self._keyset_pages(query, start_id if index == start_source else None,
+                                                      self.page_size):
+                    rows = []
+                    for row in source_rows:
+                        student = _embedded(row.get('student'))
+                        rows.append({
+                            'activity_id': f"{source}_{row['id']}",
+                            'student_id': row.get('student_id'),
+                            'student_name': student.get('name'),
+                            'student_email': student.get('email'),
+                            **describe(row, student, _embedded(row.get(parents[source])), _embedded(row.get('grade')))
+                        })
+                    yield rows
+
+        return ACTIVITY_COLUMNS, 'activity_id', pages()
+
+    def interactions(self, since: str = None, until: str = None, user_id: str = None, action_type: str = None,
+                     after: str = None) -> Tuple[List[Tuple[str, str]], str, Iterator[List[Dict]]]:
+        """Raw user_interactions rows (ip addresses are left out)"""
+        def query():
+            query = (self.db.client.table('user_interactions')
+                     .select(', '.join(name for name, _ in INTERACTION_COLUMNS)))
+            if since:
+                query = query.gte('timestamp', since)
+            if until:
+                query = query.lt('timestamp', until)
+            if user_id:
+                query = query.eq('user_id', user_id)
+            if action_type:
+                query = query.eq('action_type', action_type)
+            return query
+
+        def pages():
+            for rows in self._keyset_pages(query, after, self.page_size):
+                yield [{name: row.get(name) for name, _ in INTERACTION_COLUMNS} for row in rows]
+
+        return INTERACTION_COLUMNS, 'id', pages()
+
+    # Encoders
+    def stream(self, columns: List[Tuple[str, str]], pages: Iterator[List[Dict]], export_format: str,
+               max_rows: int = None) -> Iterator[bytes]:
+        """Encode pages as they arrive, stopping after max_rows rows if given"""
+        pages = _limit_rows(pages, max_rows)
+        if export_format == 'parquet':
+            return self._stream_parquet(columns, pages)
+        return self._stream_csv(columns, pages)
+
+    def _stream_csv(self, columns: List[Tuple[str, str]], pages: Iterator[List[Dict]]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(name for name, _ in columns)
+        yield buffer.getvalue().encode('utf-8')
+        for rows in pages:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_csv_value(row.get(name)) for name, _ in columns] for row in rows)
+            yield buffer.getvalue().encode('utf-8')
+
+    def _stream_parquet(self, columns: List[Tuple[str, str]], pages: Iterator[List[Dict]]) -> Iterator[bytes]:
+        """One row group per page; the footer goes out after the last one"""
+        schema = pa.schema([(name, _ARROW_TYPES[kind]()) for name, kind in columns])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+        try:
+            for rows in pages:
+                if not rows:
+                    continue
+                arrays = [pa.array([_arrow_value(row.get(name), kind) for row in rows], type=schema.field(name).type)
+                          for name, kind in columns]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    # Internal helpers
+    def _keyset_pages(self, query_factory, after: Optional[str], page_size: int) -> Iterator[List[Dict]]:
+        """Pages of a query in id order, each starting after the previous page's last id"""
+        while True:
+            query = query_factory()
+            if after:
+                query = query.gt('id', after)
+            rows = query.order('id').limit(page_size).execute().data or []
+            if rows:
+                yield rows
+                after = rows[-1]['id']
+            if len(rows) < page_size:
+                break
+
+    def _course_assignments(self, course_id: str, columns: str) -> List[Dict[str, Any]]:
+        return (self.db.client.table('assignments').select(columns)
+                .eq('course_id', course_id).order('created_at').execute().data or [])
+
+    def _latest_points(self, student_ids: List[str], assignment_ids: List[str]) -> Dict[Tuple[str, str], float]:
+        """(student, assignment) -> points of the latest graded submission"""
+        latest: Dict[Tuple[str, str], Tuple[str, Optional[float]]] = {}
+        if not student_ids or not assignment_ids:
+            return {}
+        offset = 0
+        while True:
+            rows = (self.db.client.table('assignment_submissions')
+                    .select('id, student_id, assignment_id, submitted_at, grade:assignment_grades(points_earned)')
+                    .in_('student_id', student_ids).in_('assignment_id', assignment_ids)
+                    .order('id').range(offset, offset + self.page_size - 1)
+                    .execute().data or [])
+            for row in rows:
+                key = (row['student_id'], row['assignment_id'])
+                submitted_at = row.get('submitted_at') or ''
+                if key not in latest or submitted_at > latest[key][0]:
+                    latest[key] = (submitted_at, _embedded(row.get('grade')).get('points_earned'))
+            if len(rows) < self.page_size:
+                break
+            offset += self.page_size
+        return {key: float(points) for key, (_, points) in latest.items() if points is not None}
+
+
+def _embedded(value: Any) -> Dict[str, Any]:
+    """A to-one embed comes back as a dict, or as a list from one-to-many relationships"""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return value or {}
+
+
+def _student_name(student: Dict[str, Any]) -> str:
+    return (student.get('name')
+            or f"{student.get('first_name') or ''} {student.get('last_name') or ''}".strip()
+            or student.get('email', 'Unknown'))
+
+
+def _letter_grade(percentage: float) -> str:
+    for cutoff, letter in GRADEBOOK_LETTERS:
+        if percentage >= cutoff:
+            return letter
+    return 'F'
+
+
+def _limit_rows(pages: Iterator[List[Dict]], max_rows: Optional[int]) -> Iterator[List[Dict]]:
+    if not max_rows:
+        yield from pages
+        return
+    remaining = max_rows
+    for rows in pages:
+        yield rows[:remaining]
+        remaining -= len(rows)
+        if remaining <= 0:
+            return
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return '' if value is None else value
+
+
+def _arrow_value(value: Any, kind: str) -> Any:
+    if value is None or value == '':
+        return None
+    if kind == 'timestamp':
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+    if kind == 'string' and not isinstance(value, str):
+        return json.dumps(value, default=str) if isinstance(value, (dict, list)) else str(value)
+    return value
+
+
+_ARROW_TYPES = {
+    'string': lambda: pa.string(),
+    'int': lambda: pa.int64(),
+    'float': lambda: pa.float64(),
+    'bool': lambda: pa.bool_(),
+    'timestamp': lambda: pa.timestamp('us', tz='UTC')
+}
+
+
+# Global data exporter instance
+data_exporter = DataExporter()
@@ -3,6 +3,8 @@ from typing import Optional, Dict, Any, List
 from datetime import datetime
 import logging
 from config import get_config
+from services.cache_service import cache_service, cached, cache_invalidate
+from services.cache_warmer import cache_warmer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -168,14 +170,11 @@ class DatabaseService:
             return []
     
     # Subject Operations
+    @cached(ttl=600, key_prefix="subjects", tags=["subjects"], fallback=lambda *args, **kwargs: [])
     def get_subjects(self) -> List[Dict[str, Any]]:
-        """Get all subjects"""
-        try:
-            response = self.client.table('subjects').select('*').execute()
-            return response.data or []
-        except Exception as e:
-            logger.error(f"Error getting subjects: {str(e)}")
-            return []
+        """Get all subjects (empty on error, without caching the empty result)"""
+        response = self.client.table('subjects').select('*').execute()
+        return response.data or []
 
     def get_all_assignments(self) -> List[Dict[str, Any]]:
         """Get all assignments"""
@@ -211,16 +210,21 @@ class DatabaseService:
             logger.error(f"Error getting chat sessions: {str(e)}")
             return []
     
-    def get_session_messages(self, session_id: str, user_id: str) -> List[Dict[str, Any]]:
-        """Get messages from a specific chat session"""
+    def get_session_messages(self, session_id: str, user_id: str, limit: int = None) -> List[Dict[str, Any]]:
+        """Get messages from a specific chat session (oldest first, optionally only the latest `limit`)"""
         try:
             # First verify the session belongs to the user
             session_response = self.client.table('chat_sessions').select('id').eq('id', session_id).eq('user_id', user_id).execute()
             if not session_response.data:
                 logger.warning(f"Session {session_id} not found or doesn't belong to user {user_id}")
                 return []
-            
+
             # Get messages for the session
+            if limit:
+                # Fetch newest first so the limit keeps the most recent turns, then restore chronological order
+                response = self.client.table('messages').select('*').eq('session_id', session_id).order('created_at', desc=True).limit(limit).execute()
+                return list(reversed(response.data or []))
+
             response = self.client.table('messages').select('*').eq('session_id', session_id).order('created_at', desc=False).execute()
             return response.data or []
         except Exception as e:
@@ -299,6 +303,7 @@ class DatabaseService:
             }
 
     # Subject Management Methods
+    @cache_invalidate(tags=["subjects"])
     def create_subject(self, name: str, description: str = '', created_by: str = None) -> Optional[Dict[str, Any]]:
         """Create a new subject"""
         try:
@@ -313,6 +318,7 @@ class DatabaseService:
             logger.error(f"Error creating subject: {str(e)}")
             return None
     
+    @cache_invalidate(tags=["subjects"])
     def update_subject(self, subject_id: str, name: str, description: str = '') -> Optional[Dict[str, Any]]:
         """Update a subject"""
         try:
@@ -327,6 +333,7 @@ class DatabaseService:
             logger.error(f"Error updating subject: {str(e)}")
             return None
     
+    @cache_invalidate(tags=["subjects"])
     def delete_subject(self, subject_id: str) -> bool:
         """Delete a subject"""
         try:
@@ -394,6 +401,7 @@ class DatabaseService:
             logger.error(f"Error getting courses: {str(e)}")
             return []
     
+    @cache_invalidate(tags=["courses"])
     def create_course(self, title: str, description: str, subject_id: str, instructor_id: str, 
                      difficulty_level: str = 'beginner', duration_hours: int = 0, status: str = 'draft') -> Optional[Dict[str, Any]]:
         """Create a new course"""
@@ -413,6 +421,7 @@ class DatabaseService:
             logger.error(f"Error creating course: {str(e)}")
             return None
     
+    @cache_invalidate(tags=["courses"])
     def update_course(self, course_id: str, title: str, description: str = '', 
                      difficulty_level: str = None, duration_hours: int = None, status: str = None) -> Optional[Dict[str, Any]]:
         """Update a course"""
@@ -435,6 +444,7 @@ class DatabaseService:
             logger.error(f"Error updating course: {str(e)}")
             return None
     
+    @cache_invalidate(tags=["courses", "course:{course_id}"])
     def delete_course(self, course_id: str) -> bool:
         """Delete a course"""
         try:
@@ -492,6 +502,78 @@ class DatabaseService:
             logger.error(f"Error getting assignments count: {str(e)}")
             return 0
     
+    # Batched loaders: one cache round trip plus one paged query for a page of entities
+    COUNT_CACHE_TTL = 300
+    COUNT_PAGE_SIZE = 1000
+    
+    def _count_rows(self, build_query, key) -> Dict[str, int]:
+        """Rows of an (id-ordered) query counted per key, a page at a time so the row cap cannot truncate it"""
+        counts, offset = {}, 0
+        while True:
+            page = build_query().range(offset, offset + self.COUNT_PAGE_SIZE - 1).execute().data or []
+            for row in page:
+                value = key(row)
+                counts[value] = counts.get(value, 0) + 1
+            if len(page) < self.COUNT_PAGE_SIZE:
+                return counts
+            offset += self.COUNT_PAGE_SIZE
+    
+    def _load_counts(self, kind: str, table: str, column: str, ids: List[str]) -> Dict[str, int]:
+        """Row counts per id, read through the cache with MGET and filled with a paged IN query"""
+        ids = list(dict.fromkeys(i for i in ids if i))
+        if not ids:
+            return {}
+        keys = {i: f"{kind}:{i}" for i in ids}
+        cached = cache_service.get_many(list(keys.values()))
+        counts = {i: cached[key] for i, key in keys.items() if key in cached}
+        
+        missing = [i for i in ids if i not in counts]
+        if missing:
+            try:
+                found = self._count_rows(
+                    lambda: self.client.table(table).select(f'id, {column}').in_(column, missing).order('id'),
+                    lambda row: row[column]
+                )
+                fresh = {i: found.get(i, 0) for i in missing}
+                cache_service.set_many(
+                    {keys[i]: count for i, count in fresh.items()},
+                    ttl=self.COUNT_CACHE_TTL,
+                    tags={keys[i]: [f"course:{i}"] for i in fresh}
+                )
+                counts.update(fresh)
+            except Exception as e:
+                # Zeros are returned but not cached, so the next call retries the query
+                logger.error(f"Error loading {kind} counts: {str(e)}")
+                counts.update({i: 0 for i in missing})
+        return counts
+    
+    def get_course_enrollment_counts(self, course_ids: List[str]) -> Dict[str, int]:
+        """Enrollment counts for several courses (cached)"""
+        return self._load_counts('course_enrollments', 'course_enrollments', 'course_id', course_ids)
+    
+    def get_course_assignment_counts(self, course_ids: List[str]) -> Dict[str, int]:
+        """Assignment counts for several courses (cached)"""
+        return self._load_counts('course_assignments', 'assignments', 'course_id', course_ids)
+    
+    def get_student_submission_counts(self, student_id: str, course_ids: List[str]) -> Dict[str, int]:
+        """A student's submission counts per course in one paged query (not cached, submissions change often)"""
+        course_ids = list(dict.fromkeys(c for c in course_ids if c))
+        counts = {course_id: 0 for course_id in course_ids}
+        if not course_ids:
+            return counts
+        try:
+            # Submissions carry no course_id; filter and group through the assignment they belong to
+            found = self._count_rows(
+                lambda: self.client.table('assignment_submissions').select(
+                    'id, assignment:assignment_id!inner(course_id)'
+                ).eq('student_id', student_id).in_('assignment.course_id', course_ids).order('id'),
+                lambda row: (row.get('assignment') or {}).get('course_id')
+            )
+            counts.update({course_id: found.get(course_id, 0) for course_id in course_ids})
+        except Exception as e:
+            logger.error(f"Error loading submission counts: {str(e)}")
+        return counts
+    
     def is_student_enrolled(self, student_id: str, course_id: str) -> bool:
         """Check if student is enrolled in course"""
         try:
@@ -528,6 +610,8 @@ class DatabaseService:
                 'enrolled_at': 'now()'
             }
             response = self.client.table('course_enrollments').insert(enrollment_data).execute()
+            # Enrollment counts and resolved analytics scopes of the course
+            cache_service.invalidate_tags("courses", f"course:{course_id}")
             return response.data[0] if response.data else None
         except Exception as e:
             logger.error(f"Error enrolling student: {str(e)}")
@@ -537,6 +621,7 @@ class DatabaseService:
         """Unenroll student from course"""
         try:
             response = self.client.table('course_enrollments').delete().eq('student_id', student_id).eq('course_id', course_id).execute()
+            cache_service.invalidate_tags("courses", f"course:{course_id}")
             return len(response.data) > 0
         except Exception as e:
             logger.error(f"Error unenrolling student: {str(e)}")
@@ -699,6 +784,11 @@ class DatabaseService:
         try:
             # Get enrolled courses
             enrolled_courses = self.get_student_enrolled_courses(student_id)
+            course_ids = [course['id'] for course in enrolled_courses]
+            
+            # Load counts for all courses at once instead of two queries per course
+            assignment_counts = self.get_course_assignment_counts(course_ids)
+            submission_counts = self.get_student_submission_counts(student_id, course_ids)
             
             # Calculate progress for each course
             course_progress = []
@@ -707,12 +797,11 @@ class DatabaseService:
             
             for course in enrolled_courses:
                 course_id = course['id']
-                assignments_count = self.get_course_assignments_count(course_id)
+                assignments_count = assignment_counts.get(course_id, 0)
                 total_assignments += assignments_count
                 
-                # Get completed assignments for this course
-                submissions_response = self.client.table('assignment_submissions').select('*').eq('student_id', student_id).eq('course_id', course_id).execute()
-                course_completed = len(submissions_response.data) if submissions_response.data else 0
+                # Completed assignments for this course
+                course_completed = submission_counts.get(course_id, 0)
                 completed_assignments += course_completed
                 
                 if assignments_count > 0:
@@ -1439,6 +1528,16 @@ class DatabaseService:
             logger.error(f"Error checking staff access: {str(e)}")
             return False
     
+    def can_staff_access_course(self, staff_id: str, course_id: str) -> bool:
+        """Check if staff teaches a specific course"""
+        try:
+            response = (self.client.table('courses').select('id')
+                        .eq('id', course_id).eq('instructor_id', staff_id).execute())
+            return bool(response.data)
+        except Exception as e:
+            logger.error(f"Error checking staff course access: {str(e)}")
+            return False
+    
     def get_user_public_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get public profile information for a user"""
         try:
@@ -1484,13 +1583,14 @@ class DatabaseService:
                 students(count)
             ''').eq('instructor_id', staff_id).order('created_at', desc=True).execute()
             
-            # Add enrollment counts to each course
+            # Add enrollment and assignment counts to each course (batched, cached)
             courses = response.data if response.data else []
+            course_ids = [course['id'] for course in courses]
+            enrollment_counts = self.get_course_enrollment_counts(course_ids)
+            assignment_counts = self.get_course_assignment_counts(course_ids)
             for course in courses:
-                course['enrollment_count'] = self.get_course_enrollments_count(course['id'])
-                # Get assignment count for this course
-                assignments_response = self.client.table('assignments').select('id').eq('course_id', course['id']).execute()
-                course['assignment_count'] = len(assignments_response.data) if assignments_response.data else 0
+                course['enrollment_count'] = enrollment_counts.get(course['id'], 0)
+                course['assignment_count'] = assignment_counts.get(course['id'], 0)
             
             return courses
         except Exception as e:
@@ -2284,6 +2384,8 @@ class DatabaseService:
         """Create a new assignment"""
         try:
             response = self.client.table('assignments').insert(assignment_data).execute()
+            if assignment_data.get('course_id'):
+                cache_service.invalidate_tags(f"course:{assignment_data['course_id']}")
             return response.data[0]['id'] if response.data else None
         except Exception as e:
             logger.error(f"Error creating assignment: {str(e)}")
@@ -2312,6 +2414,8 @@ class DatabaseService:
             
             # Delete the assignment
             response = self.client.table('assignments').delete().eq('id', assignment_id).execute()
+            cache_service.invalidate_tags(*[f"course:{row['course_id']}"
+                                            for row in response.data or [] if row.get('course_id')])
             return len(response.data) > 0
         except Exception as e:
             logger.error(f"Error deleting assignment: {str(e)}")
@@ -2547,15 +2651,13 @@ class DatabaseService:
             logger.error(f"Error creating bulk notifications: {str(e)}")
             return []
 
+    @cached(ttl=600, key_prefix="notifications", tags=["notification_templates"], fallback=lambda *args, **kwargs: [])
     def get_notification_templates(self) -> List[Dict[str, Any]]:
-        """Get all notification templates"""
-        try:
-            response = self.client.table('notification_templates').select('*').execute()
-            return response.data or []
-        except Exception as e:
-            logger.error(f"Error getting notification templates: {str(e)}")
-            return []
+        """Get all notification templates (empty on error, without caching the empty result)"""
+        response = self.client.table('notification_templates').select('*').execute()
+        return response.data or []
 
+    @cache_invalidate(tags=["notification_templates"])
     def create_notification_template(self, name: str, title: str, message: str,
                                     notification_type: str, priority: str,
                                     variables: List[str], created_by: str) -> Optional[Dict[str, Any]]:
@@ -2577,6 +2679,7 @@ class DatabaseService:
             logger.error(f"Error creating notification template: {str(e)}")
             return None
 
+    @cache_invalidate(tags=["notification_templates"])
     def update_notification_template(self, template_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update a notification template"""
         try:
@@ -2586,6 +2689,7 @@ class DatabaseService:
             logger.error(f"Error updating notification template: {str(e)}")
             return None
 
+    @cache_invalidate(tags=["notification_templates"])
     def delete_notification_template(self, template_id: str) -> bool:
         """Delete a notification template"""
         try:
@@ -2655,3 +2759,7 @@ class DatabaseService:
 
 # Global database service instance
 db_service = DatabaseService()
+
+# Hot read paths pre-populated after startup
+cache_warmer.register('subjects', db_service.get_subjects)
+cache_warmer.register('notification_templates', db_service.get_notification_templates)
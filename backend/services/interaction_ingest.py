@@ -0,0 +1,316 @@
+"""
+Interaction Ingestion Pipeline for AI Tutor Platform
+Request handlers and socket events enqueue user_interactions rows into a bounded
+in-process buffer; a background flusher writes them in bulk inserts
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+# Mirrors the CHECK constraints on user_interactions; one bad row would fail its whole batch
+ACTION_TYPES = {
+    'page_view', 'click', 'form_submit', 'download', 'search', 'lesson_start', 'lesson_complete',
+    'assignment_start', 'assignment_submit', 'chat_message', 'ai_interaction'
+}
+RESOURCE_TYPES = {
+    'course', 'lesson', 'assignment', 'quiz', 'discussion', 'ai_tutor', 'dashboard', 'profile', 'settings'
+}
+# High-volume, low-value events shed first when the buffer backs up
+SHEDDABLE_ACTIONS = {'page_view', 'click'}
+
+
+def _uuid_or_none(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+class InteractionIngestor:
+    """Bounded ring buffer of interaction rows with size/time-triggered bulk flushes.
+
+    track() never blocks or touches the database. Past the backpressure ratio, sheddable
+    events are rejected; when the buffer is full the oldest events are overwritten. Batches
+    that fail to insert are spilled to disk (when INTERACTION_SPILL_DIR is set) and replayed
+    once inserts succeed again; otherwise they wait in a retry queue, where a batch that
+    still fails while other inserts go through is split to isolate the rows the table rejects.
+    """
+
+    TABLE = 'user_interactions'
+    SPILL_MAX_ATTEMPTS = 5
+
+    def __init__(self):
+        self.db = db_service
+        self.capacity = int(os.getenv('INTERACTION_BUFFER_SIZE', 10000))
+        self.batch_size = int(os.getenv('INTERACTION_BATCH_SIZE', 500))
+        self.flush_interval = float(os.getenv('INTERACTION_FLUSH_INTERVAL', 2))
+        self.backpressure_ratio = float(os.getenv('INTERACTION_BACKPRESSURE_RATIO', 0.8))
+        self.spill_dir = os.getenv('INTERACTION_SPILL_DIR', '')
+        self.spill_max_bytes = int(os.getenv('INTERACTION_SPILL_MAX_BYTES', 100 * 1024 * 1024))
+        self._buffer: deque = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        # [batch, failures] pairs; failures are counted only for single rows
+        self._retry: deque = deque()
+        self._retry_rows = 0
+        self._stats = {
+            'enqueued': 0,
+            'inserted': 0,
+            'batches': 0,
+            'failed_batches': 0,
+            'dropped_overflow': 0,
+            'shed': 0,
+            'invalid': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'dropped_spill': 0,
+            'dropped_invalid': 0,
+            'last_flush_ms': 0.0,
+            'last_error': None
+        }
+
+    def track(self, user_id: Optional[str], action_type: str, resource_type: str, resource_id: Any = None,
+              session_id: Any = None, duration_seconds: int = 0, metadata: Optional[Dict[str, Any]] = None,
+              ip_address: str = None, user_agent: str = None, timestamp: str = None) -> bool:
+        """Enqueue one interaction (no I/O); returns False if it was rejected"""
+        if action_type not in ACTION_TYPES or resource_type not in RESOURCE_TYPES:
+            self._count('invalid')
+            return False
+
+        metadata = dict(metadata or {})
+        row_resource_id = _uuid_or_none(resource_id)
+        if resource_id is not None and row_resource_id is None:
+            # Non-UUID references (slugs, room names) are kept out of the UUID column
+            metadata['resource_ref'] = str(resource_id)
+        event = {
+            'user_id': _uuid_or_none(user_id),
+            'action_type': action_type,
+            'resource_type': resource_type,
+            'resource_id': row_resource_id,
+            'session_id': _uuid_or_none(session_id),
+            'timestamp': timestamp or datetime.utcnow().isoformat(),
+            'duration_seconds': max(0, int(duration_seconds or 0)),
+            'metadata': metadata,
+            'ip_address': ip_address,
+            'user_agent': (user_agent or '')[:512] or None
+        }
+
+        with self._lock:
+            size = len(self._buffer)
+            if size >= self.capacity * self.backpressure_ratio and action_type in SHEDDABLE_ACTIONS:
+                self._stats['shed'] += 1
+                return False
+            if size >= self.capacity:
+                # Ring buffer: the oldest event makes room for the newest
+                self._buffer.popleft()
+                self._stats['dropped_overflow'] += 1
+            self._buffer.append(event)
+            self._stats['enqueued'] += 1
+            full_batch = size + 1 >= self.batch_size
+        if full_batch:
+            self._wakeup.set()
+        self._ensure_flusher()
+        return True
+
+    def flush(self, drain: bool = False) -> int:
+        """Insert buffered events in batches; returns the number of rows written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if not batch:
+                    break
+                if not self._insert(batch):
+                    self._handle_failed_batch(batch)
+                    return written
+                written += len(batch)
+                if not drain and len(batch) < self.batch_size:
+                    break
+            self._retry_failed(database_up=written > 0)
+            self._replay_spill(database_up=written > 0)
+        return written
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['buffered'] = len(self._buffer)
+            stats['retry_rows'] = self._retry_rows
+        stats.update({
+            'capacity': self.capacity,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'spill_enabled': bool(self.spill_dir),
+            'spill_files': len(self._spill_files())
+        })
+        return stats
+
+    # Internal helpers
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _insert(self, batch: List[Dict[str, Any]]) -> bool:
+        started = time.perf_counter()
+        try:
+            self.db.client.table(self.TABLE).insert(batch).execute()
+        except Exception as e:
+            with self._lock:
+                self._stats['failed_batches'] += 1
+                self._stats['last_error'] = str(e)
+            logger.warning(f"Interaction batch insert failed ({len(batch)} rows): {str(e)}")
+            return False
+        with self._lock:
+            self._stats['inserted'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return True
+
+    def _handle_failed_batch(self, batch: List[Dict[str, Any]]):
+        """Spill the batch to disk, or queue it for retry (newer batches keep flushing meanwhile)"""
+        if self.spill_dir and self._spill(batch):
+            return
+        self._queue_retry(batch, 0)
+        # The retry queue shares the buffer's capacity; the oldest retries go first
+        while self._retry and self._retry_rows > self.capacity:
+            dropped, _ = self._retry.popleft()
+            self._retry_rows -= len(dropped)
+            self._count('dropped_overflow', len(dropped))
+
+    def _queue_retry(self, batch: List[Dict[str, Any]], failures: int, front: bool = False):
+        if front:
+            self._retry.appendleft([batch, failures])
+        else:
+            self._retry.append([batch, failures])
+        self._retry_rows += len(batch)
+
+    def _retry_failed(self, database_up: bool):
+        """Re-insert queued batches, bisecting the ones that fail while the database is up.
+
+        A failure only says something about the rows once another insert has gone
+        through; until then (an outage) batches stay whole and nothing is given up on.
+        A single row that keeps failing is dropped after SPILL_MAX_ATTEMPTS flushes.
+        """
+        failed_rows = []
+        while self._retry:
+            batch, failures = self._retry.popleft()
+            self._retry_rows -= len(batch)
+            if self._insert(batch):
+                database_up = True
+                continue
+            if not database_up:
+                self._queue_retry(batch, failures, front=True)
+                break
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                self._queue_retry(batch[middle:], failures, front=True)
+                self._queue_retry(batch[:middle], failures, front=True)
+                continue
+            failures += 1
+            if failures >= self.SPILL_MAX_ATTEMPTS:
+                logger.error(f"Dropping interaction rejected {failures} times: {json.dumps(batch[0], default=str)}")
+                self._count('dropped_invalid')
+            else:
+                failed_rows.append((batch, failures))
+        # Rows that failed this flush wait for the next one
+        for batch, failures in failed_rows:
+            self._queue_retry(batch, failures)
+
+    def _spill(self, batch: List[Dict[str, Any]]) -> bool:
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            payload = ''.join(json.dumps(event, default=str) + '\n' for event in batch)
+            if self._spill_bytes() + len(payload) > self.spill_max_bytes:
+                logger.error(f"Interaction spill directory full, dropping {len(batch)} events")
+                self._count('dropped_spill', len(batch))
+                return True
+            name = f"interactions-{time.time_ns()}-{uuid.uuid4().hex[:8]}.jsonl"
+            temp_path = os.path.join(self.spill_dir, name + '.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as spill_file:
+                spill_file.write(payload)
+            os.replace(temp_path, os.path.join(self.spill_dir, name))
+            self._count('spilled', len(batch))
+            return True
+        except OSError as e:
+            logger.error(f"Interaction spill failed: {str(e)}")
+            return False
+
+    def _spill_files(self) -> List[str]:
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return []
+        return sorted(name for name in os.listdir(self.spill_dir)
+                      if name.startswith('interactions-') and name.endswith('.jsonl'))
+
+    def _spill_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.spill_dir, name)) for name in self._spill_files())
+
+    def _replay_spill(self, database_up: bool):
+        """Re-insert spilled batches oldest first.
+
+        A file is only given up on while live batches are going through, so an outage
+        never discards spilled events; its remaining rows then move to the retry queue,
+        where bisection isolates the rows the table rejects.
+        """
+        for name in self._spill_files():
+            path = os.path.join(self.spill_dir, name)
+            try:
+                with open(path, encoding='utf-8') as spill_file:
+                    batch = [json.loads(line) for line in spill_file if line.strip()]
+            except (OSError, ValueError) as e:
+                logger.error(f"Unreadable interaction spill file {name}: {str(e)}")
+                os.replace(path, path + '.failed')
+                continue
+            replayed = 0
+            while replayed < len(batch) and self._insert(batch[replayed:replayed + self.batch_size]):
+                replayed += len(batch[replayed:replayed + self.batch_size])
+            self._count('replayed', replayed)
+            if replayed == len(batch):
+                os.remove(path)
+                continue
+            if database_up or replayed:
+                # Likely rows the table rejects, not an outage; bisect them with the other retries
+                self._queue_retry(batch[replayed:], 0)
+                os.remove(path)
+                self._retry_failed(database_up=True)
+            break
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                if self._flusher is None:
+                    # Write out (or spill) whatever is still buffered when the process exits
+                    atexit.register(self.flush, True)
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name='interaction-flusher')
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            # Size trigger (a full batch wakes the flusher) or time trigger
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Interaction flush failed: {str(e)}")
+
+
+# Global interaction ingestor instance
+interaction_ingestor = InteractionIngestor()
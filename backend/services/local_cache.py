@@ -0,0 +1,103 @@
+"""
+In-process cache tier for AI Tutor Platform
+Byte-bounded LRU with per-entry TTL that sits in front of Redis so hot keys are
+served without a network hop or deserialization
+"""
+
+import fnmatch
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Sentinel distinguishing "not cached" from a cached None
+MISSING = object()
+
+
+class LocalCache:
+    """Thread-safe LRU/TTL cache bounded by the serialized size of its values
+
+    Values are stored deserialized and returned as-is, so callers must treat
+    cached objects as read-only.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int, default_ttl: float):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Any:
+        """Return the cached value or MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[float] = None):
+        """Store a value whose serialized form is `size` bytes (oversized values are skipped)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_entry_bytes or size > self.max_bytes:
+                return
+            ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def delete(self, keys: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._drop(key)
+                    removed += 1
+        return removed
+
+    def delete_pattern(self, pattern: str) -> int:
+        """Drop entries whose key matches a Redis-style glob pattern"""
+        with self._lock:
+            matches = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in matches:
+                self._drop(key)
+        return len(matches)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def _drop(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,198 @@
+"""
+Performance Trends Engine for AI Tutor Platform
+Fetches submissions with their grade and assignment points in one joined query and
+bins them into daily/weekly grade statistics with vectorized NumPy group-bys
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (25, 50, 75, 90)
+
+
+def _group_stats(groups: np.ndarray, n_groups: int, submitted: np.ndarray, earned: np.ndarray,
+                 possible: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Per-group counts, point sums, mean and percentiles of the grade percentage
+
+    Args:
+        groups: Group index of every submission
+        submitted: Boolean column, rows that count as submissions
+        earned/possible: Points columns, earned is NaN for ungraded rows
+    """
+    graded = ~np.isnan(earned)
+    graded_groups = groups[graded]
+    percentage = earned[graded] / np.maximum(possible[graded], 1) * 100
+
+    stats = {
+        'submissions': np.bincount(groups[submitted], minlength=n_groups),
+        'graded': np.bincount(graded_groups, minlength=n_groups),
+        'total_points': np.bincount(graded_groups, weights=earned[graded], minlength=n_groups),
+        'possible_points': np.bincount(graded_groups, weights=possible[graded], minlength=n_groups),
+        'percentage_sum': np.bincount(graded_groups, weights=percentage, minlength=n_groups)
+    }
+
+    # Percentiles for every group at once: sort by (group, percentage), then interpolate
+    # inside each group's slice of the sorted column
+    order = np.lexsort((percentage, graded_groups))
+    ordered = percentage[order]
+    counts = stats['graded']
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has_data = counts > 0
+    for p in PERCENTILES:
+        position = starts + (counts - 1).clip(min=0) * (p / 100)
+        low = np.floor(position).astype(int)
+        high = np.ceil(position).astype(int)
+        values = np.full(n_groups, np.nan)
+        if has_data.any():
+            lo, hi = ordered[low[has_data]], ordered[high[has_data]]
+            values[has_data] = lo + (hi - lo) * (position[has_data] - low[has_data])
+        stats[f'p{p}'] = values
+    return stats
+
+
+def _trailing_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum over the trailing `window` bins (shorter at the start), along the last axis"""
+    cumulative = np.cumsum(values, axis=-1)
+    shifted = np.zeros_like(cumulative)
+    shifted[..., window:] = cumulative[..., :-window]
+    return cumulative - shifted
+
+
+class PerformanceTrendsEngine:
+    """Grade trends over a date range for the platform or a set of courses"""
+
+    PAGE_SIZE = 1000
+    COLUMNS = ('submitted_at, status, assignment:assignment_id!inner(course_id, max_points), '
+               'grade:assignment_grades(points_earned)')
+
+    def __init__(self):
+        self.db = db_service
+
+    def get_trends(self, days: int = 30, course_ids: Optional[List[str]] = None, granularity: str = 'day',
+                   rolling: int = 0, end: date = None) -> Dict[str, Any]:
+        """
+        Args:
+            days: Length of the window ending today
+            course_ids: Restrict to these courses (and break the trends down per course)
+            granularity: 'day' or 'week' bins
+            rolling: Trailing window, in bins, for rolling averages (0 disables)
+
+        Returns:
+            {'trends': {bin: stats}, 'courses': {course_id: {bin: stats}}, 'bins': [...]}
+        """
+        end = end or datetime.utcnow().date()
+        start = end - timedelta(days=days - 1)
+        step = 7 if granularity == 'week' else 1
+        if step == 7:
+            start -= timedelta(days=start.weekday())
+        n_bins = (end - start).days // step + 1
+        bins = [(start + timedelta(days=i * step)).isoformat() for i in range(n_bins)]
+
+        columns = self._fetch_columns(start, end, course_ids)
+        bin_index = (columns['day'] - np.datetime64(start, 'D')).astype(int) // step
+        in_range = (bin_index >= 0) & (bin_index < n_bins)
+        for name in columns:
+            columns[name] = columns[name][in_range]
+        bin_index = bin_index[in_range]
+
+        overall = _group_stats(bin_index, n_bins, columns['submitted'], columns['earned'], columns['possible'])
+        result = {
+            'bins': bins,
+            'granularity': 'week' if step == 7 else 'day',
+            'trends': self._to_series(bins, overall, rolling),
+            'total_submissions': int(columns['submitted'].sum())
+        }
+
+        if course_ids:
+            # One group-by over (course, bin) pairs, reshaped to a per-course grid
+            course_codes = {course_id: i for i, course_id in enumerate(course_ids)}
+            course_index = np.array([course_codes.get(c, -1) for c in columns['course']], dtype=int)
+            known = course_index >= 0
+            per_course = _group_stats(course_index[known] * n_bins + bin_index[known], len(course_ids) * n_bins,
+                                      columns['submitted'][known], columns['earned'][known],
+                                      columns['possible'][known])
+            per_course = {name: values.reshape(len(course_ids), n_bins) for name, values in per_course.items()}
+            result['courses'] = {
+                course_id: self._to_series(bins, {name: values[i] for name, values in per_course.items()}, rolling)
+                for course_id, i in course_codes.items()
+            }
+        return result
+
+    # Internal helpers
+    def _fetch_columns(self, start: date, end: date, course_ids: Optional[List[str]]) -> Dict[str, np.ndarray]:
+        """Page through the joined query, keeping only the columns needed"""
+        day, course, status, earned, possible = [], [], [], [], []
+        offset = 0
+        while True:
+            query = (self.db.client.table('assignment_submissions').select(self.COLUMNS)
+                     .gte('submitted_at', start.isoformat())
+                     .lt('submitted_at', (end + timedelta(days=1)).isoformat()))
+            if course_ids:
+                query = query.in_('assignment.course_id', course_ids)
+            rows = query.order('submitted_at').range(offset, offset + self.PAGE_SIZE - 1).execute().data or []
+            for row in rows:
+                assignment = row.get('assignment') or {}
+                grade = row.get('grade')
+                if isinstance(grade, list):
+                    grade = grade[0] if grade else None
+                points = (grade or {}).get('points_earned')
+                day.append(row['submitted_at'][:10])
+                course.append(assignment.get('course_id'))
+                status.append(row.get('status'))
+                earned.append(float(points) if points is not None else np.nan)
+                possible.append(float(assignment.get('max_points') or 100))
+            if len(rows) < self.PAGE_SIZE:
+                break
+            offset += self.PAGE_SIZE
+
+        return {
+            'day': np.array(day, dtype='datetime64[D]'),
+            'course': np.array(course, dtype=object),
+            'submitted': np.array([s not in ('draft', 'archived') for s in status], dtype=bool),
+            'earned': np.array(earned, dtype=float),
+            'possible': np.array(possible, dtype=float)
+        }
+
+    def _to_series(self, bins: List[str], stats: Dict[str, np.ndarray], rolling: int) -> Dict[str, Dict[str, Any]]:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            average = stats['total_points'] / stats['possible_points'] * 100
+            mean = stats['percentage_sum'] / stats['graded']
+            if rolling > 1:
+                rolling_average = (_trailing_sum(stats['total_points'], rolling)
+                                   / _trailing_sum(stats['possible_points'], rolling) * 100)
+                rolling_submissions = _trailing_sum(stats['submissions'].astype(float), rolling) / rolling
+
+        series = {}
+        for i, key in enumerate(bins):
+            if not stats['submissions'][i] and not stats['graded'][i] and rolling <= 1:
+                continue
+            entry = {
+                'submissions': int(stats['submissions'][i]),
+                'graded': int(stats['graded'][i]),
+                'total_points': round(float(stats['total_points'][i]), 2),
+                'possible_points': round(float(stats['possible_points'][i]), 2),
+                'average_grade': round(float(average[i]), 1) if stats['possible_points'][i] else 0,
+                'mean_percentage': _round(mean[i]),
+                **{f'p{p}': _round(stats[f'p{p}'][i]) for p in PERCENTILES}
+            }
+            if rolling > 1:
+                entry['rolling_average_grade'] = _round(rolling_average[i])
+                entry['rolling_submissions'] = round(float(rolling_submissions[i]), 2)
+            series[key] = entry
+        return series
+
+
+def _round(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 1)
+
+
+# Global performance trends engine instance
+performance_trends = PerformanceTrendsEngine()
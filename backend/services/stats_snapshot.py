@@ -0,0 +1,205 @@
+"""
+Admin Stats Snapshot Service for AI Tutor Platform
+Keeps a cached snapshot of platform counts for /api/admin/stats, rebuilt with one
+grouped query every few minutes or shortly after write requests
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from services.database import db_service
+from services.cache_service import cache_service
+from services.activity_tracker import activity_tracker
+
+logger = logging.getLogger(__name__)
+
+
+class StatsSnapshotService:
+    """Serves admin stats from the cache in constant time and refreshes them in the background"""
+
+    CACHE_KEY = 'admin_stats:snapshot'
+    REFRESH_LOCK = 'admin_stats:refresh'
+    DIRTY_LOCK = 'admin_stats:dirty_refresh'
+
+    def __init__(self):
+        self.db = db_service
+        self.cache = cache_service
+        # Full rebuild period; one worker rebuilds per period
+        self.refresh_interval = int(os.getenv('ADMIN_STATS_REFRESH_INTERVAL', 300))
+        # Write bursts are coalesced into one rebuild at most this often
+        self.debounce_seconds = float(os.getenv('ADMIN_STATS_DEBOUNCE', 5))
+        self._dirty = threading.Event()
+        self._dirty_at = ''
+        self._refresh_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = time.time()
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Latest snapshot; built synchronously only when none exists yet"""
+        self._ensure_refresher()
+        snapshot = self.cache.get(self.CACHE_KEY)
+        if snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    def mark_dirty(self):
+        """Called after writes that change the counts; the rebuild is debounced"""
+        if not self._dirty.is_set():
+            self._dirty_at = datetime.utcnow().isoformat()
+        self._dirty.set()
+        self._ensure_refresher()
+
+    def refresh(self) -> Dict[str, Any]:
+        """Recompute the counts and store the snapshot"""
+        with self._refresh_lock:
+            started = time.perf_counter()
+            counted_at = datetime.utcnow().isoformat()
+            snapshot = self._build_snapshot(self._load_counts())
+            # When the counts were read, so other workers can tell whether it already covers their writes
+            snapshot['counted_at'] = counted_at
+            snapshot['build_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            # Kept well past the refresh period so a stalled refresher serves stale data, not a rebuild
+            self.cache.set(self.CACHE_KEY, snapshot, ttl=self.refresh_interval * 12)
+            logger.info(f"Admin stats snapshot refreshed in {snapshot['build_ms']:.0f}ms")
+            return snapshot
+
+    # Internal helpers
+    def _load_counts(self) -> Dict[str, Any]:
+        try:
+            counts = self.db.client.rpc('admin_stats_snapshot').execute().data
+            if isinstance(counts, list):
+                counts = counts[0] if counts else None
+            if counts:
+                return counts
+        except Exception as e:
+            logger.warning(f"admin_stats_snapshot() unavailable, falling back to count queries: {str(e)}")
+        return self._load_counts_with_queries()
+
+    def _load_counts_with_queries(self) -> Dict[str, Any]:
+        """Head-only count queries run concurrently (no rows are transferred)"""
+        today = datetime.utcnow().strftime('%Y-%m-%d')
+
+        def count(table: str, apply: Callable = None) -> Callable[[], int]:
+            def run() -> int:
+                query = self.db.client.table(table).select('id', count='exact')
+                if apply:
+                    query = apply(query)
+                return query.limit(1).execute().count or 0
+            return run
+
+        queries = {
+            ('users', 'total'): count('users'),
+            ('users', 'students'): count('users', lambda q: q.eq('role', 'student')),
+            ('users', 'staff'): count('users', lambda q: q.eq('role', 'staff')),
+            ('users', 'admins'): count('users', lambda q: q.eq('role', 'admin')),
+            ('users', 'new_today'): count('users', lambda q: q.gte('created_at', today)),
+            ('courses', 'total'): count('courses'),
+            ('courses', 'active'): count('courses', lambda q: q.eq('is_active', True)),
+            ('enrollments', None): count('course_enrollments'),
+            ('assignments', 'total'): count('assignments'),
+            ('assignments', 'published'): count('assignments', lambda q: q.eq('is_published', True)),
+            ('submissions', 'total'): count('assignment_submissions',
+                                            lambda q: q.not_.in_('status', ['draft', 'archived'])),
+            ('submissions', 'pending_grades'): count('assignment_submissions', lambda q: q.eq('status', 'submitted')),
+            ('submissions', 'today'): count('assignment_submissions', lambda q: q.gte('submitted_at', today))
+        }
+        with ThreadPoolExecutor(max_workers=6, thread_name_prefix='admin-stats') as executor:
+            futures = {key: executor.submit(run) for key, run in queries.items()}
+
+        counts: Dict[str, Any] = {}
+        for (group, name), future in futures.items():
+            try:
+                value = future.result()
+            except Exception as e:
+                logger.error(f"Admin stats count {group}.{name} failed: {str(e)}")
+                value = 0
+            if name is None:
+                counts[group] = value
+            else:
+                counts.setdefault(group, {})[name] = value
+        return counts
+
+    def _build_snapshot(self, counts: Dict[str, Any]) -> Dict[str, Any]:
+        users = counts.get('users') or {}
+        courses = counts.get('courses') or {}
+        assignments = counts.get('assignments') or {}
+        submissions = counts.get('submissions') or {}
+        try:
+            active_users = activity_tracker.count_active(1)
+        except Exception:
+            active_users = 0
+
+        uptime = int(time.time() - self._started_at)
+        return {
+            'stats': {
+                'users': {
+                    'total': users.get('total', 0),
+                    'students': users.get('students', 0),
+                    'staff': users.get('staff', 0),
+                    'admins': users.get('admins', 0),
+                    'active_users': active_users
+                },
+                'courses': {
+                    'total': courses.get('total', 0),
+                    'active': courses.get('active', 0),
+                    'total_enrollments': counts.get('enrollments', 0)
+                },
+                'assignments': {
+                    'total': assignments.get('total', 0),
+                    'published': assignments.get('published', 0),
+                    'total_submissions': submissions.get('total', 0),
+                    'pending_grades': submissions.get('pending_grades', 0)
+                },
+                'system': {
+                    'health': {
+                        'status': 'healthy' if self.cache.is_available() else 'degraded',
+                        'uptime': f"{uptime // 3600}h {uptime % 3600 // 60}m"
+                    }
+                },
+                'recent_activity': {
+                    'new_users_today': users.get('new_today', 0),
+                    'assignments_submitted_today': submissions.get('today', 0)
+                }
+            },
+            'generated_at': datetime.utcnow().isoformat()
+        }
+
+    def _ensure_refresher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._refresh_loop, daemon=True, name='admin-stats-refresher')
+                self._thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            dirty = self._dirty.wait(self.refresh_interval)
+            try:
+                if dirty:
+                    # Let the rest of a write burst land before rebuilding
+                    time.sleep(self.debounce_seconds)
+                    snapshot = self.cache.get(self.CACHE_KEY) or {}
+                    if snapshot.get('counted_at', '') > self._dirty_at:
+                        # Another worker rebuilt after our writes landed
+                        self._dirty.clear()
+                    elif self.cache.acquire_lock(self.DIRTY_LOCK, self.debounce_seconds) is not None:
+                        # The lock (left to expire) elects one worker per debounce window;
+                        # the others stay dirty and re-check once it has rebuilt
+                        self._dirty.clear()
+                        self.refresh()
+                elif self.cache.acquire_lock(self.REFRESH_LOCK, self.refresh_interval) is not None:
+                    # Periodic rebuild: the lock (left to expire) elects one worker per period
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"Admin stats refresh failed: {str(e)}")
+
+
+# Global stats snapshot service instance
+stats_snapshot = StatsSnapshotService()
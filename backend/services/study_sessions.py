@@ -0,0 +1,205 @@
+"""
+Study Session Tracker for AI Tutor Platform
+Coalesces Socket.IO heartbeats into per-user study sessions in memory and writes only
+session start/end rows to study_sessions, in batches
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.utcfromtimestamp(timestamp).isoformat()
+
+
+class StudySession:
+    """An open session: heartbeats only update these fields"""
+
+    def __init__(self, user_id: str, started_at: float):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.started_at = started_at
+        self.last_seen = started_at
+        self.heartbeats = 0
+        self.activities = 0
+        self.courses: Set[str] = set()
+        self.sids: Set[str] = set()
+        # Set when the last socket of the session disconnects
+        self.disconnected_at: Optional[float] = None
+
+
+class StudySessionTracker:
+    """Per-user study sessions built from heartbeats.
+
+    A heartbeat is a dict update. A session row is queued when the session opens and
+    again when it closes (idle timeout, or a grace period after the user's last socket
+    disconnects); queued rows are upserted together, so a session that opens and
+    closes between flushes costs a single row write. Sessions live in the process that
+    holds the user's socket (Socket.IO already requires sticky connections).
+    """
+
+    TABLE = 'study_sessions'
+
+    def __init__(self):
+        self.db = db_service
+        self.idle_timeout = float(os.getenv('STUDY_SESSION_IDLE_TIMEOUT', 300))
+        self.disconnect_grace = float(os.getenv('STUDY_SESSION_DISCONNECT_GRACE', 60))
+        # Interval clients send heartbeats at, used for the session quality score
+        self.heartbeat_interval = float(os.getenv('STUDY_HEARTBEAT_INTERVAL', 30))
+        self.flush_interval = float(os.getenv('STUDY_SESSION_FLUSH_INTERVAL', 15))
+        self._sessions: Dict[str, StudySession] = {}
+        self._connections: Dict[str, str] = {}  # socket id -> user id
+        self._pending: Dict[str, Dict[str, Any]] = {}  # session id -> latest row
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stats = {'heartbeats': 0, 'opened': 0, 'closed': 0, 'rows_written': 0, 'failed_flushes': 0}
+
+    # Socket lifecycle
+    def connect(self, sid: str, user_id: str):
+        """Remember which user a socket belongs to (heartbeats carry only the socket id)"""
+        with self._lock:
+            self._connections[sid] = str(user_id)
+
+    def disconnect(self, sid: str):
+        with self._lock:
+            user_id = self._connections.pop(sid, None)
+            session = self._sessions.get(user_id) if user_id else None
+            if session:
+                session.sids.discard(sid)
+                if not session.sids:
+                    session.disconnected_at = time.time()
+
+    def heartbeat(self, sid: str, course_id: str = None, activities: int = 0, at: float = None) -> Optional[str]:
+        """Record a heartbeat from a connected socket; returns the session id"""
+        now = at or time.time()
+        with self._lock:
+            user_id = self._connections.get(sid)
+            if not user_id:
+                return None
+            session = self._sessions.get(user_id)
+            if session and now - session.last_seen > self.idle_timeout:
+                # The sweeper has not caught this one yet
+                self._close(session)
+                session = None
+            if session is None:
+                session = self._sessions[user_id] = StudySession(user_id, now)
+                self._stats['opened'] += 1
+                self._pending[session.id] = self._row(session, closed=False)
+            session.last_seen = max(session.last_seen, now)
+            session.heartbeats += 1
+            session.activities += max(0, int(activities or 0))
+            session.sids.add(sid)
+            session.disconnected_at = None
+            if course_id:
+                session.courses.add(str(course_id))
+            self._stats['heartbeats'] += 1
+            session_id = session.id
+        self._ensure_flusher()
+        return session_id
+
+    # Background work
+    def sweep(self, now: float = None) -> int:
+        """Close sessions past the idle timeout or the disconnect grace period"""
+        now = now or time.time()
+        closed = 0
+        with self._lock:
+            for session in list(self._sessions.values()):
+                idle = now - session.last_seen > self.idle_timeout
+                gone = session.disconnected_at is not None and now - session.disconnected_at > self.disconnect_grace
+                if idle or gone:
+                    self._close(session)
+                    closed += 1
+        return closed
+
+    def flush(self) -> bool:
+        """Upsert queued session rows in one batch; they are re-queued if the write fails"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return True
+        try:
+            self.db.client.table(self.TABLE).upsert(list(pending.values()), on_conflict='id').execute()
+            with self._lock:
+                self._stats['rows_written'] += len(pending)
+            return True
+        except Exception as e:
+            logger.warning(f"Study session flush failed, retrying {len(pending)} rows later: {str(e)}")
+            with self._lock:
+                self._stats['failed_flushes'] += 1
+                for session_id, row in pending.items():
+                    # A newer row for the same session (e.g. its end) wins
+                    self._pending.setdefault(session_id, row)
+            return False
+
+    def close_all(self):
+        """Close every open session and write them out (shutdown)"""
+        with self._lock:
+            for session in list(self._sessions.values()):
+                self._close(session)
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                'open_sessions': len(self._sessions),
+                'connections': len(self._connections),
+                'pending_rows': len(self._pending)
+            }
+
+    # Internal helpers
+    def _close(self, session: StudySession):
+        """Queue the session's end row (caller holds the lock)"""
+        self._sessions.pop(session.user_id, None)
+        self._pending[session.id] = self._row(session, closed=True)
+        self._stats['closed'] += 1
+
+    def _row(self, session: StudySession, closed: bool) -> Dict[str, Any]:
+        # The session ends at its last heartbeat, so the idle tail is not counted
+        duration = session.last_seen - session.started_at if closed else 0
+        covered = min(session.heartbeats * self.heartbeat_interval, duration) if duration else 0
+        return {
+            'id': session.id,
+            'user_id': session.user_id,
+            'session_start': _iso(session.started_at),
+            'session_end': _iso(session.last_seen) if closed else None,
+            'total_duration_minutes': int(round(duration / 60)),
+            'activities_count': session.activities,
+            'courses_accessed': sorted(session.courses),
+            'performance_summary': {'heartbeats': session.heartbeats, 'duration_seconds': int(duration)},
+            # Share of the session covered by heartbeats (gaps mean a backgrounded tab)
+            'session_quality_score': round(covered / duration * 100, 2) if duration else 0
+        }
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                if self._flusher is None:
+                    atexit.register(self.close_all)
+                self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name='study-session-flusher')
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.sweep()
+                self.flush()
+            except Exception as e:
+                logger.error(f"Study session flush loop error: {str(e)}")
+
+
+# Global study session tracker instance
+study_sessions = StudySessionTracker()